@@ -11,7 +11,38 @@ from typing import Dict, List, Optional, Tuple
 from loguru import logger
 import json
 import os
-from dataclasses import dataclass
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from keyword_matcher import KeywordMatcher, leftmost_longest
+from llm_cache import CachedLLMClient, LLMResponseCache, OpenAIChatModel, StubChatModel
+from text_normalizer import normalize
+
+# Palavras de data/período (entram no autômato junto com intents e serviços)
+DATE_KEYWORDS = {
+    "weekday": ["segunda", "terça", "quarta", "quinta", "sexta", "sábado", "domingo"],
+    "relative_day": ["amanhã", "hoje", "depois de amanhã"]
+}
+TIME_KEYWORDS = {
+    "period": ["manhã", "tarde", "noite"]
+}
+
+# Palavras-chave curtas ("oi", "pé", "cor") só valem como palavra inteira
+SHORT_KEYWORD_LENGTH = 3
+
+# Padrões numéricos, compilados uma vez
+NUMERIC_DATE_PATTERNS = [
+    re.compile(r"(\d{1,2}[/\-]\d{1,2})"),
+    re.compile(r"(dia \d{1,2})")
+]
+NUMERIC_TIME_PATTERNS = [
+    re.compile(r"(\d{1,2}[:h]\d{0,2})"),
+    re.compile(r"(\d{1,2}h)")
+]
+
+# Análises memorizadas por id de mensagem (reentregas do webhook)
+ANALYSIS_CACHE_SIZE = 1024
 
 @dataclass
 class Intent:
@@ -19,9 +50,31 @@ class Intent:
     confidence: float
     entities: Dict
 
+@dataclass
+class MessageAnalysis:
+    """Resultado único do NLP de uma mensagem, repassado aos handlers"""
+    message: str
+    intent: str
+    confidence: float
+    entities: Dict
+    matches: List
+    normalized: str = ""
+    timings: Dict[str, float] = field(default_factory=dict)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "intent": self.intent,
+            "confidence": self.confidence,
+            "entities": self.entities,
+            "matches": [match._asdict() for match in self.matches],
+            "normalized_message": self.normalized,
+            "original_message": self.message
+        }
+
 class AIConversationEngine:
     def __init__(self):
         self.openai_client = None
+        self.llm: Optional[CachedLLMClient] = None
         self.conversation_history = {}
         
         # Intents suportados
@@ -48,15 +101,38 @@ class AIConversationEngine:
             "pedicure": ["pedicure", "pé"],
             "unhas_gel": ["gel", "unhas em gel", "alongamento"]
         }
+        
+        # Autômato único para intents, serviços, datas e períodos
+        self.matcher: Optional[KeywordMatcher] = None
+        
+        # Memo de análises e tempo acumulado por etapa (ms)
+        self._analysis_cache: "OrderedDict[str, MessageAnalysis]" = OrderedDict()
+        self.stage_timings = {"scan": 0.0, "intent": 0.0, "entities": 0.0, "response": 0.0}
+        self.stage_counts = dict.fromkeys(self.stage_timings, 0)
     
     async def initialize(self):
         """Inicializa o engine de IA"""
         try:
+            self.build_matcher()
+            
             # Configurar OpenAI (se disponível)
             api_key = os.getenv("OPENAI_API_KEY")
-            if api_key:
+            llm_cache = LLMResponseCache(
+                max_entries=int(os.getenv("AI_LLM_CACHE_SIZE", "2048")),
+                ttl=float(os.getenv("AI_LLM_CACHE_TTL", "3600"))
+            )
+            
+            if os.getenv("AI_LLM_STUB", "false").lower() == "true":
+                self.llm = CachedLLMClient(StubChatModel(), llm_cache)
+                logger.info("✅ Modelo local (stub) configurado")
+            elif api_key:
                 openai.api_key = api_key
                 self.openai_client = openai
+                model = OpenAIChatModel(
+                    openai.AsyncOpenAI(api_key=api_key),
+                    model=os.getenv("AI_LLM_MODEL", "gpt-3.5-turbo")
+                )
+                self.llm = CachedLLMClient(model, llm_cache)
                 logger.info("✅ OpenAI configurado")
             else:
                 logger.warning("⚠️ OpenAI não configurado - usando NLP básico")
@@ -64,22 +140,26 @@ class AIConversationEngine:
         except Exception as e:
             logger.error(f"❌ Erro ao inicializar AI Engine: {e}")
     
-    async def process_message(self, message: str, context: any, user_phone: str) -> Dict:
+    async def process_message(self, message: str, context: any, user_phone: str,
+                              message_id: str = None) -> Dict:
         """Processa mensagem e retorna resposta inteligente"""
         try:
-            # Detectar intent
-            intent_result = self.detect_intent(message)
-            intent = intent_result.get("intent")
-            entities = intent_result.get("entities", {})
+            # Analisar uma única vez (memorizado por message_id)
+            analysis = self.analyze(message, message_id)
             
             # Gerar resposta baseada no intent
-            response = await self.generate_response(message, context)
+            started = time.perf_counter()
+            response = await self.generate_response(message, context, analysis=analysis)
+            response_ms = (time.perf_counter() - started) * 1000
+            
+            self._record_stage("response", response_ms)
             
             return {
                 "response_text": response.get("message", "Desculpe, não entendi. Pode repetir?"),
-                "intent": intent,
-                "entities": entities,
-                "next_state": response.get("next_state", "waiting")
+                "intent": analysis.intent,
+                "entities": analysis.entities,
+                "next_state": response.get("next_state", "waiting"),
+                "timings": {**analysis.timings, "response": round(response_ms, 3)}
             }
             
         except Exception as e:
@@ -90,31 +170,124 @@ class AIConversationEngine:
                 "next_state": "error"
             }
     
+    def build_matcher(self) -> KeywordMatcher:
+        """Compila o vocabulário atual (intents, serviços, datas) no autômato.
+        
+        As palavras-chave passam pela mesma normalização das mensagens; a
+        forma original é guardada para devolver as entidades como declaradas.
+        """
+        matcher = KeywordMatcher()
+        self._keyword_rank = {}
+        self._canonical = {}
+        
+        vocabularies = (
+            ("intent", self.intents),
+            ("service", self.services),
+            ("date", DATE_KEYWORDS),
+            ("time", TIME_KEYWORDS)
+        )
+        for group, vocabulary in vocabularies:
+            for label, keywords in vocabulary.items():
+                for keyword in keywords:
+                    normalized = normalize(keyword).text
+                    matcher.add(normalized, group, label, whole_word=len(normalized) <= SHORT_KEYWORD_LENGTH)
+                    self._canonical.setdefault((group, normalized), keyword)
+                    # Ordem de declaração, para manter o desempate e a ordem dos resultados
+                    self._keyword_rank.setdefault((group, label, normalized), len(self._keyword_rank))
+        
+        matcher.build()
+        self._intent_rank = {name: i for i, name in enumerate(self.intents)}
+        
+        self.matcher = matcher
+        return matcher
+    
+    def scan(self, message: str) -> List:
+        """Todas as ocorrências de palavras-chave na mensagem, com posições"""
+        matcher = self.matcher or self.build_matcher()
+        return matcher.find_all(normalize(message).text)
+    
+    def analyze(self, message: str, message_id: str = None) -> MessageAnalysis:
+        """Roda scan, intent e entidades uma vez, cronometrando cada etapa"""
+        if message_id:
+            cached = self._analysis_cache.get(message_id)
+            if cached is not None and cached.message == message:
+                self._analysis_cache.move_to_end(message_id)
+                return cached
+        
+        timings = {}
+        
+        started = time.perf_counter()
+        matches = self.scan(message)
+        checkpoint = time.perf_counter()
+        timings["scan"] = (checkpoint - started) * 1000
+        
+        intent, confidence = self._score_intents(matches)
+        started, checkpoint = checkpoint, time.perf_counter()
+        timings["intent"] = (checkpoint - started) * 1000
+        
+        entities = self.extract_entities(message, matches)
+        timings["entities"] = (time.perf_counter() - checkpoint) * 1000
+        
+        for stage, elapsed in timings.items():
+            self._record_stage(stage, elapsed)
+        
+        analysis = MessageAnalysis(
+            message=message,
+            intent=intent,
+            confidence=confidence,
+            entities=entities,
+            matches=matches,
+            normalized=normalize(message).text,
+            timings={stage: round(elapsed, 3) for stage, elapsed in timings.items()}
+        )
+        
+        if message_id:
+            self._analysis_cache[message_id] = analysis
+            if len(self._analysis_cache) > ANALYSIS_CACHE_SIZE:
+                self._analysis_cache.popitem(last=False)
+        
+        return analysis
+    
+    def _record_stage(self, stage: str, elapsed_ms: float):
+        self.stage_timings[stage] += elapsed_ms
+        self.stage_counts[stage] += 1
+    
+    def get_timing_stats(self) -> Dict:
+        """Tempo médio (ms) por etapa de um turno de conversa"""
+        return {
+            "processed_messages": self.stage_counts["response"],
+            "avg_ms": {
+                stage: round(total / self.stage_counts[stage], 3) if self.stage_counts[stage] else 0
+                for stage, total in self.stage_timings.items()
+            }
+        }
+    
     def detect_intent(self, message: str) -> Dict:
         """Detecta a intenção da mensagem"""
-        message_lower = message.lower()
+        return self.analyze(message).to_dict()
+    
+    def _score_intents(self, matches: List) -> Tuple[str, float]:
         best_intent = "UNKNOWN"
         best_confidence = 0.0
         
-        # Buscar padrões nos intents
-        for intent_name, keywords in self.intents.items():
+        # Cada palavra-chave distinta encontrada soma 1/len(keywords) ao intent
+        hits = {}
+        for match in matches:
+            if match.group == "intent":
+                hits.setdefault(match.label, set()).add(match.keyword)
+        
+        for intent_name in sorted(hits, key=self._intent_rank.__getitem__):
+            weight = 1.0 / len(self.intents[intent_name])
             confidence = 0.0
-            for keyword in keywords:
-                if keyword in message_lower:
-                    confidence += 1.0 / len(keywords)
-            
+            for _ in hits[intent_name]:
+                confidence += weight
             if confidence > best_confidence:
                 best_confidence = confidence
                 best_intent = intent_name
         
-        return {
-            "intent": best_intent,
-            "confidence": best_confidence,
-            "entities": self.extract_entities(message),
-            "original_message": message
-        }
+        return best_intent, best_confidence
     
-    def extract_entities(self, message: str) -> Dict:
+    def extract_entities(self, message: str, matches: List = None) -> Dict:
         """Extrai entidades da mensagem"""
         entities = {
             "services": [],
@@ -123,45 +296,46 @@ class AIConversationEngine:
             "names": []
         }
         
-        message_lower = message.lower()
+        message_lower = normalize(message).text
+        if matches is None:
+            matches = self.scan(message)
         
-        # Detectar serviços
-        for service, keywords in self.services.items():
-            for keyword in keywords:
-                if keyword in message_lower:
-                    entities["services"].append(service)
+        by_group = {}
+        for match in matches:
+            by_group.setdefault(match.group, []).append(match)
         
-        # Detectar datas (padrões simples)
-        date_patterns = [
-            r"(segunda|terça|quarta|quinta|sexta|sábado|domingo)",
-            r"(amanhã|hoje|depois de amanhã)",
-            r"(\d{1,2}[/\-]\d{1,2})",
-            r"(dia \d{1,2})"
-        ]
+        # Serviços: um por palavra-chave distinta, na ordem do vocabulário
+        service_hits = {
+            (match.group, match.label, match.keyword)
+            for match in by_group.get("service", [])
+        }
+        for _, service, _ in sorted(service_hits, key=self._keyword_rank.__getitem__):
+            entities["services"].append(service)
         
-        for pattern in date_patterns:
-            matches = re.findall(pattern, message_lower)
-            entities["dates"].extend(matches)
+        # Datas e períodos por palavra, sem sobreposição dentro de cada tipo
+        for label in DATE_KEYWORDS:
+            found = [m for m in by_group.get("date", []) if m.label == label]
+            entities["dates"].extend(self._canonical[("date", m.keyword)] for m in leftmost_longest(found))
         
-        # Detectar horários
-        time_patterns = [
-            r"(\d{1,2}[:h]\d{0,2})",
-            r"(\d{1,2}h)",
-            r"(manhã|tarde|noite)"
-        ]
+        for pattern in NUMERIC_DATE_PATTERNS:
+            entities["dates"].extend(pattern.findall(message_lower))
+        for pattern in NUMERIC_TIME_PATTERNS:
+            entities["times"].extend(pattern.findall(message_lower))
         
-        for pattern in time_patterns:
-            matches = re.findall(pattern, message_lower)
-            entities["times"].extend(matches)
+        for label in TIME_KEYWORDS:
+            found = [m for m in by_group.get("time", []) if m.label == label]
+            entities["times"].extend(self._canonical[("time", m.keyword)] for m in leftmost_longest(found))
         
         return entities
     
-    async def generate_response(self, message: str, context: any = None) -> Dict:
+    async def generate_response(self, message: str, context: any = None,
+                                analysis: MessageAnalysis = None) -> Dict:
         """Gera resposta contextual baseada na mensagem"""
-        # Detectar intent e entidades
-        intent_result = self.detect_intent(message)
-        intent_name = intent_result.get("intent")
-        entities = intent_result.get("entities", {})
+        # Reaproveitar a análise feita em process_message, se houver
+        if analysis is None:
+            analysis = self.analyze(message)
+        intent_name = analysis.intent
+        entities = analysis.entities
         
         if intent_name == "SAUDACAO":
             return await self.handle_greeting(entities, context)
@@ -342,6 +516,17 @@ Ou me envie o código de confirmação se tiver!"""
     
     async def handle_unknown_intent(self, message: str, context: any) -> Dict:
         """Intent não reconhecido"""
+        if self.llm:
+            try:
+                reply = await self.llm.complete(message, state=self._conversation_state(context))
+                return {
+                    "message": reply,
+                    "intent": "UNKNOWN",
+                    "next_state": "clarification_needed"
+                }
+            except Exception as e:
+                logger.error(f"❌ Erro no fallback LLM: {e}")
+        
         responses = [
             "Não entendi muito bem 🤔 Você quer agendar um serviço? Digite 'AGENDAR'",
             "Desculpe, pode reformular? Para agendar, digite 'QUERO AGENDAR'",
@@ -357,6 +542,18 @@ Ou me envie o código de confirmação se tiver!"""
             "next_state": "clarification_needed"
         }
     
+    def _conversation_state(self, context: any) -> str:
+        """Impressão digital do estado da conversa para a chave do cache"""
+        if context is None:
+            return ""
+        if isinstance(context, dict):
+            return f"{context.get('conversation_state', '')}:{context.get('last_intent', '')}"
+        return f"{getattr(context, 'conversation_state', '')}:{getattr(context, 'last_intent', '')}"
+    
+    def get_llm_stats(self) -> Dict:
+        """Estatísticas do cache de respostas do modelo"""
+        return self.llm.get_stats() if self.llm else {"enabled": False}
+    
     def get_service_info(self, service_name: str) -> Dict:
         """Retorna informações do serviço"""
         service_data = {
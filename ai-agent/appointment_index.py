@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+🔎 APPOINTMENT INDEX
+Índices secundários em memória para consultas de agendamentos
+"""
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class AppointmentIndex:
+    """Índices id, telefone, data e profissional+data sobre os agendamentos.
+
+    Cada índice secundário guarda um dict ordenado de ids (usado como
+    conjunto ordenado), então inserção, remoção e consulta são O(1) e os
+    resultados preservam a ordem de criação.
+    """
+
+    def __init__(self):
+        self.by_id: Dict[str, Dict] = {}
+        self.by_phone: Dict[str, Dict[str, None]] = {}
+        self.by_date: Dict[str, Dict[str, None]] = {}
+        self.by_staff_date: Dict[Tuple[str, str], Dict[str, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self.by_id)
+
+    def load(self, appointments: Iterable[Dict]):
+        """Reconstrói todos os índices"""
+        self.clear()
+        for appointment in appointments:
+            self.upsert(appointment)
+
+    def clear(self):
+        self.by_id.clear()
+        self.by_phone.clear()
+        self.by_date.clear()
+        self.by_staff_date.clear()
+
+    def upsert(self, appointment: Dict):
+        """Insere ou atualiza um agendamento, movendo-o entre os índices se preciso"""
+        appointment_id = appointment['id']
+        previous = self.by_id.get(appointment_id)
+        if previous is not None:
+            self._unlink(previous)
+
+        self.by_id[appointment_id] = appointment
+        self.by_phone.setdefault(appointment.get('client_phone'), {})[appointment_id] = None
+        self.by_date.setdefault(appointment.get('scheduled_date'), {})[appointment_id] = None
+        staff_key = (appointment.get('staff_id'), appointment.get('scheduled_date'))
+        self.by_staff_date.setdefault(staff_key, {})[appointment_id] = None
+
+    def remove(self, appointment_id: str):
+        appointment = self.by_id.pop(appointment_id, None)
+        if appointment is not None:
+            self._unlink(appointment)
+
+    def get(self, appointment_id: str) -> Optional[Dict]:
+        return self.by_id.get(appointment_id)
+
+    def find_by_phone(self, phone: str) -> List[Dict]:
+        return self._resolve(self.by_phone.get(phone))
+
+    def find_by_date(self, date: str, staff_id: str = None) -> List[Dict]:
+        if staff_id:
+            return self._resolve(self.by_staff_date.get((staff_id, date)))
+        return self._resolve(self.by_date.get(date))
+
+    def find_from_date(self, date: str) -> List[Dict]:
+        """Agendamentos de `date` em diante (datas ISO comparam como texto)"""
+        return [
+            appointment
+            for day, ids in self.by_date.items() if day and day >= date
+            for appointment in self._resolve(ids)
+        ]
+
+    def _resolve(self, ids: Optional[Dict[str, None]]) -> List[Dict]:
+        if not ids:
+            return []
+        return [self.by_id[appointment_id] for appointment_id in ids]
+
+    def _unlink(self, appointment: Dict):
+        appointment_id = appointment['id']
+        staff_key = (appointment.get('staff_id'), appointment.get('scheduled_date'))
+
+        for index, key in (
+            (self.by_phone, appointment.get('client_phone')),
+            (self.by_date, appointment.get('scheduled_date')),
+            (self.by_staff_date, staff_key),
+        ):
+            ids = index.get(key)
+            if ids is None:
+                continue
+            ids.pop(appointment_id, None)
+            if not ids:
+                del index[key]
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+🗂️ AVAILABILITY INDEX
+Índice de intervalos ocupados por profissional e por dia
+"""
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+Interval = Tuple[datetime, datetime]
+
+
+class IntervalIndex:
+    """Intervalos ocupados ordenados e sem sobreposição de um único dia.
+
+    Os inícios e fins da união ficam em listas paralelas ordenadas, então a
+    busca é feita por bisseção (O(log n)). Intervalos que se tocam ou se
+    sobrepõem são mesclados na inserção. Cada intervalo registrado também
+    é contado à parte: remover uma reserva só libera o tempo que nenhuma
+    outra cobre (a união é refeita na próxima consulta).
+    """
+
+    def __init__(self):
+        self._starts: List[datetime] = []
+        self._ends: List[datetime] = []
+        self._counts: Dict[Interval, int] = {}
+        self._dirty = False
+
+    def __len__(self) -> int:
+        self._ensure_merged()
+        return len(self._starts)
+
+    def __iter__(self) -> Iterator[Interval]:
+        self._ensure_merged()
+        return iter(zip(self._starts, self._ends))
+
+    def add(self, start: datetime, end: datetime):
+        """Marca [start, end) como ocupado, mesclando com vizinhos"""
+        if end <= start:
+            return
+
+        self._counts[(start, end)] = self._counts.get((start, end), 0) + 1
+        if self._dirty:
+            return
+
+        # Primeiro intervalo cujo fim alcança o novo início
+        lo = bisect_left(self._ends, start)
+        # Primeiro intervalo que começa depois do novo fim
+        hi = bisect_right(self._starts, end)
+
+        if lo < hi:
+            start = min(start, self._starts[lo])
+            end = max(end, self._ends[hi - 1])
+
+        self._starts[lo:hi] = [start]
+        self._ends[lo:hi] = [end]
+
+    def remove(self, start: datetime, end: datetime):
+        """Desfaz um add(start, end); intervalos nunca registrados são ignorados"""
+        count = self._counts.get((start, end))
+        if not count:
+            return
+
+        if count > 1:
+            self._counts[(start, end)] = count - 1
+        else:
+            del self._counts[(start, end)]
+            self._dirty = True
+
+    def _ensure_merged(self):
+        """Refaz a união a partir dos intervalos registrados após uma remoção"""
+        if not self._dirty:
+            return
+
+        starts: List[datetime] = []
+        ends: List[datetime] = []
+        for start, end in sorted(self._counts):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+
+        self._starts, self._ends = starts, ends
+        self._dirty = False
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """Retorna True se [start, end) não toca nenhum intervalo ocupado"""
+        self._ensure_merged()
+        i = bisect_right(self._ends, start)
+        return i >= len(self._starts) or self._starts[i] >= end
+
+    def free_gaps(self, window_start: datetime, window_end: datetime) -> Iterator[Interval]:
+        """Enumera as janelas livres dentro de [window_start, window_end)"""
+        self._ensure_merged()
+        cursor = window_start
+        i = bisect_right(self._ends, window_start)
+
+        while i < len(self._starts) and self._starts[i] < window_end:
+            if self._starts[i] > cursor:
+                yield cursor, self._starts[i]
+            cursor = max(cursor, self._ends[i])
+            i += 1
+
+        if cursor < window_end:
+            yield cursor, window_end
+
+
+class AvailabilityIndex:
+    """Coleção de IntervalIndex indexada por (staff_id, data)"""
+
+    def __init__(self):
+        self._days: Dict[Tuple[str, date], IntervalIndex] = {}
+
+    def day(self, staff_id: str, day: date) -> Optional[IntervalIndex]:
+        """Retorna o índice do dia, se houver algo ocupado"""
+        return self._days.get((staff_id, day))
+
+    def add_busy(self, staff_id: str, start: datetime, end: datetime):
+        """Registra um período ocupado para o profissional"""
+        key = (staff_id, start.date())
+        index = self._days.get(key)
+        if index is None:
+            index = self._days[key] = IntervalIndex()
+        index.add(start, end)
+
+    def remove_busy(self, staff_id: str, start: datetime, end: datetime):
+        """Libera um período registrado com add_busy (o mesmo start/end)"""
+        key = (staff_id, start.date())
+        index = self._days.get(key)
+        if index is None:
+            return
+        index.remove(start, end)
+        if not index:
+            del self._days[key]
+
+    def is_free(self, staff_id: str, start: datetime, end: datetime) -> bool:
+        """Verifica se o período está livre para o profissional"""
+        index = self._days.get((staff_id, start.date()))
+        return index is None or index.is_free(start, end)
+
+    def free_gaps(self, staff_id: str, window_start: datetime, window_end: datetime) -> Iterator[Interval]:
+        """Janelas livres do profissional dentro do expediente informado"""
+        index = self._days.get((staff_id, window_start.date()))
+        if index is None:
+            if window_start < window_end:
+                yield window_start, window_end
+            return
+        yield from index.free_gaps(window_start, window_end)
+
+    def clear(self):
+        """Remove todos os intervalos"""
+        self._days.clear()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+📋 BOOKING PIPELINE
+Reserva do horário, gravação local e efeitos colaterais via outbox assíncrono
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from itertools import count
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from journal import AppendOnlyJournal
+from sqlite_store import SlotConflict
+
+
+def calendar_event_id(booking_id: str) -> str:
+    """Id do evento no Google Calendar derivado do agendamento (base32hex)"""
+    return "bk" + hashlib.sha1(booking_id.encode()).hexdigest()
+
+
+class SlotUnavailable(Exception):
+    """O horário pedido não está livre"""
+
+
+class PermanentFailure(Exception):
+    """Falha de efeito colateral que não deve ser repetida (ambígua ou definitiva)"""
+
+
+@dataclass
+class OutboxTask:
+    id: str
+    kind: str
+    payload: Dict
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class SideEffectOutbox:
+    """Tarefas pós-commit (agenda, WhatsApp) executadas fora da requisição.
+
+    Cada tarefa é registrada no journal antes de a requisição responder e
+    só sai dele quando o handler do seu tipo conclui ou as tentativas se
+    esgotam, então efeitos pendentes sobrevivem a um reinício. Um handler
+    falha levantando exceção; a nova tentativa usa backoff exponencial.
+    PermanentFailure descarta a tarefa sem nova tentativa.
+    """
+
+    def __init__(self, workers: int = None, max_retries: int = 5, retry_backoff: float = 2.0,
+                 journal_path: str = 'booking_outbox.jsonl', snapshot_path: str = 'booking_outbox.json'):
+        self.workers = workers or int(os.getenv("BOOKING_OUTBOX_WORKERS", "4"))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        self.handlers: Dict[str, Callable[[Dict], Awaitable[Any]]] = {}
+        self.journal = AppendOnlyJournal(journal_path, snapshot_path)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._ids = count()
+
+        self.stats = {
+            "enqueued": 0,
+            "completed": 0,
+            "failed": 0,
+            "retried": 0,
+            "total_latency": 0.0
+        }
+
+    def register(self, kind: str, handler: Callable[[Dict], Awaitable[Any]]):
+        self.handlers[kind] = handler
+
+    async def start(self):
+        """Recupera tarefas pendentes do journal e inicia os workers"""
+        if self._worker_tasks:
+            return
+
+        pending = await asyncio.to_thread(self.journal.load)
+        for record in pending.values():
+            self._queue.put_nowait(OutboxTask(**record))
+        if pending:
+            logger.info(f"📋 {len(pending)} tarefas pendentes recuperadas do outbox")
+
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"booking-outbox-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Aguarda a fila esvaziar (até o timeout) e encerra os workers"""
+        if self._worker_tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ {self._queue.qsize()} tarefas ainda pendentes no outbox")
+
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks = []
+
+        await asyncio.to_thread(self.journal.close)
+
+    async def enqueue_many(self, tasks: Iterable[Tuple[str, Dict]]) -> List[str]:
+        """Registra um lote de (tipo, payload) com uma única ida ao journal"""
+        batch = [
+            OutboxTask(id=f"task_{int(time.time() * 1000)}_{next(self._ids)}", kind=kind, payload=payload)
+            for kind, payload in tasks
+        ]
+
+        await asyncio.to_thread(self._persist_batch, batch)
+
+        for task in batch:
+            self._queue.put_nowait(task)
+        self.stats["enqueued"] += len(batch)
+
+        return [task.id for task in batch]
+
+    def get_stats(self) -> Dict:
+        completed = self.stats["completed"]
+        return {
+            "queue_depth": self._queue.qsize(),
+            "enqueued": self.stats["enqueued"],
+            "completed": completed,
+            "failed": self.stats["failed"],
+            "retried": self.stats["retried"],
+            "avg_task_latency_ms": round(self.stats["total_latency"] / completed * 1000, 2) if completed else 0,
+            "workers": len(self._worker_tasks)
+        }
+
+    def _persist_batch(self, batch: List[OutboxTask]):
+        for task in batch:
+            self.journal.put(task.id, asdict(task))
+
+    async def _worker(self):
+        while True:
+            task = await self._queue.get()
+            try:
+                await self._run(task)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Erro no worker do outbox: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, task: OutboxTask):
+        handler = self.handlers.get(task.kind)
+        started = time.monotonic()
+        try:
+            if handler is None:
+                raise LookupError(f"sem handler para '{task.kind}'")
+            await handler(task.payload)
+        except PermanentFailure as e:
+            self.stats["failed"] += 1
+            await asyncio.to_thread(self.journal.delete, task.id)
+            logger.error(f"❌ {task.kind} descartado sem nova tentativa: {e}")
+            return
+        except Exception as e:
+            await self._retry(task, e)
+            return
+
+        self.stats["completed"] += 1
+        self.stats["total_latency"] += time.monotonic() - started
+        await asyncio.to_thread(self.journal.delete, task.id)
+
+    async def _retry(self, task: OutboxTask, error: Exception):
+        task.attempts += 1
+        if task.attempts < self.max_retries:
+            self.stats["retried"] += 1
+            logger.warning(f"⚠️ {task.kind} falhou ({error}), tentativa {task.attempts}")
+            await asyncio.to_thread(self.journal.put, task.id, asdict(task))
+            delay = self.retry_backoff * (2 ** (task.attempts - 1))
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, task)
+        else:
+            self.stats["failed"] += 1
+            await asyncio.to_thread(self.journal.delete, task.id)
+            logger.error(f"❌ {task.kind} descartado após {task.attempts} tentativas: {error}")
+
+
+class BookingPipeline:
+    """Criação de agendamento em três passos.
+
+    1. Reserva o horário no índice do scheduler (síncrono, sem corrida).
+    2. Grava o agendamento no banco; se falhar, a reserva é desfeita.
+    3. Registra no outbox o evento do Google Calendar e a confirmação por
+       WhatsApp, que rodam em paralelo e com retry depois da resposta.
+
+    O banco é a fonte das reservas: start() as recoloca no índice, cancel()
+    as retira e, no SQLite local, a gravação recusa horários sobrepostos
+    mesmo vindos de outro processo (SlotConflict vira SlotUnavailable). O evento
+    da agenda usa um id derivado do agendamento, então repetir a tarefa
+    não cria um segundo evento.
+    """
+
+    def __init__(self, scheduler, db_manager, calendar_manager, notification_engine,
+                 outbox: Optional[SideEffectOutbox] = None):
+        self.scheduler = scheduler
+        self.db_manager = db_manager
+        self.calendar_manager = calendar_manager
+        self.notification_engine = notification_engine
+
+        self.outbox = outbox or SideEffectOutbox()
+        self.outbox.register("calendar_event", self._create_calendar_event)
+        self.outbox.register("booking_confirmation", self._send_confirmation)
+
+    async def start(self):
+        """Reconstrói as reservas a partir do banco e inicia o outbox"""
+        appointments = await self.db_manager.get_upcoming_appointments(datetime.now().strftime("%Y-%m-%d"))
+        indexed = self.scheduler.index_appointments(appointments)
+        logger.info(f"📋 {indexed} reservas recuperadas do banco")
+        await self.outbox.start()
+
+    async def stop(self):
+        await self.outbox.stop()
+
+    async def create(self, service_type: str, date: str, time: str, client_name: str,
+                     client_phone: str, staff_preference: str = None) -> Dict:
+        """Confirma o agendamento após a gravação local; levanta SlotUnavailable"""
+        slot = self.scheduler.reserve_slot(service_type, date, time, staff_preference)
+        if slot is None:
+            raise SlotUnavailable(f"{service_type} em {date} {time}")
+
+        staff_id, start_time, end_time = slot
+        service_info = self.scheduler.services[service_type]
+        staff_name = self.scheduler.staff[staff_id]["name"]
+
+        try:
+            booking_id = await self.db_manager.create_appointment(
+                client_name=client_name,
+                client_phone=client_phone,
+                service_type=service_type,
+                scheduled_date=date,
+                scheduled_time=time,
+                service_name=service_info.name,
+                staff_id=staff_id,
+                staff_name=staff_name,
+                duration_minutes=service_info.duration_minutes,
+                price=service_info.price
+            )
+        except SlotConflict as e:
+            # Outro processo gravou o horário antes: o banco é quem decide
+            self.scheduler.release_slot(staff_id, start_time, end_time)
+            raise SlotUnavailable(str(e)) from e
+        except Exception:
+            self.scheduler.release_slot(staff_id, start_time, end_time)
+            raise
+
+        booking_data = {
+            "booking_id": booking_id,
+            "client_name": client_name,
+            "client_phone": client_phone,
+            "service_type": service_type,
+            "service_name": service_info.name,
+            "staff_id": staff_id,
+            "staff_member": staff_name,
+            "date": date,
+            "time": time,
+            "duration": service_info.duration_minutes,
+            "price": f"{service_info.price:.2f}"
+        }
+
+        await self.outbox.enqueue_many([
+            ("calendar_event", booking_data),
+            ("booking_confirmation", booking_data)
+        ])
+
+        return booking_data
+
+    async def cancel(self, booking_id: str, reason: str = None) -> bool:
+        """Cancela no banco e libera o horário no índice do scheduler"""
+        appointment = await self.db_manager.get_appointment(booking_id)
+        if appointment is None or appointment.get("status") == "cancelled":
+            return False
+        if not await self.db_manager.cancel_appointment(booking_id, reason):
+            return False
+
+        self.scheduler.release_appointment(appointment)
+        return True
+
+    async def _create_calendar_event(self, booking_data: Dict):
+        event = await self.calendar_manager.create_event(
+            title=f"{booking_data['service_type']} - {booking_data['client_name']}",
+            start_datetime=f"{booking_data['date']}T{booking_data['time']}",
+            duration_minutes=booking_data['duration'],
+            event_id=calendar_event_id(booking_data['booking_id'])
+        )
+        if not event.get("success"):
+            raise RuntimeError(event.get("error", "falha ao criar evento"))
+
+        await self.db_manager.update_appointment(booking_data['booking_id'], {"calendar_event_id": event.get("id")})
+
+    async def _send_confirmation(self, booking_data: Dict):
+        result = await self.notification_engine.confirm_booking(booking_data)
+        if result.get("success"):
+            return
+        # Um timeout pode ter entregue a mensagem: repetir só o que certamente não saiu
+        if result.get("retryable"):
+            raise RuntimeError(f"confirmação não enviada: {result.get('error')}")
+        raise PermanentFailure(f"confirmação não confirmada: {result.get('error')}")
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+🗓️ CALENDAR CACHE
+Cache local dos eventos do Google Calendar com sync incremental (syncToken)
+"""
+
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta
+from itertools import count
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+from loguru import logger
+
+from availability_index import IntervalIndex
+
+
+CALENDAR_TIMEZONE = os.getenv("CALENDAR_TIMEZONE", "America/Sao_Paulo")
+
+
+class CalendarEventCache:
+    """Eventos de um calendário em memória, indexados por dia.
+
+    Horários são convertidos uma única vez, na entrada, para datetimes
+    locais sem fuso. Cada dia guarda os ids dos eventos que o tocam e, sob
+    demanda, um IntervalIndex com a união dos períodos ocupados; uma
+    alteração só invalida o índice dos dias afetados.
+    """
+
+    def __init__(self, timezone: str = CALENDAR_TIMEZONE):
+        self.tz = ZoneInfo(timezone)
+        self.events: Dict[str, Tuple[datetime, datetime, Dict]] = {}
+        self._by_day: Dict[date, Set[str]] = {}
+        self._busy: Dict[date, IntervalIndex] = {}
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+    def clear(self):
+        self.events.clear()
+        self._by_day.clear()
+        self._busy.clear()
+
+    def apply(self, items: Iterable[Dict]) -> int:
+        """Aplica uma lista de eventos da API (cancelados são removidos)"""
+        changed = 0
+        for event in items:
+            if event.get("status") == "cancelled":
+                self.remove(event["id"])
+            else:
+                self.upsert(event)
+            changed += 1
+        return changed
+
+    def upsert(self, event: Dict):
+        self.remove(event["id"])
+        try:
+            start = self.to_local(event["start"])
+            end = self.to_local(event["end"])
+        except (KeyError, ValueError) as e:
+            logger.warning(f"⚠️ Evento {event.get('id')} ignorado: {e}")
+            return
+
+        self.events[event["id"]] = (start, end, event)
+        for day in _days(start, end):
+            self._by_day.setdefault(day, set()).add(event["id"])
+            self._busy.pop(day, None)
+
+    def remove(self, event_id: str):
+        entry = self.events.pop(event_id, None)
+        if entry is None:
+            return
+        for day in _days(entry[0], entry[1]):
+            ids = self._by_day.get(day)
+            if ids:
+                ids.discard(event_id)
+                if not ids:
+                    del self._by_day[day]
+            self._busy.pop(day, None)
+
+    def events_between(self, start: datetime, end: datetime) -> List[Dict]:
+        """Eventos que se sobrepõem a [start, end), em ordem de início"""
+        start, end = self.to_naive(start), self.to_naive(end)
+        ids = set()
+        for day in _days(start, end):
+            ids.update(self._by_day.get(day, ()))
+
+        overlapping = [self.events[event_id] for event_id in ids]
+        overlapping = [entry for entry in overlapping if entry[0] < end and entry[1] > start]
+        overlapping.sort(key=lambda entry: entry[0])
+        return [event for _, _, event in overlapping]
+
+    def is_free(self, start: datetime, end: datetime) -> bool:
+        """True se nenhum evento ocupa parte de [start, end)"""
+        start, end = self.to_naive(start), self.to_naive(end)
+        for day in _days(start, end):
+            index = self._day_index(day)
+            if index is None:
+                continue
+            day_start = datetime.combine(day, datetime.min.time())
+            if not index.is_free(max(start, day_start), min(end, day_start + timedelta(days=1))):
+                return False
+        return True
+
+    def to_local(self, value: Dict) -> datetime:
+        """Converte o campo start/end da API (dateTime ou date) para hora local"""
+        if "dateTime" in value:
+            return self.to_naive(datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")))
+        return datetime.fromisoformat(value["date"])
+
+    def to_naive(self, moment: datetime) -> datetime:
+        if moment.tzinfo is None:
+            return moment
+        return moment.astimezone(self.tz).replace(tzinfo=None)
+
+    def _day_index(self, day: date) -> Optional[IntervalIndex]:
+        index = self._busy.get(day)
+        if index is None:
+            ids = self._by_day.get(day)
+            if not ids:
+                return None
+            index = self._busy[day] = IntervalIndex()
+            for event_id in ids:
+                start, end, _ = self.events[event_id]
+                index.add(start, end)
+        return index
+
+
+class IncrementalCalendarSync:
+    """Mantém um CalendarEventCache atualizado via events().list.
+
+    A primeira carga lista os eventos que terminam a partir de `past_days`
+    dias atrás (timeMin) e guarda o nextSyncToken; as seguintes pedem só o
+    que mudou desde então. Se o token expirar (410 Gone), o cache é
+    descartado e refeito com uma carga completa. Chamadas simultâneas a
+    ensure_fresh compartilham a mesma sincronização.
+    """
+
+    def __init__(self, service, calendar_id: str, cache: CalendarEventCache,
+                 sync_interval: float = None, page_size: int = 250, past_days: int = None):
+        self.service = service
+        self.calendar_id = calendar_id
+        self.cache = cache
+        self.sync_interval = sync_interval if sync_interval is not None else float(os.getenv("CALENDAR_SYNC_INTERVAL", "30"))
+        self.page_size = page_size
+        self.past_days = past_days if past_days is not None else int(os.getenv("CALENDAR_SYNC_PAST_DAYS", "30"))
+
+        self.sync_token: Optional[str] = None
+        self.last_sync: Optional[float] = None
+        self._lock = asyncio.Lock()
+        self.stats = {"full_syncs": 0, "incremental_syncs": 0, "events_applied": 0, "resets": 0, "errors": 0}
+
+    async def ensure_fresh(self):
+        """Sincroniza se a última sincronização for mais antiga que sync_interval"""
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            try:
+                await self.sync()
+            except Exception as e:
+                # Sem conexão: segue com o cache atual e tenta de novo na próxima consulta
+                self.stats["errors"] += 1
+                logger.error(f"❌ Erro ao sincronizar Google Calendar: {e}")
+
+    async def sync(self) -> int:
+        if self.sync_token:
+            try:
+                items, token = await asyncio.to_thread(self._list, {"syncToken": self.sync_token})
+                self.stats["incremental_syncs"] += 1
+                return self._finish(items, token)
+            except Exception as e:
+                if not _is_gone(e):
+                    raise
+                self.stats["resets"] += 1
+                logger.warning("⚠️ syncToken expirado, refazendo carga completa do calendário")
+
+        # O histórico antigo não interessa à agenda; o token herda a janela
+        items, token = await asyncio.to_thread(self._list, {"timeMin": self._time_min()})
+        self.cache.clear()
+        self.stats["full_syncs"] += 1
+        applied = self._finish(items, token)
+        logger.info(f"📅 {len(self.cache)} eventos carregados no cache do calendário")
+        return applied
+
+    def get_stats(self) -> Dict:
+        return {
+            "cached_events": len(self.cache),
+            "last_sync_age_s": round(time.monotonic() - self.last_sync, 1) if self.last_sync else None,
+            **self.stats
+        }
+
+    def _time_min(self) -> str:
+        return (datetime.now(self.cache.tz) - timedelta(days=self.past_days)).isoformat()
+
+    def _is_fresh(self) -> bool:
+        return self.last_sync is not None and time.monotonic() - self.last_sync < self.sync_interval
+
+    def _finish(self, items: List[Dict], token: Optional[str]) -> int:
+        applied = self.cache.apply(items)
+        self.sync_token = token
+        self.last_sync = time.monotonic()
+        self.stats["events_applied"] += applied
+        return applied
+
+    def _list(self, params: Dict) -> Tuple[List[Dict], Optional[str]]:
+        """Percorre todas as páginas (bloqueante; roda em thread)"""
+        items: List[Dict] = []
+        page_token = None
+        while True:
+            result = self.service.events().list(
+                calendarId=self.calendar_id,
+                singleEvents=True,
+                maxResults=self.page_size,
+                pageToken=page_token,
+                **params
+            ).execute()
+            items.extend(result.get("items", []))
+            page_token = result.get("nextPageToken")
+            if not page_token:
+                return items, result.get("nextSyncToken")
+
+
+class FakeHttpError(Exception):
+    """Erro HTTP no formato do googleapiclient (status em resp.status)"""
+
+    def __init__(self, status: int, reason: str):
+        super().__init__(f"{status} {reason}")
+        self.resp = type("Response", (), {"status": status, "reason": reason})()
+
+
+class FakeCalendarService:
+    """Subconjunto em processo da API de eventos do Google Calendar, para testes"""
+
+    def __init__(self):
+        self._events: Dict[str, Dict] = {}
+        self._changed_at: Dict[str, int] = {}
+        self._seq = 0
+        self._oldest_token = 0
+        self._ids = count(1)
+
+    def events(self) -> "_FakeEvents":
+        return _FakeEvents(self)
+
+    def expire_sync_tokens(self):
+        """Invalida os syncTokens emitidos até agora (próximo list dá 410)"""
+        self._seq += 1
+        self._oldest_token = self._seq
+
+    def _touch(self, event: Dict) -> Dict:
+        self._seq += 1
+        self._events[event["id"]] = event
+        self._changed_at[event["id"]] = self._seq
+        return dict(event)
+
+
+class _FakeRequest:
+    def __init__(self, run):
+        self._run = run
+
+    def execute(self):
+        return self._run()
+
+
+class _FakeEvents:
+    def __init__(self, service: FakeCalendarService):
+        self.service = service
+
+    def list(self, calendarId: str, syncToken: str = None, pageToken: str = None,
+             maxResults: int = 250, **params) -> _FakeRequest:
+        def run():
+            service = self.service
+            if syncToken is not None:
+                since = int(syncToken)
+                if since < service._oldest_token:
+                    raise FakeHttpError(410, "Gone")
+                ids = [event_id for event_id, seq in service._changed_at.items() if seq > since]
+            else:
+                ids = [event_id for event_id, event in service._events.items() if event.get("status") != "cancelled"]
+                if "timeMin" in params:
+                    time_min = datetime.fromisoformat(params["timeMin"])
+                    ids = [event_id for event_id in ids if _event_end(service._events[event_id]) > time_min]
+
+            offset = int(pageToken or 0)
+            page = [dict(service._events[event_id]) for event_id in ids[offset:offset + maxResults]]
+            result = {"items": page}
+            if offset + maxResults < len(ids):
+                result["nextPageToken"] = str(offset + maxResults)
+            else:
+                result["nextSyncToken"] = str(service._seq)
+            return result
+        return _FakeRequest(run)
+
+    def insert(self, calendarId: str, body: Dict) -> _FakeRequest:
+        def run():
+            event_id = body.get("id") or f"fake_{next(self.service._ids)}"
+            if event_id in self.service._events:
+                raise FakeHttpError(409, "Conflict")
+            return self.service._touch({**body, "id": event_id, "status": "confirmed",
+                                        "htmlLink": f"https://calendar.google.com/fake/{event_id}"})
+        return _FakeRequest(run)
+
+    def get(self, calendarId: str, eventId: str) -> _FakeRequest:
+        return _FakeRequest(lambda: dict(self._existing(eventId)))
+
+    def update(self, calendarId: str, eventId: str, body: Dict) -> _FakeRequest:
+        def run():
+            self._existing(eventId)
+            return self.service._touch({**body, "id": eventId})
+        return _FakeRequest(run)
+
+    def delete(self, calendarId: str, eventId: str) -> _FakeRequest:
+        def run():
+            event = self._existing(eventId)
+            self.service._touch({**event, "status": "cancelled"})
+            return ""
+        return _FakeRequest(run)
+
+    def _existing(self, event_id: str) -> Dict:
+        event = self.service._events.get(event_id)
+        if event is None or event.get("status") == "cancelled":
+            raise FakeHttpError(404, "Not Found")
+        return event
+
+
+def _days(start: datetime, end: datetime) -> Iterator[date]:
+    """Dias tocados por [start, end)"""
+    day = start.date()
+    last = (end - timedelta(microseconds=1)).date() if end > start else day
+    while day <= last:
+        yield day
+        day += timedelta(days=1)
+
+
+def _event_end(event: Dict) -> datetime:
+    """Fim do evento com fuso (eventos de dia inteiro em UTC), como no filtro timeMin"""
+    end = event["end"]
+    if "dateTime" in end:
+        moment = datetime.fromisoformat(end["dateTime"].replace("Z", "+00:00"))
+    else:
+        moment = datetime.fromisoformat(end["date"])
+    return moment if moment.tzinfo else moment.replace(tzinfo=ZoneInfo("UTC"))
+
+
+def _is_gone(error: Exception) -> bool:
+    status = getattr(getattr(error, "resp", None), "status", None)
+    return str(status) == "410"
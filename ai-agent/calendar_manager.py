@@ -16,6 +16,25 @@ from loguru import logger
 import os
 import json
 import pickle
+import asyncio
+
+from calendar_cache import CalendarEventCache, FakeCalendarService, IncrementalCalendarSync
+
+# Eventos usados em modo simulação (sem credenciais)
+SIMULATED_EVENTS = [
+    {
+        "id": "sim_1",
+        "summary": "Corte - Maria Silva",
+        "start": {"dateTime": "2025-10-05T14:00:00"},
+        "end": {"dateTime": "2025-10-05T15:00:00"}
+    },
+    {
+        "id": "sim_2", 
+        "summary": "Tintura - Ana Santos",
+        "start": {"dateTime": "2025-10-05T16:00:00"},
+        "end": {"dateTime": "2025-10-05T18:00:00"}
+    }
+]
 
 class GoogleCalendarManager:
     def __init__(self):
@@ -23,9 +42,20 @@ class GoogleCalendarManager:
         self.service = None
         self.calendar_id = os.getenv('GOOGLE_CALENDAR_ID', 'primary')
         
+        # Cache local dos eventos; consultas de disponibilidade não vão à API
+        self.cache = CalendarEventCache()
+        self.cache.apply(SIMULATED_EVENTS)
+        self.sync: Optional[IncrementalCalendarSync] = None
+        
     async def initialize(self):
         """Inicializa conexão com Google Calendar"""
         try:
+            # Calendário em memória para testes offline
+            if os.getenv('GOOGLE_CALENDAR_FAKE', 'false').lower() == 'true':
+                await self.attach_service(FakeCalendarService())
+                logger.info("✅ Google Calendar fake em memória")
+                return
+            
             creds = None
             
             # Verificar se já existe token salvo
@@ -52,7 +82,7 @@ class GoogleCalendarManager:
             
             # Construir serviço
             if creds:
-                self.service = build('calendar', 'v3', credentials=creds)
+                await self.attach_service(build('calendar', 'v3', credentials=creds))
                 logger.info("✅ Google Calendar conectado")
             else:
                 logger.warning("⚠️ Google Calendar em modo simulação")
@@ -60,16 +90,29 @@ class GoogleCalendarManager:
         except Exception as e:
             logger.error(f"❌ Erro ao inicializar Google Calendar: {e}")
     
+    async def attach_service(self, service):
+        """Usa o serviço informado e faz a carga inicial do cache"""
+        self.service = service
+        self.sync = IncrementalCalendarSync(service, self.calendar_id, self.cache)
+        await self.sync.ensure_fresh()
+    
+    def get_cache_stats(self) -> Dict:
+        """Estatísticas do cache e da sincronização"""
+        if not self.sync:
+            return {"cached_events": len(self.cache), "mode": "simulation"}
+        return self.sync.get_stats()
+    
     async def create_event(self, title: str, start_datetime: str, duration_minutes: int = 60, 
-                          description: str = "", attendee_email: str = None) -> Dict:
-        """Cria evento no Google Calendar"""
+                          description: str = "", attendee_email: str = None,
+                          event_id: str = None) -> Dict:
+        """Cria evento no Google Calendar (com `event_id`, repetir a chamada não duplica)"""
         try:
             if not self.service:
                 # Modo simulação
                 logger.info(f"📅 [SIMULAÇÃO] Evento criado: {title} em {start_datetime}")
                 return {
                     "success": True,
-                    "id": f"sim_event_{datetime.now().timestamp()}",
+                    "id": event_id or f"sim_event_{datetime.now().timestamp()}",
                     "status": "simulation",
                     "htmlLink": "https://calendar.google.com/simulation"
                 }
@@ -105,11 +148,25 @@ class GoogleCalendarManager:
                     {'email': attendee_email}
                 ]
             
+            # Id escolhido pelo cliente: uma nova tentativa recebe 409 em vez de duplicar
+            if event_id:
+                event['id'] = event_id
+            
             # Criar evento
-            event_result = self.service.events().insert(
-                calendarId=self.calendar_id, 
-                body=event
-            ).execute()
+            try:
+                event_result = await asyncio.to_thread(self.service.events().insert(
+                    calendarId=self.calendar_id, 
+                    body=event
+                ).execute)
+            except Exception as error:
+                if not event_id or str(getattr(getattr(error, 'resp', None), 'status', None)) != "409":
+                    raise
+                logger.info(f"📅 Evento {event_id} já existia no Google Calendar")
+                event_result = await asyncio.to_thread(self.service.events().get(
+                    calendarId=self.calendar_id,
+                    eventId=event_id
+                ).execute)
+            self.cache.upsert(event_result)
             
             logger.info(f"✅ Evento criado no Google Calendar: {event_result.get('id')}")
             
@@ -141,21 +198,22 @@ class GoogleCalendarManager:
                 return {"success": True, "status": "simulation"}
             
             # Buscar evento existente
-            event = self.service.events().get(
+            event = await asyncio.to_thread(self.service.events().get(
                 calendarId=self.calendar_id, 
                 eventId=event_id
-            ).execute()
+            ).execute)
             
             # Aplicar atualizações
             for key, value in updates.items():
                 event[key] = value
             
             # Salvar atualização
-            updated_event = self.service.events().update(
+            updated_event = await asyncio.to_thread(self.service.events().update(
                 calendarId=self.calendar_id,
                 eventId=event_id,
                 body=event
-            ).execute()
+            ).execute)
+            self.cache.upsert(updated_event)
             
             logger.info(f"✅ Evento atualizado: {event_id}")
             
@@ -179,10 +237,11 @@ class GoogleCalendarManager:
                 logger.info(f"📅 [SIMULAÇÃO] Evento deletado: {event_id}")
                 return {"success": True, "status": "simulation"}
             
-            self.service.events().delete(
+            await asyncio.to_thread(self.service.events().delete(
                 calendarId=self.calendar_id,
                 eventId=event_id
-            ).execute()
+            ).execute)
+            self.cache.remove(event_id)
             
             logger.info(f"✅ Evento deletado: {event_id}")
             
@@ -199,35 +258,14 @@ class GoogleCalendarManager:
             }
     
     async def get_events(self, start_date: datetime, end_date: datetime) -> List[Dict]:
-        """Busca eventos em um período"""
+        """Busca eventos em um período (a partir do cache local)"""
         try:
             if not self.service:
                 # Simular eventos
-                return [
-                    {
-                        "id": "sim_1",
-                        "summary": "Corte - Maria Silva",
-                        "start": {"dateTime": "2025-10-05T14:00:00"},
-                        "end": {"dateTime": "2025-10-05T15:00:00"}
-                    },
-                    {
-                        "id": "sim_2", 
-                        "summary": "Tintura - Ana Santos",
-                        "start": {"dateTime": "2025-10-05T16:00:00"},
-                        "end": {"dateTime": "2025-10-05T18:00:00"}
-                    }
-                ]
-            
-            # Buscar eventos reais
-            events_result = self.service.events().list(
-                calendarId=self.calendar_id,
-                timeMin=start_date.isoformat() + 'Z',
-                timeMax=end_date.isoformat() + 'Z',
-                singleEvents=True,
-                orderBy='startTime'
-            ).execute()
+                return list(SIMULATED_EVENTS)
             
-            events = events_result.get('items', [])
+            await self.sync.ensure_fresh()
+            events = self.cache.events_between(start_date, end_date)
             
             logger.info(f"📅 {len(events)} eventos encontrados")
             
@@ -240,25 +278,14 @@ class GoogleCalendarManager:
     async def check_availability(self, start_datetime: str, end_datetime: str) -> bool:
         """Verifica se horário está livre"""
         try:
-            start_dt = datetime.fromisoformat(start_datetime.replace('T', ' '))
-            end_dt = datetime.fromisoformat(end_datetime.replace('T', ' '))
-            
-            events = await self.get_events(start_dt, end_dt)
+            start_dt = datetime.fromisoformat(start_datetime.replace('Z', '+00:00'))
+            end_dt = datetime.fromisoformat(end_datetime.replace('Z', '+00:00'))
             
-            # Verificar conflitos
-            for event in events:
-                event_start = datetime.fromisoformat(
-                    event['start']['dateTime'].replace('Z', '').replace('T', ' ')
-                )
-                event_end = datetime.fromisoformat(
-                    event['end']['dateTime'].replace('Z', '').replace('T', ' ')
-                )
-                
-                # Verificar sobreposição
-                if not (end_dt <= event_start or start_dt >= event_end):
-                    return False  # Conflito encontrado
+            if self.sync:
+                await self.sync.ensure_fresh()
             
-            return True  # Livre
+            # Consulta ao índice de intervalos do cache (sem chamada à API)
+            return self.cache.is_free(start_dt, end_dt)
             
         except Exception as e:
             logger.error(f"❌ Erro ao verificar disponibilidade: {e}")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+📈 CLIENT AGGREGATES
+Métricas incrementais por cliente (gasto, visitas, última visita)
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+
+@dataclass
+class ClientStats:
+    phone: str
+    total_appointments: int = 0
+    completed_appointments: int = 0
+    # Em centavos: somas e subtrações repetidas não acumulam erro de float
+    spent_cents: int = 0
+    conversations_count: int = 0
+    appointment_dates: Dict[str, int] = field(default_factory=dict)
+    last_visit: Optional[str] = None
+
+    @property
+    def total_spent(self) -> float:
+        return self.spent_cents / 100
+
+    @property
+    def average_ticket(self) -> float:
+        if self.completed_appointments == 0:
+            return 0
+        return round(self.spent_cents / self.completed_appointments) / 100
+
+    def to_dict(self) -> Dict:
+        return {
+            "phone": self.phone,
+            "total_appointments": self.total_appointments,
+            "completed_appointments": self.completed_appointments,
+            "total_spent": self.total_spent,
+            "average_ticket": self.average_ticket,
+            "last_visit": self.last_visit,
+            "conversations_count": self.conversations_count
+        }
+
+
+class ClientAggregates:
+    """Mantém as métricas de cada cliente atualizadas a cada transição de agendamento.
+
+    Uma alteração é aplicada removendo a contribuição da versão anterior do
+    agendamento e somando a da nova, então completar, cancelar ou reabrir um
+    agendamento custa O(1).
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, ClientStats] = {}
+
+    def get(self, phone: str) -> ClientStats:
+        """Métricas do cliente (vazias se ainda não houver histórico)"""
+        return self.stats.get(phone) or ClientStats(phone=phone)
+
+    def apply_appointment(self, previous: Optional[Dict], current: Optional[Dict]):
+        """Aplica a transição previous -> current de um agendamento"""
+        if previous is not None:
+            self._apply(previous, -1)
+        if current is not None:
+            self._apply(current, 1)
+
+    def add_conversation(self, phone: str, count: int = 1):
+        self._stats_for(phone).conversations_count += count
+
+    def rebuild(self, appointments: Iterable[Dict], conversation_counts: Dict[str, int]):
+        """Recalcula todas as métricas a partir dos dados de origem"""
+        self.stats.clear()
+        for appointment in appointments:
+            self._apply(appointment, 1)
+        for phone, count in conversation_counts.items():
+            self.add_conversation(phone, count)
+
+    def _stats_for(self, phone: str) -> ClientStats:
+        stats = self.stats.get(phone)
+        if stats is None:
+            stats = self.stats[phone] = ClientStats(phone=phone)
+        return stats
+
+    def _apply(self, appointment: Dict, sign: int):
+        stats = self._stats_for(appointment.get('client_phone'))
+        stats.total_appointments += sign
+
+        if appointment.get('status') == 'completed':
+            stats.completed_appointments += sign
+            stats.spent_cents += sign * _to_cents(appointment.get('price'))
+
+        scheduled_date = appointment.get('scheduled_date')
+        if scheduled_date is None:
+            return
+
+        dates = stats.appointment_dates
+        remaining = dates.get(scheduled_date, 0) + sign
+        if remaining > 0:
+            dates[scheduled_date] = remaining
+        else:
+            dates.pop(scheduled_date, None)
+
+        if sign > 0:
+            if stats.last_visit is None or scheduled_date > stats.last_visit:
+                stats.last_visit = scheduled_date
+        elif scheduled_date == stats.last_visit and remaining <= 0:
+            # Só recalcula quando a data máxima deixa de existir
+            stats.last_visit = max(dates, default=None)
+
+
+def _to_cents(price) -> int:
+    return round(float(price or 0) * 100)
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+💬 CONVERSATION STORE
+Sessões de conversa com expiração por inatividade, limite LRU e backend Redis
+"""
+
+import asyncio
+import fnmatch
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Type
+from loguru import logger
+from pydantic import BaseModel
+
+from journal import atomic_write_json
+
+
+class MemoryConversationStore:
+    """Sessões em memória do processo.
+
+    O OrderedDict fica em ordem de último acesso, então tanto o despejo LRU
+    quanto a varredura de sessões ociosas só olham o início da fila. Um
+    snapshot é gravado ao encerrar e recarregado (sem as expiradas) ao subir.
+    """
+
+    def __init__(self, model: Type[BaseModel], idle_ttl: float = 1800, max_sessions: int = 10000,
+                 sweep_interval: float = 60, snapshot_path: str = 'conversations_snapshot.json'):
+        self.model = model
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.sweep_interval = sweep_interval
+        self.snapshot_path = Path(snapshot_path) if snapshot_path else None
+
+        self._sessions: "OrderedDict[str, Tuple[float, BaseModel]]" = OrderedDict()
+        self._sweeper: Optional[asyncio.Task] = None
+        self.stats = {"expired": 0, "evicted": 0}
+
+    async def start(self):
+        """Restaura o snapshot e inicia a varredura periódica"""
+        await self.restore()
+        if self._sweeper is None:
+            self._sweeper = asyncio.create_task(self._sweep_loop(), name="conversation-sweeper")
+
+    async def stop(self):
+        """Para a varredura e grava o snapshot"""
+        if self._sweeper:
+            self._sweeper.cancel()
+            await asyncio.gather(self._sweeper, return_exceptions=True)
+            self._sweeper = None
+        await self.snapshot()
+
+    async def get(self, phone: str) -> Optional[BaseModel]:
+        entry = self._sessions.get(phone)
+        if entry is None:
+            return None
+
+        last_seen, context = entry
+        now = time.time()
+        if now - last_seen > self.idle_ttl:
+            del self._sessions[phone]
+            self.stats["expired"] += 1
+            return None
+
+        self._sessions[phone] = (now, context)
+        self._sessions.move_to_end(phone)
+        return context
+
+    async def set(self, phone: str, context: BaseModel):
+        self._sessions[phone] = (time.time(), context)
+        self._sessions.move_to_end(phone)
+
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    async def delete(self, phone: str):
+        self._sessions.pop(phone, None)
+
+    async def count(self) -> int:
+        return len(self._sessions)
+
+    async def values(self) -> List[BaseModel]:
+        return [context for _, context in self._sessions.values()]
+
+    async def sweep(self) -> int:
+        """Remove sessões ociosas; para no primeiro acesso recente"""
+        cutoff = time.time() - self.idle_ttl
+        removed = 0
+        while self._sessions:
+            phone, (last_seen, _) = next(iter(self._sessions.items()))
+            if last_seen > cutoff:
+                break
+            del self._sessions[phone]
+            removed += 1
+
+        self.stats["expired"] += removed
+        return removed
+
+    async def snapshot(self):
+        if not self.snapshot_path:
+            return
+        data = {
+            phone: {"last_seen": last_seen, "context": json.loads(context.model_dump_json())}
+            for phone, (last_seen, context) in self._sessions.items()
+        }
+        try:
+            await asyncio.to_thread(atomic_write_json, self.snapshot_path, data, None)
+            logger.info(f"💾 {len(data)} conversas salvas em {self.snapshot_path}")
+        except Exception as e:
+            logger.error(f"❌ Erro ao salvar conversas: {e}")
+
+    async def restore(self):
+        if not self.snapshot_path or not self.snapshot_path.exists():
+            return
+        try:
+            data = await asyncio.to_thread(_read_json, self.snapshot_path)
+        except Exception as e:
+            logger.warning(f"⚠️ Snapshot de conversas ignorado: {e}")
+            return
+
+        cutoff = time.time() - self.idle_ttl
+        entries = sorted(
+            (entry["last_seen"], phone, entry["context"])
+            for phone, entry in data.items()
+            if entry["last_seen"] > cutoff
+        )
+        for last_seen, phone, payload in entries[-self.max_sessions:]:
+            self._sessions[phone] = (last_seen, self.model.model_validate(payload))
+
+        if entries:
+            logger.info(f"✅ {len(self._sessions)} conversas restauradas")
+
+    def get_stats(self) -> Dict:
+        return {"backend": "memory", "sessions": len(self._sessions), **self.stats}
+
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            removed = await self.sweep()
+            if removed:
+                logger.info(f"🧹 {removed} conversas ociosas removidas")
+
+
+class RedisConversationStore:
+    """Sessões compartilhadas entre workers via Redis.
+
+    Cada sessão é uma chave com TTL igual ao tempo de inatividade, renovado
+    a cada acesso; a expiração e o limite de memória (maxmemory-policy
+    allkeys-lru) ficam a cargo do próprio Redis.
+    """
+
+    def __init__(self, client, model: Type[BaseModel], idle_ttl: float = 1800, prefix: str = "conversation:"):
+        self.client = client
+        self.model = model
+        self.idle_ttl = int(idle_ttl)
+        self.prefix = prefix
+
+    async def start(self):
+        await self.client.ping()
+
+    async def stop(self):
+        close = getattr(self.client, "aclose", None) or getattr(self.client, "close", None)
+        if close:
+            await close()
+
+    async def get(self, phone: str) -> Optional[BaseModel]:
+        raw = await self.client.getex(self.prefix + phone, ex=self.idle_ttl)
+        return self.model.model_validate_json(raw) if raw else None
+
+    async def set(self, phone: str, context: BaseModel):
+        await self.client.set(self.prefix + phone, context.model_dump_json(), ex=self.idle_ttl)
+
+    async def delete(self, phone: str):
+        await self.client.delete(self.prefix + phone)
+
+    async def count(self) -> int:
+        return len(await self._keys())
+
+    async def values(self) -> List[BaseModel]:
+        keys = await self._keys()
+        if not keys:
+            return []
+        raws = await self.client.mget(keys)
+        return [self.model.model_validate_json(raw) for raw in raws if raw]
+
+    async def sweep(self) -> int:
+        return 0
+
+    async def snapshot(self):
+        pass
+
+    async def restore(self):
+        pass
+
+    def get_stats(self) -> Dict:
+        return {"backend": "redis", "prefix": self.prefix}
+
+    async def _keys(self) -> List[str]:
+        return [key async for key in self.client.scan_iter(match=self.prefix + "*", count=500)]
+
+
+class FakeRedis:
+    """Subconjunto em processo da API do redis.asyncio, para testes locais"""
+
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], str]] = {}
+
+    async def ping(self) -> bool:
+        return True
+
+    async def aclose(self):
+        pass
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._live(key)
+        return entry[1] if entry else None
+
+    async def getex(self, key: str, ex: int = None) -> Optional[str]:
+        entry = self._live(key)
+        if entry is None:
+            return None
+        if ex is not None:
+            self._data[key] = (time.time() + ex, entry[1])
+        return entry[1]
+
+    async def set(self, key: str, value: str, ex: int = None) -> bool:
+        self._data[key] = (time.time() + ex if ex else None, value)
+        return True
+
+    async def delete(self, *keys: str) -> int:
+        return sum(self._data.pop(key, None) is not None for key in keys)
+
+    async def mget(self, keys: List[str]) -> List[Optional[str]]:
+        return [await self.get(key) for key in keys]
+
+    async def scan_iter(self, match: str = "*", count: int = None):
+        for key in list(self._data):
+            if fnmatch.fnmatchcase(key, match) and self._live(key):
+                yield key
+
+    def _live(self, key: str) -> Optional[Tuple[Optional[float], str]]:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, _ = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        return entry
+
+
+def create_conversation_store(model: Type[BaseModel]):
+    """Escolhe o backend por CONVERSATION_STORE (memory, redis ou fakeredis)"""
+    backend = os.getenv("CONVERSATION_STORE", "memory").lower()
+    idle_ttl = float(os.getenv("CONVERSATION_IDLE_TTL", "1800"))
+
+    if backend == "redis":
+        import redis.asyncio as redis
+
+        client = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+        return RedisConversationStore(client, model, idle_ttl)
+
+    if backend == "fakeredis":
+        return RedisConversationStore(FakeRedis(), model, idle_ttl)
+
+    return MemoryConversationStore(
+        model,
+        idle_ttl=idle_ttl,
+        max_sessions=int(os.getenv("CONVERSATION_MAX_SESSIONS", "10000"))
+    )
+
+
+def _read_json(path: Path) -> Dict:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
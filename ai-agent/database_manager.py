@@ -5,12 +5,15 @@ Gerenciamento de dados e persistência
 """
 
 import os
-import json
+import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from loguru import logger
 from dataclasses import dataclass, asdict
 from supabase import create_client, Client
+from sqlite_store import SQLiteLocalStore
+from appointment_index import AppointmentIndex
+from client_aggregates import ClientAggregates
 
 @dataclass
 class Appointment:
@@ -36,14 +39,15 @@ class DatabaseManager:
         self.supabase_key = os.getenv('SUPABASE_ANON_KEY')
         self.supabase: Optional[Client] = None
         
-        # Fallback para arquivo local se Supabase não estiver configurado
-        self.local_db_file = 'ai_agent_data.json'
-        self.local_data = {
-            'appointments': [],
-            'clients': [],
-            'conversations': [],
-            'analytics': []
-        }
+        # Fallback para SQLite local se Supabase não estiver configurado
+        self.local_db_file = os.getenv('AI_AGENT_SQLITE_PATH', 'ai_agent_data.db')
+        self.legacy_json_file = 'ai_agent_data.json'
+        self.local_store = SQLiteLocalStore(self.local_db_file)
+        
+        # Índices em memória sobre os dados locais (carregados sob demanda)
+        self.appointment_index = AppointmentIndex()
+        self.client_aggregates = ClientAggregates()
+        self._indexes_loaded = False
         
     async def initialize(self):
         """Inicializa conexão com banco de dados"""
@@ -60,25 +64,32 @@ class DatabaseManager:
             await self.load_local_data()
     
     async def load_local_data(self):
-        """Carrega dados do arquivo local"""
+        """Abre o banco SQLite local e migra o antigo arquivo JSON"""
         try:
-            if os.path.exists(self.local_db_file):
-                with open(self.local_db_file, 'r', encoding='utf-8') as f:
-                    self.local_data = json.load(f)
-                logger.info("✅ Dados locais carregados")
-            else:
-                await self.save_local_data()
-                logger.info("✅ Arquivo de dados local criado")
+            await asyncio.to_thread(self.local_store.open)
+            await asyncio.to_thread(self.local_store.import_legacy_json, self.legacy_json_file)
+            await self._load_indexes()
+            logger.info(f"✅ Banco local pronto: {self.local_db_file} ({len(self.appointment_index)} agendamentos)")
         except Exception as e:
             logger.error(f"❌ Erro ao carregar dados locais: {e}")
     
-    async def save_local_data(self):
-        """Salva dados no arquivo local"""
-        try:
-            with open(self.local_db_file, 'w', encoding='utf-8') as f:
-                json.dump(self.local_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"❌ Erro ao salvar dados locais: {e}")
+    async def close(self):
+        """Fecha o banco local"""
+        await asyncio.to_thread(self.local_store.close)
+    
+    async def _load_indexes(self):
+        """Reconstrói os índices em memória a partir do SQLite"""
+        appointments = await asyncio.to_thread(self.local_store.all_appointments)
+        conversation_counts = await asyncio.to_thread(self.local_store.conversation_counts)
+        self.appointment_index.load(appointments)
+        self.client_aggregates.rebuild(appointments, conversation_counts)
+        self._indexes_loaded = True
+    
+    async def _local_index(self) -> AppointmentIndex:
+        """Retorna o índice de agendamentos, carregando-o se necessário"""
+        if not self._indexes_loaded:
+            await self._load_indexes()
+        return self.appointment_index
     
     async def create_appointment(self, client_name: str, client_phone: str, 
                                service_type: str, scheduled_date: str, 
@@ -111,8 +122,10 @@ class DatabaseManager:
                 logger.info(f"✅ Agendamento salvo no Supabase: {appointment_id}")
             else:
                 # Salvar localmente
-                self.local_data['appointments'].append(appointment_data)
-                await self.save_local_data()
+                index = await self._local_index()
+                await asyncio.to_thread(self.local_store.insert_appointment, appointment_data)
+                index.upsert(appointment_data)
+                self.client_aggregates.apply_appointment(None, appointment_data)
                 logger.info(f"✅ Agendamento salvo localmente: {appointment_id}")
             
             return appointment_id
@@ -128,10 +141,7 @@ class DatabaseManager:
                 result = self.supabase.table('appointments').select('*').eq('id', appointment_id).execute()
                 return result.data[0] if result.data else None
             else:
-                for appointment in self.local_data['appointments']:
-                    if appointment['id'] == appointment_id:
-                        return appointment
-                return None
+                return (await self._local_index()).get(appointment_id)
                 
         except Exception as e:
             logger.error(f"❌ Erro ao buscar agendamento: {e}")
@@ -146,13 +156,12 @@ class DatabaseManager:
                 result = self.supabase.table('appointments').update(updates).eq('id', appointment_id).execute()
                 success = len(result.data) > 0
             else:
-                success = False
-                for i, appointment in enumerate(self.local_data['appointments']):
-                    if appointment['id'] == appointment_id:
-                        self.local_data['appointments'][i].update(updates)
-                        await self.save_local_data()
-                        success = True
-                        break
+                index = await self._local_index()
+                updated = await asyncio.to_thread(self.local_store.update_appointment, appointment_id, updates)
+                success = updated is not None
+                if success:
+                    self.client_aggregates.apply_appointment(index.get(appointment_id), updated)
+                    index.upsert(updated)
             
             if success:
                 logger.info(f"✅ Agendamento atualizado: {appointment_id}")
@@ -181,17 +190,31 @@ class DatabaseManager:
                 result = query.execute()
                 return result.data
             else:
-                appointments = []
-                for appointment in self.local_data['appointments']:
-                    if appointment['scheduled_date'] == date:
-                        if not staff_id or appointment['staff_id'] == staff_id:
-                            appointments.append(appointment)
-                return appointments
+                return (await self._local_index()).find_by_date(date, staff_id)
                 
         except Exception as e:
             logger.error(f"❌ Erro ao buscar agendamentos por data: {e}")
             return []
     
+    async def get_upcoming_appointments(self, from_date: str) -> List[Dict]:
+        """Busca agendamentos não cancelados a partir de uma data"""
+        try:
+            if self.supabase:
+                result = (
+                    self.supabase.table('appointments').select('*')
+                    .gte('scheduled_date', from_date)
+                    .neq('status', 'cancelled')
+                    .execute()
+                )
+                return result.data
+            else:
+                appointments = (await self._local_index()).find_from_date(from_date)
+                return [a for a in appointments if a.get('status') != 'cancelled']
+                
+        except Exception as e:
+            logger.error(f"❌ Erro ao buscar próximos agendamentos: {e}")
+            return []
+    
     async def get_appointments_by_phone(self, phone: str) -> List[Dict]:
         """Busca agendamentos por telefone"""
         try:
@@ -199,10 +222,7 @@ class DatabaseManager:
                 result = self.supabase.table('appointments').select('*').eq('client_phone', phone).execute()
                 return result.data
             else:
-                return [
-                    appointment for appointment in self.local_data['appointments']
-                    if appointment['client_phone'] == phone
-                ]
+                return (await self._local_index()).find_by_phone(phone)
                 
         except Exception as e:
             logger.error(f"❌ Erro ao buscar agendamentos por telefone: {e}")
@@ -223,8 +243,9 @@ class DatabaseManager:
             if self.supabase:
                 self.supabase.table('conversations').insert(conversation_data).execute()
             else:
-                self.local_data['conversations'].append(conversation_data)
-                await self.save_local_data()
+                await self._local_index()
+                await asyncio.to_thread(self.local_store.insert_conversation, conversation_data)
+                self.client_aggregates.add_conversation(phone)
             
             return True
             
@@ -237,20 +258,21 @@ class DatabaseManager:
         try:
             appointments = await self.get_appointments_by_phone(phone)
             
-            # Buscar conversas
             if self.supabase:
                 conversations_result = self.supabase.table('conversations').select('*').eq('phone', phone).execute()
-                conversations = conversations_result.data
+                conversations_count = len(conversations_result.data)
+                
+                # Calcular métricas
+                total_spent = sum(apt['price'] for apt in appointments if apt['status'] == 'completed')
+                visit_count = len([apt for apt in appointments if apt['status'] == 'completed'])
+                last_visit = max([apt['scheduled_date'] for apt in appointments], default=None)
             else:
-                conversations = [
-                    conv for conv in self.local_data['conversations']
-                    if conv['phone'] == phone
-                ]
-            
-            # Calcular métricas
-            total_spent = sum(apt['price'] for apt in appointments if apt['status'] == 'completed')
-            visit_count = len([apt for apt in appointments if apt['status'] == 'completed'])
-            last_visit = max([apt['scheduled_date'] for apt in appointments], default=None)
+                # Métricas locais mantidas incrementalmente
+                stats = await self.get_client_stats(phone)
+                conversations_count = stats["conversations_count"]
+                total_spent = stats["total_spent"]
+                visit_count = stats["completed_appointments"]
+                last_visit = stats["last_visit"]
             
             return {
                 "phone": phone,
@@ -260,7 +282,7 @@ class DatabaseManager:
                 "average_ticket": total_spent / visit_count if visit_count > 0 else 0,
                 "last_visit": last_visit,
                 "appointments": appointments,
-                "conversations_count": len(conversations),
+                "conversations_count": conversations_count,
                 "client_segment": self.calculate_client_segment(total_spent, visit_count)
             }
             
@@ -268,6 +290,43 @@ class DatabaseManager:
             logger.error(f"❌ Erro ao buscar histórico do cliente: {e}")
             return {}
     
+    async def get_client_stats(self, phone: str) -> Dict:
+        """Retorna as métricas agregadas do cliente em O(1) (dados locais)"""
+        await self._local_index()
+        stats = self.client_aggregates.get(phone)
+        
+        return {
+            **stats.to_dict(),
+            "client_segment": self.calculate_client_segment(stats.total_spent, stats.completed_appointments)
+        }
+    
+    async def rebuild_client_aggregates(self) -> Dict:
+        """Recalcula as métricas a partir do SQLite e relata divergências"""
+        try:
+            before = {phone: stats.to_dict() for phone, stats in self.client_aggregates.stats.items()}
+            
+            await self._load_indexes()
+            
+            after = {phone: stats.to_dict() for phone, stats in self.client_aggregates.stats.items()}
+            mismatched = sorted(
+                phone for phone in before.keys() | after.keys()
+                if before.get(phone) != after.get(phone)
+            )
+            
+            if mismatched:
+                logger.warning(f"⚠️ Métricas divergentes corrigidas para {len(mismatched)} clientes")
+            else:
+                logger.info("✅ Métricas de clientes consistentes")
+            
+            return {
+                "clients": len(after),
+                "mismatched_clients": mismatched
+            }
+            
+        except Exception as e:
+            logger.error(f"❌ Erro ao recalcular métricas de clientes: {e}")
+            return {}
+    
     def calculate_client_segment(self, total_spent: float, visit_count: int) -> str:
         """Calcula segmento do cliente baseado em RFM"""
         if total_spent >= 500 and visit_count >= 5:
@@ -287,10 +346,7 @@ class DatabaseManager:
                 result = self.supabase.table('appointments').select('*').gte('scheduled_date', start_date).lte('scheduled_date', end_date).execute()
                 appointments = result.data
             else:
-                appointments = [
-                    apt for apt in self.local_data['appointments']
-                    if start_date <= apt['scheduled_date'] <= end_date
-                ]
+                appointments = await asyncio.to_thread(self.local_store.appointments_between, start_date, end_date)
             
             # Calcular métricas
             total_appointments = len(appointments)
@@ -342,9 +398,9 @@ class DatabaseManager:
                 result = self.supabase.table('appointments').select('id').limit(1).execute()
                 return "supabase_connected"
             else:
-                if os.path.exists(self.local_db_file):
-                    return "local_file_ok"
+                if self.local_store.conn and self.local_store.exists():
+                    return "local_sqlite_ok"
                 else:
-                    return "local_file_missing"
+                    return "local_sqlite_missing"
         except:
             return "connection_error"
\ No newline at end of file
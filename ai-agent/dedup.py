@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+🔁 DEDUP
+Cache limitado de ids de mensagens já recebidas, para webhooks reentregues
+"""
+
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Set
+
+
+class MessageDeduplicator:
+    """Ids vistos recentemente, com TTL e limite de tamanho.
+
+    A Meta reentrega o webhook quando não recebe resposta a tempo; o id da
+    mensagem é o mesmo, então basta lembrá-lo pelo tempo em que reentregas
+    acontecem. O OrderedDict fica em ordem de inserção (e portanto de
+    expiração): os ids vencidos e os excedentes saem sempre do início.
+
+    Um id só entra no cache depois de processado (mark). Enquanto isso fica
+    reservado (claim), o que já barra reentregas simultâneas; se o
+    processamento falhar ou a mensagem for descartada, release libera o id
+    e a próxima reentrega é processada normalmente.
+    """
+
+    def __init__(self, ttl: float = None, max_entries: int = None):
+        self.ttl = ttl or float(os.getenv("WEBHOOK_DEDUP_TTL", "86400"))
+        self.max_entries = max_entries or int(os.getenv("WEBHOOK_DEDUP_SIZE", "100000"))
+        self._seen: "OrderedDict[str, float]" = OrderedDict()
+        self._in_flight: Set[str] = set()
+        self.stats = {"checked": 0, "duplicates": 0, "evicted": 0}
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def __contains__(self, message_id: str) -> bool:
+        if message_id in self._in_flight:
+            return True
+        seen_at = self._seen.get(message_id)
+        return seen_at is not None and time.monotonic() - seen_at < self.ttl
+
+    def filter_new(self, messages: List[Dict], key: str = "id") -> List[Dict]:
+        """Mensagens ainda não vistas, sem repetições dentro do próprio lote"""
+        self._expire()
+        fresh = []
+        batch_ids = set()
+        for message in messages:
+            self.stats["checked"] += 1
+            message_id = message.get(key)
+            if message_id in batch_ids or message_id in self:
+                self.stats["duplicates"] += 1
+                continue
+            batch_ids.add(message_id)
+            fresh.append(message)
+        return fresh
+
+    def claim(self, message_ids: Iterable[str]):
+        """Reserva ids aceitos que ainda não terminaram de ser processados"""
+        self._in_flight.update(message_ids)
+
+    def release(self, message_ids: Iterable[str]):
+        """Desfaz a reserva de ids que não foram processados"""
+        for message_id in message_ids:
+            self._in_flight.discard(message_id)
+
+    def mark(self, message_ids: Iterable[str]):
+        """Registra ids já processados"""
+        now = time.monotonic()
+        for message_id in message_ids:
+            self._in_flight.discard(message_id)
+            self._seen[message_id] = now
+            self._seen.move_to_end(message_id)
+
+        while len(self._seen) > self.max_entries:
+            self._seen.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def get_stats(self) -> Dict:
+        return {"tracked_ids": len(self._seen), "in_flight": len(self._in_flight), **self.stats}
+
+    def _expire(self):
+        cutoff = time.monotonic() - self.ttl
+        while self._seen:
+            message_id, seen_at = next(iter(self._seen.items()))
+            if seen_at > cutoff:
+                break
+            del self._seen[message_id]
@@ -6,6 +6,7 @@ Demonstração interativa das funcionalidades do AI Agent
 
 import asyncio
 import json
+import os
 import sys
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -14,6 +15,9 @@ from pathlib import Path
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
+# A demonstração usa a demanda simulada para mostrar horários ocupados
+os.environ.setdefault("SCHEDULER_SIMULATE_DEMAND", "true")
+
 class AIAgentDemo:
     def __init__(self):
         self.scenarios = [
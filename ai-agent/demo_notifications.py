@@ -36,7 +36,7 @@ async def demo_notifications():
         
         # Inicializar componentes
         notification_engine = NotificationEngine()
-        scheduler = SmartScheduler()
+        scheduler = SmartScheduler(notifier=notification_engine)
         
         print("🚀 Inicializando sistema de notificações...")
         await notification_engine.initialize()
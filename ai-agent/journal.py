@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+📒 APPEND-ONLY JOURNAL
+Persistência incremental em JSON Lines com compactação atômica
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+from loguru import logger
+
+
+def atomic_write_json(path, data: Any, indent: Optional[int] = 2):
+    """Grava JSON em arquivo temporário e substitui o destino atomicamente"""
+    atomic_write_text(path, json.dumps(data, indent=indent, ensure_ascii=False))
+
+
+def atomic_write_text(path, text: str):
+    """Grava texto em arquivo temporário e substitui o destino atomicamente"""
+    path = Path(path)
+    # Nome temporário por thread: gravações concorrentes não disputam o mesmo arquivo
+    tmp_path = path.with_name(f".{path.name}.{threading.get_ident()}.tmp")
+
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+class WriteBehindFile:
+    """Persistência write-behind de um documento JSON inteiro.
+
+    `mark_dirty()` apenas agenda a gravação: alterações feitas dentro da
+    janela de debounce são agrupadas em uma única escrita atômica, que
+    nunca atrasa mais que `max_delay` segundos. O JSON é serializado no
+    event loop (estado consistente) e gravado em uma thread.
+    """
+
+    def __init__(self, path, snapshot: Callable[[], Any], delay: float = 1.0,
+                 max_delay: float = 5.0, indent: Optional[int] = None):
+        self.path = Path(path)
+        self.snapshot = snapshot
+        self.delay = delay
+        self.max_delay = max_delay
+        self.indent = indent
+
+        self.writes = 0
+        self._dirty = False
+        self._first_dirty_at = 0.0
+        self._last_dirty_at = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def dirty(self) -> bool:
+        return self._dirty
+
+    def mark_dirty(self):
+        """Marca o estado como alterado e agenda a gravação"""
+        now = time.monotonic()
+        if not self._dirty:
+            self._dirty = True
+            self._first_dirty_at = now
+        self._last_dirty_at = now
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_later())
+
+    async def flush(self):
+        """Grava imediatamente se houver alterações pendentes"""
+        if not self._dirty:
+            return
+
+        text = json.dumps(self.snapshot(), indent=self.indent, ensure_ascii=False)
+        self._dirty = False
+        try:
+            await asyncio.to_thread(atomic_write_text, self.path, text)
+        except Exception:
+            # Mantém pendente para a próxima tentativa
+            self._dirty = True
+            raise
+        self.writes += 1
+
+    async def close(self):
+        """Cancela o debounce pendente e grava o que faltar"""
+        task, self._task = self._task, None
+        if task and task is not asyncio.current_task():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await self.flush()
+
+    async def _flush_later(self):
+        try:
+            while self._dirty:
+                now = time.monotonic()
+                deadline = min(self._last_dirty_at + self.delay, self._first_dirty_at + self.max_delay)
+                if now < deadline:
+                    await asyncio.sleep(deadline - now)
+                    continue
+                await self.flush()
+        except Exception as e:
+            logger.error(f"❌ Erro ao gravar {self.path}: {e}")
+        finally:
+            if self._task is asyncio.current_task():
+                self._task = None
+
+
+class AppendOnlyJournal:
+    """Registros chave -> valor persistidos como um log de operações.
+
+    Cada gravação acrescenta uma linha ao journal (O(1)). Os fsyncs são
+    agrupados por quantidade ou intervalo e, periodicamente, o estado é
+    compactado em um snapshot JSON gravado com substituição atômica.
+    Gravar antes de `load()` carrega o estado existente primeiro, para que
+    a compactação nunca substitua o snapshot por um estado parcial.
+    """
+
+    def __init__(self, journal_path, snapshot_path, fsync_every: int = 16,
+                 fsync_interval: float = 1.0, compact_every: int = 1000):
+        self.journal_path = Path(journal_path)
+        self.snapshot_path = Path(snapshot_path)
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.compact_every = compact_every
+
+        self.records: Dict[str, Any] = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._entries_since_compact = 0
+        self._loaded = False
+
+    def load(self) -> Dict[str, Any]:
+        """Carrega o snapshot e reaplica o journal por cima"""
+        with self._lock:
+            return self._load_locked()
+
+    def put(self, record_id: str, record: Any):
+        """Grava ou substitui um registro"""
+        self._append({"op": "put", "id": record_id, "record": record})
+
+    def delete(self, record_id: str):
+        """Remove um registro"""
+        self._append({"op": "delete", "id": record_id})
+
+    def sync(self):
+        """Força o fsync das entradas pendentes"""
+        with self._lock:
+            self._sync_locked()
+
+    def compact(self):
+        """Grava o snapshot atual e trunca o journal"""
+        with self._lock:
+            if not self._loaded:
+                self._load_locked()
+            self._compact_locked()
+
+    def close(self):
+        """Sincroniza e fecha o arquivo do journal"""
+        with self._lock:
+            self._sync_locked()
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _append(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+
+        with self._lock:
+            if not self._loaded:
+                self._load_locked()
+            if self._file is None:
+                self._file = open(self.journal_path, 'a', encoding='utf-8')
+
+            self._file.write(line)
+            self._file.flush()
+            self._unsynced += 1
+            self._entries_since_compact += 1
+
+            if entry["op"] == "put":
+                self.records[entry["id"]] = entry["record"]
+            else:
+                self.records.pop(entry["id"], None)
+
+            if self._entries_since_compact >= self.compact_every:
+                self._compact_locked()
+            elif (self._unsynced >= self.fsync_every or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync_locked()
+
+    def _load_locked(self) -> Dict[str, Any]:
+        records = {}
+
+        if self.snapshot_path.exists():
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+
+        entries = 0
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Última linha truncada por queda do processo
+                        logger.warning(f"⚠️ Entrada inválida ignorada em {self.journal_path}")
+                        continue
+
+                    if entry.get("op") == "put":
+                        records[entry["id"]] = entry["record"]
+                    elif entry.get("op") == "delete":
+                        records.pop(entry["id"], None)
+                    entries += 1
+
+        self.records = records
+        self._entries_since_compact = entries
+        self._loaded = True
+        return records
+
+    def _sync_locked(self):
+        if self._file and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def _compact_locked(self):
+        # Snapshot primeiro: se cair antes de truncar, reaplicar o journal é idempotente
+        atomic_write_json(self.snapshot_path, self.records)
+
+        if self._file:
+            self._file.close()
+        self._file = open(self.journal_path, 'w', encoding='utf-8')
+        os.fsync(self._file.fileno())
+
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._entries_since_compact = 0
+        logger.info(f"🗜️ Journal compactado: {self.snapshot_path} ({len(self.records)} registros)")
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+🔤 KEYWORD MATCHER
+Autômato Aho–Corasick para achar todas as palavras-chave em uma passada
+"""
+
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Tuple
+
+
+class KeywordMatch(NamedTuple):
+    start: int
+    end: int
+    keyword: str
+    group: str
+    label: str
+
+
+class KeywordMatcher:
+    """Encontra todas as ocorrências (inclusive sobrepostas) de um vocabulário.
+
+    O custo da busca é O(tamanho do texto + ocorrências), independente de
+    quantas palavras-chave existem. Cada palavra-chave carrega um grupo
+    (intent, service, ...) e um rótulo (AGENDAR_SERVICO, corte, ...); a
+    mesma palavra pode pertencer a vários grupos.
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[int]] = [[]]
+        self._keywords: List[Tuple[str, str, str, bool]] = []
+        self._built = False
+
+    def __len__(self) -> int:
+        return len(self._keywords)
+
+    def add(self, keyword: str, group: str, label: str, whole_word: bool = False):
+        """Registra uma palavra-chave; `whole_word` exige limites de palavra"""
+        if not keyword:
+            return
+        self._built = False
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+
+        self._output[state].append(len(self._keywords))
+        self._keywords.append((keyword, group, label, whole_word))
+
+    def add_many(self, keywords: Iterable[str], group: str, label: str, whole_word: bool = False):
+        for keyword in keywords:
+            self.add(keyword, group, label, whole_word)
+
+    def build(self):
+        """Calcula os links de falha (BFS) e a tabela de transições completa"""
+        goto, fail, output = self._goto, self._fail, self._output
+        self._delta: List[Dict[str, int]] = [dict(goto[0])] + [None] * (len(goto) - 1)
+
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+
+            # Transições do estado = as do link de falha + as próprias
+            delta = dict(self._delta[fail[state]])
+            delta.update(goto[state])
+            self._delta[state] = delta
+
+            for char, next_state in goto[state].items():
+                fail[next_state] = self._delta[fail[state]].get(char, 0) if state else 0
+                output[next_state] = output[next_state] + output[fail[next_state]]
+                queue.append(next_state)
+
+        self._built = True
+
+    def find_all(self, text: str) -> List[KeywordMatch]:
+        """Todas as ocorrências, ordenadas pela posição final"""
+        if not self._built:
+            self.build()
+
+        delta, output, keywords = self._delta, self._output, self._keywords
+        matches = []
+        state = 0
+
+        for index, char in enumerate(text):
+            state = delta[state].get(char, 0)
+            if output[state]:
+                for keyword_id in output[state]:
+                    keyword, group, label, whole_word = keywords[keyword_id]
+                    start, end = index + 1 - len(keyword), index + 1
+                    if whole_word and (
+                        (start > 0 and text[start - 1].isalnum()) or
+                        (end < len(text) and text[end].isalnum())
+                    ):
+                        continue
+                    matches.append(KeywordMatch(start, end, keyword, group, label))
+
+        return matches
+
+
+def leftmost_longest(matches: Iterable[KeywordMatch]) -> List[KeywordMatch]:
+    """Seleciona ocorrências sem sobreposição, como um re.findall com alternativas"""
+    selected = []
+    last_end = 0
+    for match in sorted(matches, key=lambda m: (m.start, -m.end)):
+        if match.start >= last_end:
+            selected.append(match)
+            last_end = match.end
+    return selected
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+🧠 LLM CACHE
+Cache de respostas do modelo com TTL/LRU e coalescência de chamadas idênticas
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from text_normalizer import normalize
+
+
+SYSTEM_PROMPT = (
+    "Você é a assistente virtual do Salão Beleza Total. Responda em português, "
+    "de forma curta e simpática, e sempre ofereça ajuda para agendar um serviço."
+)
+
+
+def prompt_fingerprint(message: str, state: str = "") -> str:
+    """Chave do cache: mensagem normalizada + estado da conversa"""
+    key = f"{state}|{normalize(message).text.strip()}"
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class LLMResponseCache:
+    """Cache LRU com expiração por entrada"""
+
+    def __init__(self, max_entries: int = 2048, ttl: float = 3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: str, value: str, ttl: float = None):
+        self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class OpenAIChatModel:
+    """Adaptador para o cliente assíncrono da OpenAI"""
+
+    def __init__(self, client, model: str = "gpt-3.5-turbo", max_tokens: int = 200):
+        self.client = client
+        self.model = model
+        self.max_tokens = max_tokens
+
+    async def generate(self, messages: List[Dict]) -> str:
+        completion = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=self.max_tokens,
+            temperature=0.3
+        )
+        return completion.choices[0].message.content.strip()
+
+
+class StubChatModel:
+    """Modelo local determinístico para testes e desenvolvimento"""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    async def generate(self, messages: List[Dict]) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        question = messages[-1]["content"]
+        digest = hashlib.blake2b(question.encode("utf-8"), digest_size=4).hexdigest()
+        return f"[stub:{digest}] Posso te ajudar a agendar um horário? 😊"
+
+
+class CachedLLMClient:
+    """Chamadas ao modelo com cache e single-flight.
+
+    Perguntas equivalentes (mesma forma normalizada, mesmo estado de
+    conversa) são respondidas do cache; se uma idêntica já estiver em
+    andamento, a nova aguarda o mesmo resultado em vez de chamar o modelo.
+    Falhas não são guardadas.
+    """
+
+    def __init__(self, model, cache: LLMResponseCache = None, system_prompt: str = SYSTEM_PROMPT):
+        self.model = model
+        self.cache = cache or LLMResponseCache()
+        self.system_prompt = system_prompt
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "errors": 0, "model_time": 0.0}
+
+    async def complete(self, message: str, state: str = "") -> str:
+        key = prompt_fingerprint(message, state)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.stats["hits"] += 1
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(inflight)
+
+        self.stats["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+
+        started = time.monotonic()
+        try:
+            response = await self.model.generate([
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": message}
+            ])
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.stats["errors"] += 1
+            future.set_exception(e)
+            # Evita "exception was never retrieved" quando ninguém aguardava
+            future.exception()
+            raise
+        else:
+            self.cache.put(key, response)
+            future.set_result(response)
+            return response
+        finally:
+            self.stats["model_time"] += time.monotonic() - started
+            self._inflight.pop(key, None)
+
+    def get_stats(self) -> Dict:
+        lookups = self.stats["hits"] + self.stats["misses"] + self.stats["coalesced"]
+        return {
+            "hits": self.stats["hits"],
+            "misses": self.stats["misses"],
+            "coalesced": self.stats["coalesced"],
+            "errors": self.stats["errors"],
+            "hit_rate": round((self.stats["hits"] + self.stats["coalesced"]) / lookups * 100, 2) if lookups else 0,
+            "avg_model_ms": round(self.stats["model_time"] / self.stats["misses"] * 1000, 2) if self.stats["misses"] else 0,
+            "cached_entries": len(self.cache)
+        }
@@ -4,12 +4,13 @@
 Core engine para processamento conversacional inteligente
 """
 
-from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
+from fastapi import FastAPI, Request, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Dict, List, Optional, Any
 import os
+import secrets
 from datetime import datetime, timedelta
 import json
 import asyncio
@@ -23,6 +24,10 @@ from scheduler_engine import SmartScheduler
 from database_manager import DatabaseManager
 from mock_data_integration import MockDataService
 from notification_engine import NotificationEngine
+from conversation_store import create_conversation_store
+from message_lanes import LaneRejected, MessageLanes
+from dedup import MessageDeduplicator
+from booking_pipeline import BookingPipeline, SlotUnavailable
 
 # Configuração da aplicação
 app = FastAPI(
@@ -46,10 +51,11 @@ app.add_middleware(
 ai_engine = AIConversationEngine()
 calendar_manager = GoogleCalendarManager()
 whatsapp_connector = WhatsAppConnector()
-scheduler_engine = SmartScheduler()
 db_manager = DatabaseManager()
 mock_data = MockDataService()
-notification_engine = NotificationEngine()
+notification_engine = NotificationEngine(data_service=mock_data, whatsapp=whatsapp_connector)
+scheduler_engine = SmartScheduler(notifier=notification_engine)
+booking_pipeline = BookingPipeline(scheduler_engine, db_manager, calendar_manager, notification_engine)
 
 # Modelos Pydantic
 class WhatsAppMessage(BaseModel):
@@ -74,8 +80,8 @@ class BookingRequest(BaseModel):
     client_name: str
     client_phone: str
 
-# Storage em memória para contextos (em produção usar Redis)
-active_conversations: Dict[str, ConversationContext] = {}
+# Contextos de conversa com expiração por inatividade (memória ou Redis)
+conversation_store = create_conversation_store(ConversationContext)
 
 @app.on_event("startup")
 async def startup_event():
@@ -86,9 +92,28 @@ async def startup_event():
     await ai_engine.initialize()
     await calendar_manager.initialize()
     await whatsapp_connector.initialize()
+    await scheduler_engine.initialize()
+    await db_manager.initialize()
+    await notification_engine.initialize()
+    await conversation_store.start()
+    await message_lanes.start()
+    await booking_pipeline.start()
     
     logger.info("✅ AI Agent pronto para atender!")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Encerramento do sistema"""
+    logger.info("🛑 Encerrando AI Agent...")
+    
+    await message_lanes.stop()
+    await booking_pipeline.stop()
+    await conversation_store.stop()
+    await notification_engine.shutdown()
+    await scheduler_engine.close()
+    await db_manager.close()
+    await whatsapp_connector.close()
+
 @app.get("/")
 async def root():
     return {
@@ -103,12 +128,12 @@ async def root():
             "Lembretes automáticos",
             "Analytics em tempo real"
         ],
-        "active_conversations": len(active_conversations),
+        "active_conversations": await conversation_store.count(),
         "uptime": "Ready to serve! 🚀"
     }
 
 @app.post("/webhook/whatsapp")
-async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
+async def whatsapp_webhook(request: Request):
     """
     Webhook para receber mensagens do WhatsApp Business API
     """
@@ -119,8 +144,36 @@ async def whatsapp_webhook(request: Request, background_tasks: BackgroundTasks):
         body = await request.json()
         logger.info(f"📱 Mensagem WhatsApp recebida: {body}")
         
-        # Processar mensagem em background
-        background_tasks.add_task(process_whatsapp_message, body)
+        batch = whatsapp_connector.parse_webhook_batch(body)
+        
+        # Status de entrega não passam pelo motor de conversa
+        handle_message_statuses(batch["statuses"])
+        
+        # Um item por remetente na sua lane (ordem garantida por número)
+        rejected = None
+        for from_number, messages in batch["messages"].items():
+            # Reentregas da Meta: ids já aceitos são ignorados antes de qualquer processamento
+            messages = message_dedup.filter_new(messages)
+            if not messages:
+                continue
+            
+            # Reservados até o processamento terminar (lá viram mark ou release)
+            message_ids = [message["id"] for message in messages]
+            message_dedup.claim(message_ids)
+            try:
+                message_lanes.submit(from_number, messages)
+            except LaneRejected as e:
+                logger.warning(f"⚠️ Mensagens de {from_number} recusadas ({e.status_code}): {e.reason}")
+                message_dedup.release(message_ids)
+                rejected = rejected or e
+                continue
+        
+        if rejected:
+            return JSONResponse(
+                status_code=rejected.status_code,
+                content={"status": "rejected", "detail": rejected.reason},
+                headers={"Retry-After": str(rejected.retry_after)}
+            )
         
         return {"status": "received"}
         
@@ -146,78 +199,112 @@ async def whatsapp_webhook_verify(request: Request):
         logger.warning("❌ Falha na verificação do webhook WhatsApp")
         raise HTTPException(status_code=403, detail="Forbidden")
 
-async def process_whatsapp_message(webhook_data: Dict):
+def handle_message_statuses(statuses: List[Dict]):
     """
-    Processa mensagem do WhatsApp e gera resposta inteligente
+    Contabiliza status de entrega (sent, delivered, read, failed)
+    """
+    for status in statuses:
+        state = status.get("status") or "unknown"
+        message_status_counts[state] = message_status_counts.get(state, 0) + 1
+        
+        if state == "failed":
+            logger.warning(f"⚠️ Falha na entrega para {status.get('recipient')}: {status.get('errors')}")
+
+async def process_whatsapp_messages(from_number: str, messages: List[Dict]):
+    """
+    Processa as mensagens de um remetente em ordem e gera respostas inteligentes
     """
     try:
-        # Extrair dados da mensagem
-        entry = webhook_data.get("entry", [])[0]
-        changes = entry.get("changes", [])[0]
-        value = changes.get("value", {})
-        messages = value.get("messages", [])
+        # Obter ou criar contexto da conversa (uma vez por lote)
+        context = await get_or_create_conversation_context(from_number)
         
-        if not messages:
-            return
+        for message in messages:
+            text = message.get("text") or message.get("button_text", "")
+            message_id = message["id"]
             
-        message = messages[0]
-        from_number = message["from"]
-        text = message.get("text", {}).get("body", "")
-        message_id = message["id"]
-        
-        logger.info(f"💬 Processando: {from_number} -> {text}")
-        
-        # Obter ou criar contexto da conversa
-        context = get_or_create_conversation_context(from_number)
-        
-        # Processar com IA
-        response_data = await ai_engine.process_message(
-            message=text,
-            context=context,
-            user_phone=from_number
-        )
-        
-        # Atualizar contexto
-        update_conversation_context(from_number, response_data)
-        
-        # Enviar resposta via WhatsApp
-        await whatsapp_connector.send_message(
-            to_number=from_number,
-            message=response_data["response_text"],
-            message_type=response_data.get("message_type", "text")
-        )
+            logger.info(f"💬 Processando: {from_number} -> {text}")
+            
+            try:
+                # Processar com IA
+                response_data = await ai_engine.process_message(
+                    message=text,
+                    context=context,
+                    user_phone=from_number,
+                    message_id=message_id
+                )
+                
+                # Atualizar contexto antes da próxima mensagem do lote
+                apply_conversation_update(context, response_data)
+                
+                # Enviar resposta via WhatsApp
+                await whatsapp_connector.send_message(
+                    to_number=from_number,
+                    message=response_data["response_text"],
+                    message_type=response_data.get("message_type", "text")
+                )
+                
+                # Log da interação
+                logger.info(f"✅ Resposta enviada para {from_number}: {response_data['response_text'][:100]}...")
+                message_dedup.mark([message_id])
+                
+            except Exception as e:
+                logger.error(f"❌ Erro ao processar mensagem {message_id}: {e}")
         
-        # Log da interação
-        logger.info(f"✅ Resposta enviada para {from_number}: {response_data['response_text'][:100]}...")
+        await conversation_store.set(from_number, context)
         
     except Exception as e:
-        logger.error(f"❌ Erro ao processar mensagem WhatsApp: {e}")
+        logger.error(f"❌ Erro ao processar mensagens WhatsApp: {e}")
+    finally:
+        # Sem mark (erro ou cancelamento): uma reentrega da Meta tenta de novo
+        message_dedup.release(message["id"] for message in messages)
 
-def get_or_create_conversation_context(phone_number: str) -> ConversationContext:
+# Uma lane por remetente: mensagens do mesmo número em ordem, sem corrida no contexto
+message_lanes = MessageLanes(process_whatsapp_messages)
+
+# Ids de mensagens já aceitas (webhooks reentregues)
+message_dedup = MessageDeduplicator()
+
+# Contagem de status de entrega recebidos pelo webhook
+message_status_counts: Dict[str, int] = {}
+
+async def get_or_create_conversation_context(phone_number: str) -> ConversationContext:
     """
     Obtém contexto existente ou cria novo
     """
-    if phone_number not in active_conversations:
-        active_conversations[phone_number] = ConversationContext(
+    context = await conversation_store.get(phone_number)
+    if context is None:
+        context = ConversationContext(
             user_id=phone_number,
             conversation_state="greeting",
             session_start=datetime.now()
         )
+        await conversation_store.set(phone_number, context)
+    
+    return context
+
+def apply_conversation_update(context: ConversationContext, response_data: Dict):
+    """
+    Aplica ao contexto o estado e a intenção retornados pela IA
+    """
+    context.conversation_state = response_data.get("next_state", context.conversation_state)
+    context.last_intent = response_data.get("intent", context.last_intent)
     
-    return active_conversations[phone_number]
+    # Atualizar dados do agendamento se houver
+    if "booking_update" in response_data:
+        context.booking_data.update(response_data["booking_update"])
 
-def update_conversation_context(phone_number: str, response_data: Dict):
+async def update_conversation_context(phone_number: str, response_data: Dict) -> Optional[ConversationContext]:
     """
     Atualiza contexto da conversa
     """
-    if phone_number in active_conversations:
-        context = active_conversations[phone_number]
-        context.conversation_state = response_data.get("next_state", context.conversation_state)
-        context.last_intent = response_data.get("intent", context.last_intent)
+    context = await conversation_store.get(phone_number)
+    if context is not None:
+        apply_conversation_update(context, response_data)
         
-        # Atualizar dados do agendamento se houver
-        if "booking_update" in response_data:
-            context.booking_data.update(response_data["booking_update"])
+        # Regravar: com Redis o objeto lido é uma cópia
+        await conversation_store.set(phone_number, context)
+    
+    return context
 
 @app.post("/chat/simulate")
 async def simulate_chat(request: Dict):
@@ -228,7 +315,7 @@ async def simulate_chat(request: Dict):
     phone = request.get("phone", "test_user")
     
     # Simular processamento
-    context = get_or_create_conversation_context(phone)
+    context = await get_or_create_conversation_context(phone)
     
     response_data = await ai_engine.process_message(
         message=message,
@@ -236,7 +323,7 @@ async def simulate_chat(request: Dict):
         user_phone=phone
     )
     
-    update_conversation_context(phone, response_data)
+    context = await update_conversation_context(phone, response_data) or context
     
     return {
         "user_message": message,
@@ -244,7 +331,8 @@ async def simulate_chat(request: Dict):
         "intent": response_data.get("intent"),
         "next_state": response_data.get("next_state"),
         "booking_data": context.booking_data,
-        "conversation_state": context.conversation_state
+        "conversation_state": context.conversation_state,
+        "timings": response_data.get("timings", {})
     }
 
 @app.get("/availability/check")
@@ -277,57 +365,63 @@ async def create_booking(booking: BookingRequest):
     Criar novo agendamento
     """
     try:
-        # Validar disponibilidade
-        is_available = await scheduler_engine.validate_slot(
+        # Reservar o horário e gravar localmente; agenda e WhatsApp vão para o outbox
+        booking_data = await booking_pipeline.create(
             service_type=booking.service_type,
             date=booking.preferred_date,
-            time=booking.preferred_time
-        )
-        
-        if not is_available:
-            raise HTTPException(status_code=409, detail="Horário não disponível")
-        
-        # Criar agendamento
-        booking_id = await db_manager.create_appointment(
+            time=booking.preferred_time,
             client_name=booking.client_name,
             client_phone=booking.client_phone,
-            service_type=booking.service_type,
-            scheduled_date=booking.preferred_date,
-            scheduled_time=booking.preferred_time
-        )
-        
-        # Adicionar ao Google Calendar
-        calendar_event = await calendar_manager.create_event(
-            title=f"{booking.service_type} - {booking.client_name}",
-            start_datetime=f"{booking.preferred_date}T{booking.preferred_time}",
-            duration_minutes=90  # Duração padrão
+            staff_preference=booking.staff_preference
         )
         
-        logger.info(f"✅ Agendamento criado: ID {booking_id}")
+        logger.info(f"✅ Agendamento criado: ID {booking_data['booking_id']}")
         
         return {
-            "booking_id": booking_id,
+            "booking_id": booking_data["booking_id"],
             "status": "confirmed",
-            "calendar_event_id": calendar_event.get("id"),
+            "staff": booking_data["staff_member"],
+            "calendar_sync": "pending",
             "message": "Agendamento confirmado com sucesso!"
         }
         
+    except SlotUnavailable:
+        raise HTTPException(status_code=409, detail="Horário não disponível")
     except Exception as e:
         logger.error(f"❌ Erro ao criar agendamento: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/booking/{booking_id}/cancel")
+async def cancel_booking(booking_id: str, reason: Optional[str] = None):
+    """
+    Cancelar agendamento e liberar o horário
+    """
+    try:
+        if not await booking_pipeline.cancel(booking_id, reason):
+            raise HTTPException(status_code=404, detail="Agendamento não encontrado ou já cancelado")
+        
+        logger.info(f"✅ Agendamento cancelado: ID {booking_id}")
+        return {"booking_id": booking_id, "status": "cancelled"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"❌ Erro ao cancelar agendamento: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/analytics/conversations")
 async def get_conversation_analytics():
     """
     Analytics das conversas em tempo real
     """
-    total_conversations = len(active_conversations)
+    contexts = await conversation_store.values()
+    total_conversations = len(contexts)
     
     # Análise dos estados
     states = {}
     intents = {}
     
-    for context in active_conversations.values():
+    for context in contexts:
         state = context.conversation_state
         states[state] = states.get(state, 0) + 1
         
@@ -341,14 +435,43 @@ async def get_conversation_analytics():
         "detected_intents": intents,
         "avg_session_duration": "5.2 minutos",  # Calculado
         "conversion_rate": "78%",  # Conversas -> Agendamentos
-        "satisfaction_score": 4.7
+        "satisfaction_score": 4.7,
+        "stage_timings": ai_engine.get_timing_stats(),
+        "llm_cache": ai_engine.get_llm_stats(),
+        "message_lanes": message_lanes.get_stats(),
+        "message_statuses": message_status_counts,
+        "webhook_dedup": message_dedup.get_stats()
     }
 
+def require_admin_token(token: Optional[str]):
+    """Rotas /admin só existem com ADMIN_API_TOKEN configurado e exigem o token"""
+    expected = os.getenv("ADMIN_API_TOKEN")
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not secrets.compare_digest(token, expected):
+        raise HTTPException(status_code=401, detail="Token de administração inválido")
+
+@app.post("/admin/clients/rebuild-aggregates")
+async def rebuild_client_aggregates(x_admin_token: Optional[str] = Header(None)):
+    """
+    Recalcula as métricas de clientes a partir do banco local e relata divergências
+    """
+    require_admin_token(x_admin_token)
+    
+    result = await db_manager.rebuild_client_aggregates()
+    if not result:
+        raise HTTPException(status_code=500, detail="Falha ao recalcular métricas de clientes")
+    
+    return {"success": True, "data": result}
+
 @app.get("/analytics/notifications")
 async def get_notification_analytics():
     """Retorna estatísticas de notificações e lembretes"""
     try:
         stats = await notification_engine.get_reminder_stats()
+        stats["outbound_queue"] = notification_engine.get_queue_stats()
+        stats["scheduled_tasks"] = notification_engine.get_scheduler_stats()
+        stats["booking_outbox"] = booking_pipeline.outbox.get_stats()
         
         # Adicionar estatísticas simuladas
         stats.update({
@@ -415,7 +538,8 @@ async def health_check():
                 "scheduler": "operational"
             },
             "metrics": {
-                "active_conversations": len(active_conversations),
+                "active_conversations": await conversation_store.count(),
+                "calendar_cache": calendar_manager.get_cache_stats(),
                 "uptime": "99.9%",
                 "response_time": "<200ms"
             }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+🛣️ MESSAGE LANES
+Processamento ordenado por remetente com pool fixo de workers e backpressure
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Tuple
+from loguru import logger
+
+
+class LaneRejected(Exception):
+    """Item recusado por excesso de carga; `status_code` vai para a resposta HTTP"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: int = 1):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class MessageLanes:
+    """Uma fila lógica (lane) por remetente, atendida por N workers.
+
+    Cada lane fica no máximo uma vez na fila de prontas e só volta para
+    ela depois que o item atual termina, então duas mensagens do mesmo
+    número nunca são processadas ao mesmo tempo nem fora de ordem, enquanto
+    números diferentes avançam em paralelo. Lanes com itens pendentes
+    voltam para o fim da fila de prontas, o que reparte os workers de
+    forma justa entre remetentes.
+
+    Limites: `max_lane_depth` por remetente (429) e `max_pending` no total
+    (503).
+    """
+
+    def __init__(self, handler: Callable[[str, Any], Awaitable[None]], workers: int = None,
+                 max_pending: int = None, max_lane_depth: int = None):
+        self.handler = handler
+        self.workers = workers or int(os.getenv("WEBHOOK_WORKERS", "8"))
+        self.max_pending = max_pending or int(os.getenv("WEBHOOK_MAX_PENDING", "1000"))
+        self.max_lane_depth = max_lane_depth or int(os.getenv("WEBHOOK_MAX_LANE_DEPTH", "20"))
+
+        # lane -> itens (enfileirado_em, item) aguardando o worker
+        self._lanes: Dict[str, Deque[Tuple[float, Any]]] = {}
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._worker_tasks: List[asyncio.Task] = []
+
+        self.stats = {
+            "accepted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected_lane_full": 0,
+            "rejected_overloaded": 0,
+            "total_wait": 0.0,
+            "max_wait": 0.0,
+            "total_service": 0.0,
+            "max_service": 0.0,
+            "max_lane_depth_seen": 0
+        }
+
+    async def start(self):
+        if self._worker_tasks:
+            return
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"lane-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"✅ Lanes de mensagens iniciadas com {self.workers} workers")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Aguarda os itens pendentes (até o timeout) e encerra os workers"""
+        if not self._worker_tasks:
+            return
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"⚠️ {self._pending} mensagens descartadas ao encerrar")
+
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def submit(self, lane: str, item: Any):
+        """Enfileira `item` na lane; levanta LaneRejected se não houver espaço"""
+        if self._pending >= self.max_pending:
+            self.stats["rejected_overloaded"] += 1
+            raise LaneRejected(503, "fila de mensagens cheia", retry_after=5)
+
+        queue = self._lanes.get(lane)
+        if queue is not None and len(queue) >= self.max_lane_depth:
+            self.stats["rejected_lane_full"] += 1
+            raise LaneRejected(429, f"muitas mensagens pendentes de {lane}")
+
+        if queue is None:
+            # Lane nova: ainda não está com nenhum worker nem na fila de prontas
+            queue = self._lanes[lane] = deque()
+            self._ready.put_nowait(lane)
+
+        queue.append((time.monotonic(), item))
+        self._pending += 1
+        self._idle.clear()
+        self.stats["accepted"] += 1
+        if len(queue) > self.stats["max_lane_depth_seen"]:
+            self.stats["max_lane_depth_seen"] = len(queue)
+
+    def lane_depth(self, lane: str) -> int:
+        queue = self._lanes.get(lane)
+        return len(queue) if queue else 0
+
+    def get_stats(self) -> Dict:
+        """Profundidade, rejeições e latência (espera na lane e processamento)"""
+        done = self.stats["processed"] + self.stats["failed"]
+        return {
+            "workers": len(self._worker_tasks),
+            "pending": self._pending,
+            "active_lanes": len(self._lanes),
+            "accepted": self.stats["accepted"],
+            "processed": self.stats["processed"],
+            "failed": self.stats["failed"],
+            "rejected_lane_full": self.stats["rejected_lane_full"],
+            "rejected_overloaded": self.stats["rejected_overloaded"],
+            "avg_wait_ms": round(self.stats["total_wait"] / done * 1000, 2) if done else 0,
+            "max_wait_ms": round(self.stats["max_wait"] * 1000, 2),
+            "avg_service_ms": round(self.stats["total_service"] / done * 1000, 2) if done else 0,
+            "max_service_ms": round(self.stats["max_service"] * 1000, 2),
+            "max_lane_depth_seen": self.stats["max_lane_depth_seen"],
+            "deepest_lanes": self._deepest_lanes()
+        }
+
+    def _deepest_lanes(self, limit: int = 5) -> Dict[str, int]:
+        deepest = sorted(self._lanes.items(), key=lambda lane: len(lane[1]), reverse=True)[:limit]
+        return {lane: len(queue) for lane, queue in deepest if queue}
+
+    async def _worker(self):
+        while True:
+            lane = await self._ready.get()
+            queue = self._lanes[lane]
+            enqueued_at, item = queue[0]
+
+            started = time.monotonic()
+            wait = started - enqueued_at
+            try:
+                await self.handler(lane, item)
+                self.stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["failed"] += 1
+                logger.error(f"❌ Erro ao processar mensagem de {lane}: {e}")
+            finally:
+                service = time.monotonic() - started
+                self._record(wait, service)
+
+                queue.popleft()
+                self._pending -= 1
+                if queue:
+                    self._ready.put_nowait(lane)
+                else:
+                    del self._lanes[lane]
+                if not self._pending:
+                    self._idle.set()
+
+    def _record(self, wait: float, service: float):
+        self.stats["total_wait"] += wait
+        self.stats["total_service"] += service
+        if wait > self.stats["max_wait"]:
+            self.stats["max_wait"] = wait
+        if service > self.stats["max_service"]:
+            self.stats["max_service"] = service
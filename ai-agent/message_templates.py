@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+🧩 MESSAGE TEMPLATES
+Templates de mensagens pré-compilados em segmentos literais e campos
+"""
+
+from string import Formatter
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class MessageTemplate:
+    """Template compilado uma única vez.
+
+    O texto é dividido em literais e campos; renderizar é preencher os
+    campos numa cópia da lista de segmentos e fazer um único join.
+    `aliases` mapeia um campo para outra chave do registro de origem
+    (ex.: client_name <- name) e `defaults` dá o valor quando ela falta.
+    """
+
+    def __init__(self, name: str, text: str, defaults: Optional[Mapping[str, Any]] = None,
+                 aliases: Optional[Mapping[str, str]] = None):
+        self.name = name
+        self.defaults = dict(defaults or {})
+        self.aliases = dict(aliases or {})
+
+        items: List = []
+        for literal, field_name, format_spec in _parse(name, text):
+            if literal:
+                items.append(literal)
+            if field_name is not None:
+                items.append((field_name, format_spec))
+        self._compile(items)
+
+    def render(self, data: Mapping[str, Any] = None, **values) -> str:
+        """Renderiza com `values` (prioritários) e o registro `data`"""
+        data = data or {}
+        parts = self._segments.copy()
+
+        for index, field_name, format_spec in self._slots:
+            value = values.get(field_name, _MISSING)
+            if value is _MISSING:
+                value = data.get(self.aliases.get(field_name, field_name), _MISSING)
+            if value is _MISSING:
+                value = self.defaults.get(field_name, _MISSING)
+                if value is _MISSING:
+                    raise KeyError(f"Campo obrigatório ausente no template '{self.name}': {field_name}")
+            parts[index] = _format(value, format_spec)
+
+        return "".join(parts)
+
+    def partial(self, **values) -> "MessageTemplate":
+        """Fixa campos comuns a um lote, deixando só os variáveis por destinatário"""
+        items: List = []
+        slot_at = {index: (field_name, format_spec) for index, field_name, format_spec in self._slots}
+
+        for index, segment in enumerate(self._segments):
+            slot = slot_at.get(index)
+            if slot is not None and slot[0] not in values:
+                items.append(slot)
+                continue
+
+            text = segment if slot is None else _format(values[slot[0]], slot[1])
+            if items and isinstance(items[-1], str):
+                items[-1] += text
+            else:
+                items.append(text)
+
+        bound = MessageTemplate.__new__(MessageTemplate)
+        bound.name = self.name
+        bound.defaults = self.defaults
+        bound.aliases = self.aliases
+        bound._compile(items)
+        return bound
+
+    def _compile(self, items: List):
+        """Separa literais e posições dos campos"""
+        segments: List[str] = []
+        slots: List[Tuple[int, str, str]] = []
+
+        for item in items:
+            if isinstance(item, str):
+                segments.append(item)
+            else:
+                slots.append((len(segments), item[0], item[1]))
+                segments.append("")
+
+        self._segments = segments
+        self._slots = slots
+        self.fields = tuple(dict.fromkeys(field_name for _, field_name, _ in slots))
+        self.required = tuple(field_name for field_name in self.fields if field_name not in self.defaults)
+
+
+def _parse(name: str, text: str) -> Iterator[Tuple[str, Optional[str], str]]:
+    for literal, field_name, format_spec, conversion in Formatter().parse(text):
+        if field_name is not None and (not field_name.isidentifier() or conversion):
+            raise ValueError(f"Campo não suportado no template '{name}': {{{field_name}}}")
+        yield literal, field_name, format_spec or ""
+
+
+def _format(value: Any, format_spec: str) -> str:
+    return format(value, format_spec) if format_spec else str(value)
+
+
+class TemplateSet:
+    """Conjunto de templates compilados com valores padrão compartilhados"""
+
+    def __init__(self, templates: Mapping[str, str] = None, defaults: Mapping[str, Any] = None):
+        self.defaults = dict(defaults or {})
+        self.templates: Dict[str, MessageTemplate] = {}
+        for name, text in (templates or {}).items():
+            self.add(name, text)
+
+    def add(self, name: str, text: str, defaults: Mapping[str, Any] = None,
+            aliases: Mapping[str, str] = None, required: Iterable[str] = None) -> MessageTemplate:
+        """Compila um template; com `required`, qualquer outro campo sem padrão é erro de carga"""
+        template = MessageTemplate(name, text, {**self.defaults, **(defaults or {})}, aliases)
+
+        if required is not None:
+            unexpected = set(template.required) - set(required)
+            if unexpected:
+                raise ValueError(
+                    f"Template '{name}' usa campos sem valor padrão: {', '.join(sorted(unexpected))}"
+                )
+
+        self.templates[name] = template
+        return template
+
+    def __getitem__(self, name: str) -> MessageTemplate:
+        return self.templates[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.templates
+
+    def render(self, name: str, data: Mapping[str, Any] = None, **values) -> str:
+        return self.templates[name].render(data, **values)
+
+    def render_batch(self, name: str, recipients: Iterable[Tuple[str, Mapping[str, Any]]],
+                     **shared) -> Iterator[Tuple[str, str]]:
+        """Gera (telefone, mensagem) sob demanda; campos em `shared` são renderizados uma vez"""
+        template = self.templates[name].partial(**shared) if shared else self.templates[name]
+        for phone, data in recipients:
+            yield phone, template.render(data)
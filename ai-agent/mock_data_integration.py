@@ -25,6 +25,10 @@ class MockDataService:
             "last_updated": None
         }
         
+        # Índice especialidade -> profissionais (reconstruído quando o cache muda)
+        self._specialty_index: Optional[Dict[str, tuple]] = None
+        self._staff_by_id: Dict[str, Dict] = {}
+        
     async def initialize(self):
         """Inicializa e carrega dados mock"""
         try:
@@ -51,6 +55,7 @@ class MockDataService:
                         "transactions": [],
                         "last_updated": datetime.now().isoformat()
                     }
+                    self.invalidate_staff_index()
                     logger.info("✅ Dados carregados do Analytics API")
                     return
         except Exception as e:
@@ -176,6 +181,7 @@ class MockDataService:
                 self.cache["appointments"].append(appointment)
         
         self.cache["last_updated"] = datetime.now().isoformat()
+        self.invalidate_staff_index()
         logger.info(f"✅ Dados mock gerados: {len(self.cache['clients'])} clientes, {len(self.cache['appointments'])} agendamentos")
     
     def get_clients(self) -> List[Dict]:
@@ -206,11 +212,29 @@ class MockDataService:
     
     def get_staff_by_service(self, service_id: str) -> List[Dict]:
         """Retorna profissionais qualificados para um serviço"""
-        qualified_staff = []
+        if self._specialty_index is None:
+            self._build_staff_index()
+        
+        return [
+            self._staff_by_id[staff_id]
+            for staff_id in self._specialty_index.get(service_id, ())
+        ]
+    
+    def _build_staff_index(self):
+        """Constrói o índice especialidade -> profissionais"""
+        index = {}
+        self._staff_by_id = {}
         for staff in self.cache.get("staff", []):
-            if service_id in staff.get("specialties", []):
-                qualified_staff.append(staff)
-        return qualified_staff
+            self._staff_by_id[staff["id"]] = staff
+            for specialty in staff.get("specialties", []):
+                index.setdefault(specialty, []).append(staff["id"])
+        
+        # Tuplas preservam a ordem de cadastro dos profissionais
+        self._specialty_index = {specialty: tuple(ids) for specialty, ids in index.items()}
+    
+    def invalidate_staff_index(self):
+        """Descarta o índice após mudanças nos profissionais"""
+        self._specialty_index = None
     
     def get_appointments(self, date: str = None, staff_id: str = None) -> List[Dict]:
         """Retorna agendamentos filtrados"""
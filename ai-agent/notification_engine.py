@@ -10,14 +10,72 @@ import os
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 from pathlib import Path
-import schedule
 from loguru import logger
 
+from journal import WriteBehindFile
+from message_templates import TemplateSet
+from outbound_queue import OutboundQueue
+from reminder_dispatcher import ReminderDispatcher
+from task_scheduler import AsyncTaskScheduler
+from whatsapp_connector import WhatsAppConnector
+
+REMINDER_TYPES = ("24h", "2h", "no_show_check", "review_request")
+
+# Valores usados quando o registro não traz o campo
+TEMPLATE_DEFAULTS = {
+    'client_name': 'Cliente',
+    'service_name': 'Serviço',
+    'staff_member': 'Profissional',
+    'date': '',
+    'time': '',
+    'price': '0,00',
+    'client_id': '000',
+    'promo_title': 'Promoção Especial',
+    'discount': 10,
+    'services_list': '',
+    'expiry_date': '',
+    'old_date': '',
+    'old_time': '',
+    'new_date': '',
+    'new_time': ''
+}
+
+# Templates alimentados por registros de cliente (name/id em vez de client_*)
+TEMPLATE_ALIASES = {
+    'birthday': {'client_name': 'name', 'client_id': 'id'},
+    'promotion': {'client_name': 'name'}
+}
+
+# Campos que o chamador sempre informa (o resto precisa de valor padrão)
+TEMPLATE_REQUIRED = {
+    'review_request': ('discount_date',)
+}
+
 class NotificationEngine:
-    def __init__(self):
+    def __init__(self, data_service=None, whatsapp: Optional[WhatsAppConnector] = None):
         self.data_file = Path("notifications_data.json")
         self.notifications_queue = []
+        
+        # Lembretes agendados ficam em active_reminders (e no heap do
+        # dispatcher); enviados e falhos são movidos para o arquivo
         self.active_reminders = {}
+        self.reminder_archive = {}
+        self.reminder_dispatcher = ReminderDispatcher()
+        
+        # Gravações agrupadas: várias alterações seguidas viram uma escrita
+        self.data_writer = WriteBehindFile(self.data_file, self._data_snapshot)
+        
+        # Tarefas periódicas (aniversários, promoções)
+        self.task_scheduler = AsyncTaskScheduler()
+        
+        # Fonte dos clientes para aniversários e promoções (criada em initialize)
+        self.data_service = data_service
+        
+        # Um único conector (pool HTTP) e a fila de envios em massa; quando
+        # recebido de fora, quem o criou é responsável por fechá-lo
+        self._owns_whatsapp = whatsapp is None
+        self.whatsapp = whatsapp or WhatsAppConnector()
+        self.outbound_queue = OutboundQueue(self.whatsapp)
         
         # Templates de mensagens
         self.templates = {
@@ -188,6 +246,15 @@ Rua das Flores, 123
 
 🌟 Te esperamos! 💕"""
         }
+        
+        # Templates pré-compilados (validados na carga)
+        self.renderer = TemplateSet(defaults=TEMPLATE_DEFAULTS)
+        for name, text in self.templates.items():
+            self.renderer.add(
+                name, text,
+                aliases=TEMPLATE_ALIASES.get(name),
+                required=TEMPLATE_REQUIRED.get(name, ())
+            )
     
     async def initialize(self):
         """Inicializa o sistema de notificações"""
@@ -195,6 +262,18 @@ Rua das Flores, 123
             # Carregar dados existentes
             await self.load_data()
             
+            # Carregar clientes uma única vez para as tarefas periódicas
+            if self.data_service is None:
+                from mock_data_integration import MockDataService
+                self.data_service = MockDataService()
+            await self.data_service.initialize()
+            
+            # Iniciar workers da fila de envio
+            await self.outbound_queue.start()
+            
+            # Disparar lembretes exatamente no horário
+            self.reminder_dispatcher.start(self._dispatch_reminders)
+            
             # Configurar agendamentos automáticos
             await self.setup_scheduled_tasks()
             
@@ -203,6 +282,18 @@ Rua das Flores, 123
         except Exception as e:
             logger.error(f"❌ Erro ao inicializar Notification Engine: {e}")
     
+    async def shutdown(self):
+        """Esvazia a fila de envio e fecha o conector"""
+        try:
+            await self.task_scheduler.stop()
+            await self.reminder_dispatcher.stop()
+            await self.data_writer.close()
+            await self.outbound_queue.stop()
+            if self._owns_whatsapp:
+                await self.whatsapp.close()
+        except Exception as e:
+            logger.error(f"❌ Erro ao encerrar Notification Engine: {e}")
+    
     async def load_data(self):
         """Carrega dados de notificações"""
         try:
@@ -210,7 +301,15 @@ Rua das Flores, 123
                 with open(self.data_file, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     self.active_reminders = data.get('active_reminders', {})
+                    self.reminder_archive = data.get('reminder_archive', {})
                     self.notifications_queue = data.get('notifications_queue', [])
+                
+                # Arquivos antigos guardavam lembretes finalizados junto dos agendados
+                for key, reminder in list(self.active_reminders.items()):
+                    if reminder['status'] == 'scheduled':
+                        self.reminder_dispatcher.schedule(key, datetime.fromisoformat(reminder['send_time']))
+                    else:
+                        self.reminder_archive[key] = self.active_reminders.pop(key)
             else:
                 await self.save_data()
                 
@@ -218,49 +317,52 @@ Rua das Flores, 123
             logger.error(f"❌ Erro ao carregar dados: {e}")
     
     async def save_data(self):
-        """Salva dados de notificações"""
+        """Agenda a gravação dos dados de notificações (write-behind)"""
+        self.data_writer.mark_dirty()
+    
+    async def flush_data(self):
+        """Grava imediatamente os dados pendentes"""
         try:
-            data = {
-                'active_reminders': self.active_reminders,
-                'notifications_queue': self.notifications_queue,
-                'last_update': datetime.now().isoformat()
-            }
-            
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
-                
+            await self.data_writer.flush()
         except Exception as e:
             logger.error(f"❌ Erro ao salvar dados: {e}")
     
+    def _data_snapshot(self) -> Dict:
+        return {
+            'active_reminders': self.active_reminders,
+            'reminder_archive': self.reminder_archive,
+            'notifications_queue': self.notifications_queue,
+            'last_update': datetime.now().isoformat()
+        }
+    
     async def send_booking_confirmation(self, booking_data: Dict) -> bool:
         """Envia confirmação de agendamento"""
         try:
-            message = self.templates["booking_confirmation"].format(
-                service_name=booking_data.get('service_name', 'Serviço'),
-                client_name=booking_data.get('client_name', 'Cliente'),
-                date=booking_data.get('date', ''),
-                time=booking_data.get('time', ''),
-                staff_member=booking_data.get('staff_member', 'Profissional'),
-                price=booking_data.get('price', '0,00')
-            )
-            
-            # Enviar via WhatsApp
-            success = await self._send_whatsapp_message(
-                phone=booking_data.get('client_phone'),
-                message=message
-            )
-            
-            if success:
-                # Agendar lembretes automáticos
-                await self.schedule_reminders(booking_data)
-                logger.info(f"✅ Confirmação enviada para {booking_data.get('client_name')}")
-            
-            return success
+            result = await self.confirm_booking(booking_data)
+            return result.get('success', False)
             
         except Exception as e:
             logger.error(f"❌ Erro ao enviar confirmação: {e}")
             return False
     
+    async def confirm_booking(self, booking_data: Dict) -> Dict:
+        """Envia a confirmação e agenda os lembretes; retorna o resultado do conector
+        (com `retryable` em caso de falha)"""
+        message = self.renderer.render("booking_confirmation", booking_data)
+        
+        # Enviar via WhatsApp
+        result = await self.whatsapp.send_message(
+            to_number=booking_data.get('client_phone'),
+            message=message
+        )
+        
+        if result.get('success'):
+            # Agendar lembretes automáticos
+            await self.schedule_reminders(booking_data)
+            logger.info(f"✅ Confirmação enviada para {booking_data.get('client_name')}")
+        
+        return result
+    
     async def schedule_reminders(self, booking_data: Dict):
         """Agenda lembretes automáticos"""
         try:
@@ -326,19 +428,14 @@ Rua das Flores, 123
         
         reminder_key = f"{booking_id}_{reminder_type}"
         self.active_reminders[reminder_key] = reminder
+        self.reminder_dispatcher.schedule(reminder_key, send_time)
         
         await self.save_data()
     
     async def send_24h_reminder(self, booking_data: Dict) -> bool:
         """Envia lembrete 24h antes"""
         try:
-            message = self.templates["reminder_24h"].format(
-                client_name=booking_data.get('client_name', 'Cliente'),
-                service_name=booking_data.get('service_name', 'Serviço'),
-                date=booking_data.get('date', ''),
-                time=booking_data.get('time', ''),
-                staff_member=booking_data.get('staff_member', 'Profissional')
-            )
+            message = self.renderer.render("reminder_24h", booking_data)
             
             return await self._send_whatsapp_message(
                 phone=booking_data.get('client_phone'),
@@ -352,12 +449,7 @@ Rua das Flores, 123
     async def send_2h_reminder(self, booking_data: Dict) -> bool:
         """Envia lembrete 2h antes"""
         try:
-            message = self.templates["reminder_2h"].format(
-                client_name=booking_data.get('client_name', 'Cliente'),
-                service_name=booking_data.get('service_name', 'Serviço'),
-                time=booking_data.get('time', ''),
-                staff_member=booking_data.get('staff_member', 'Profissional')
-            )
+            message = self.renderer.render("reminder_2h", booking_data)
             
             return await self._send_whatsapp_message(
                 phone=booking_data.get('client_phone'),
@@ -371,10 +463,7 @@ Rua das Flores, 123
     async def send_no_show_followup(self, booking_data: Dict) -> bool:
         """Envia follow-up para no-show"""
         try:
-            message = self.templates["no_show_followup"].format(
-                client_name=booking_data.get('client_name', 'Cliente'),
-                time=booking_data.get('time', '')
-            )
+            message = self.renderer.render("no_show_followup", booking_data)
             
             return await self._send_whatsapp_message(
                 phone=booking_data.get('client_phone'),
@@ -390,12 +479,7 @@ Rua das Flores, 123
         try:
             discount_date = (datetime.now() + timedelta(days=30)).strftime('%d/%m/%Y')
             
-            message = self.templates["review_request"].format(
-                client_name=booking_data.get('client_name', 'Cliente'),
-                service_name=booking_data.get('service_name', 'Serviço'),
-                staff_member=booking_data.get('staff_member', 'Profissional'),
-                discount_date=discount_date
-            )
+            message = self.renderer.render("review_request", booking_data, discount_date=discount_date)
             
             return await self._send_whatsapp_message(
                 phone=booking_data.get('client_phone'),
@@ -409,10 +493,7 @@ Rua das Flores, 123
     async def send_birthday_message(self, client_data: Dict) -> bool:
         """Envia mensagem de aniversário"""
         try:
-            message = self.templates["birthday"].format(
-                client_name=client_data.get('name', 'Cliente'),
-                client_id=client_data.get('id', '000')
-            )
+            message = self.renderer.render("birthday", client_data)
             
             return await self._send_whatsapp_message(
                 phone=client_data.get('phone'),
@@ -423,18 +504,23 @@ Rua das Flores, 123
             logger.error(f"❌ Erro na mensagem de aniversário: {e}")
             return False
     
+    def _promotion_fields(self, promo_data: Dict) -> Dict:
+        """Campos da promoção, iguais para todos os destinatários"""
+        return {
+            'promo_title': promo_data.get('title', 'Promoção Especial'),
+            'discount': promo_data.get('discount', 10),
+            'services_list': "\n".join([f"• {service}" for service in promo_data.get('services', [])]),
+            'expiry_date': promo_data.get('expiry_date', '')
+        }
+    
+    def render_promotional_message(self, client_data: Dict, promo_data: Dict) -> str:
+        """Monta o texto da mensagem promocional"""
+        return self.renderer.render("promotion", client_data, **self._promotion_fields(promo_data))
+    
     async def send_promotional_message(self, client_data: Dict, promo_data: Dict) -> bool:
         """Envia mensagem promocional"""
         try:
-            services_list = "\n".join([f"• {service}" for service in promo_data.get('services', [])])
-            
-            message = self.templates["promotion"].format(
-                client_name=client_data.get('name', 'Cliente'),
-                promo_title=promo_data.get('title', 'Promoção Especial'),
-                discount=promo_data.get('discount', 10),
-                services_list=services_list,
-                expiry_date=promo_data.get('expiry_date', '')
-            )
+            message = self.render_promotional_message(client_data, promo_data)
             
             return await self._send_whatsapp_message(
                 phone=client_data.get('phone'),
@@ -448,12 +534,7 @@ Rua das Flores, 123
     async def send_cancellation_confirmation(self, booking_data: Dict) -> bool:
         """Confirma cancelamento"""
         try:
-            message = self.templates["cancellation_confirmation"].format(
-                client_name=booking_data.get('client_name', 'Cliente'),
-                date=booking_data.get('date', ''),
-                time=booking_data.get('time', ''),
-                service_name=booking_data.get('service_name', 'Serviço')
-            )
+            message = self.renderer.render("cancellation_confirmation", booking_data)
             
             # Cancelar lembretes agendados
             await self.cancel_reminders(booking_data.get('booking_id'))
@@ -470,15 +551,12 @@ Rua das Flores, 123
     async def send_reschedule_confirmation(self, old_booking: Dict, new_booking: Dict) -> bool:
         """Confirma reagendamento"""
         try:
-            message = self.templates["reschedule_confirmation"].format(
-                client_name=new_booking.get('client_name', 'Cliente'),
+            message = self.renderer.render(
+                "reschedule_confirmation", new_booking,
                 old_date=old_booking.get('date', ''),
                 old_time=old_booking.get('time', ''),
                 new_date=new_booking.get('date', ''),
-                new_time=new_booking.get('time', ''),
-                service_name=new_booking.get('service_name', 'Serviço'),
-                staff_member=new_booking.get('staff_member', 'Profissional'),
-                price=new_booking.get('price', '0,00')
+                new_time=new_booking.get('time', '')
             )
             
             # Cancelar lembretes antigos e agendar novos
@@ -497,14 +575,11 @@ Rua das Flores, 123
     async def cancel_reminders(self, booking_id: str):
         """Cancela lembretes de um agendamento"""
         try:
-            keys_to_remove = [
-                key for key in self.active_reminders.keys() 
-                if key.startswith(booking_id)
-            ]
-            
-            for key in keys_to_remove:
-                del self.active_reminders[key]
-                logger.info(f"✅ Lembrete cancelado: {key}")
+            for reminder_type in REMINDER_TYPES:
+                key = f"{booking_id}_{reminder_type}"
+                if self.active_reminders.pop(key, None) is not None:
+                    self.reminder_dispatcher.cancel(key)
+                    logger.info(f"✅ Lembrete cancelado: {key}")
             
             await self.save_data()
             
@@ -512,28 +587,31 @@ Rua das Flores, 123
             logger.error(f"❌ Erro ao cancelar lembretes: {e}")
     
     async def process_pending_reminders(self):
-        """Processa lembretes pendentes"""
+        """Processa lembretes vencidos"""
+        await self._dispatch_reminders(self.reminder_dispatcher.pop_due())
+    
+    async def _dispatch_reminders(self, reminder_keys: List[str]):
+        """Envia os lembretes retirados do heap e os move para o arquivo"""
         try:
-            current_time = datetime.now()
             processed_reminders = []
             
-            for reminder_key, reminder in self.active_reminders.items():
-                if reminder['status'] != 'scheduled':
+            for reminder_key in reminder_keys:
+                reminder = self.active_reminders.pop(reminder_key, None)
+                if reminder is None:
                     continue
                 
-                send_time = datetime.fromisoformat(reminder['send_time'])
+                success = await self._process_single_reminder(reminder)
+                current_time = datetime.now()
                 
-                if send_time <= current_time:
-                    success = await self._process_single_reminder(reminder)
-                    
-                    if success:
-                        reminder['status'] = 'sent'
-                        reminder['sent_at'] = current_time.isoformat()
-                    else:
-                        reminder['status'] = 'failed'
-                        reminder['failed_at'] = current_time.isoformat()
-                    
-                    processed_reminders.append(reminder_key)
+                if success:
+                    reminder['status'] = 'sent'
+                    reminder['sent_at'] = current_time.isoformat()
+                else:
+                    reminder['status'] = 'failed'
+                    reminder['failed_at'] = current_time.isoformat()
+                
+                self.reminder_archive[reminder_key] = reminder
+                processed_reminders.append(reminder_key)
             
             if processed_reminders:
                 await self.save_data()
@@ -567,11 +645,7 @@ Rua das Flores, 123
     async def _send_whatsapp_message(self, phone: str, message: str) -> bool:
         """Envia mensagem via WhatsApp"""
         try:
-            # Importar connector apenas quando necessário
-            from whatsapp_connector import WhatsAppConnector
-            
-            whatsapp = WhatsAppConnector()
-            result = await whatsapp.send_message(to_number=phone, message=message)
+            result = await self.whatsapp.send_message(to_number=phone, message=message)
             
             return result.get('sent', False) or result.get('simulated', False) or result.get('success', False)
             
@@ -582,14 +656,19 @@ Rua das Flores, 123
     async def setup_scheduled_tasks(self):
         """Configura tarefas agendadas"""
         try:
-            # Verificar lembretes a cada 5 minutos
-            schedule.every(5).minutes.do(lambda: asyncio.create_task(self.process_pending_reminders()))
-            
-            # Verificar aniversários diariamente às 9h
-            schedule.every().day.at("09:00").do(lambda: asyncio.create_task(self.check_birthdays()))
+            # Verificar aniversários diariamente às 9h (recupera até o fim da manhã)
+            self.task_scheduler.add_cron_job(
+                "birthdays", self.check_birthdays, "0 9 * * *",
+                jitter=60, catch_up=3 * 3600
+            )
             
             # Enviar promoções semanalmente às sextas 15h
-            schedule.every().friday.at("15:00").do(lambda: asyncio.create_task(self.send_weekly_promotions()))
+            self.task_scheduler.add_cron_job(
+                "weekly_promotions", self.send_weekly_promotions, "0 15 * * 5",
+                jitter=300, catch_up=3 * 3600
+            )
+            
+            await self.task_scheduler.start()
             
             logger.info("✅ Tarefas agendadas configuradas")
             
@@ -599,23 +678,23 @@ Rua das Flores, 123
     async def check_birthdays(self):
         """Verifica aniversários do dia"""
         try:
-            from mock_data_integration import MockDataService
-            
-            mock_service = MockDataService()
-            clients = await mock_service.get_clients()
+            clients = self.data_service.get_clients()
             
             today = datetime.now()
             birthday_clients = []
             
             for client in clients:
-                if 'birthday' in client:
+                if 'birthday' in client and client.get('phone'):
                     birthday = datetime.strptime(client['birthday'], '%Y-%m-%d')
                     if birthday.month == today.month and birthday.day == today.day:
                         birthday_clients.append(client)
             
-            for client in birthday_clients:
-                await self.send_birthday_message(client)
-                logger.info(f"🎂 Mensagem de aniversário enviada para {client.get('name')}")
+            messages = self.renderer.render_batch(
+                "birthday", ((client['phone'], client) for client in birthday_clients)
+            )
+            queued = await self.outbound_queue.enqueue_many(messages)
+            
+            logger.info(f"🎂 {len(queued)} mensagens de aniversário enfileiradas")
             
         except Exception as e:
             logger.error(f"❌ Erro ao verificar aniversários: {e}")
@@ -630,27 +709,36 @@ Rua das Flores, 123
                 'expiry_date': (datetime.now() + timedelta(days=7)).strftime('%d/%m/%Y')
             }
             
-            from mock_data_integration import MockDataService
-            mock_service = MockDataService()
-            clients = await mock_service.get_clients()
+            clients = self.data_service.get_clients()
             
-            # Enviar para clientes ativos (últimos 60 dias)
-            for client in clients[:10]:  # Limitar para teste
-                await self.send_promotional_message(client, promo_data)
-                await asyncio.sleep(2)  # Intervalo entre envios
+            # Renderizar em lote (campos da promoção uma vez só) direto para a fila
+            messages = self.renderer.render_batch(
+                "promotion",
+                ((client['phone'], client) for client in clients if client.get('phone')),
+                **self._promotion_fields(promo_data)
+            )
+            queued = await self.outbound_queue.enqueue_many(messages)
             
-            logger.info("✅ Promoções semanais enviadas")
+            logger.info(f"✅ {len(queued)} promoções semanais enfileiradas")
             
         except Exception as e:
             logger.error(f"❌ Erro ao enviar promoções: {e}")
     
+    def get_scheduler_stats(self) -> Dict:
+        """Retorna métricas das tarefas agendadas"""
+        return self.task_scheduler.get_stats()
+    
+    def get_queue_stats(self) -> Dict:
+        """Retorna estatísticas da fila de envio"""
+        return self.outbound_queue.get_stats()
+    
     async def get_reminder_stats(self) -> Dict:
         """Retorna estatísticas dos lembretes"""
         try:
-            total_reminders = len(self.active_reminders)
-            sent_reminders = sum(1 for r in self.active_reminders.values() if r['status'] == 'sent')
-            failed_reminders = sum(1 for r in self.active_reminders.values() if r['status'] == 'failed')
-            pending_reminders = sum(1 for r in self.active_reminders.values() if r['status'] == 'scheduled')
+            pending_reminders = len(self.active_reminders)
+            sent_reminders = sum(1 for r in self.reminder_archive.values() if r['status'] == 'sent')
+            failed_reminders = len(self.reminder_archive) - sent_reminders
+            total_reminders = pending_reminders + len(self.reminder_archive)
             
             return {
                 'total_reminders': total_reminders,
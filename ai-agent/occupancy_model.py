@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+📊 OCCUPANCY MODEL
+Provedores de ocupação para o Smart Scheduler
+"""
+
+import hashlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+from availability_index import AvailabilityIndex
+
+
+class OccupancyProvider(ABC):
+    """Interface dos provedores de ocupação"""
+
+    @abstractmethod
+    def is_busy(self, staff_id: str, start_time: datetime, end_time: datetime) -> bool:
+        """Indica se o profissional está ocupado em [start_time, end_time)"""
+
+
+class BookingOccupancy(OccupancyProvider):
+    """Ocupação real a partir dos agendamentos registrados no índice"""
+
+    def __init__(self, availability_index: AvailabilityIndex):
+        self.availability_index = availability_index
+
+    def is_busy(self, staff_id: str, start_time: datetime, end_time: datetime) -> bool:
+        return not self.availability_index.is_free(staff_id, start_time, end_time)
+
+
+class DemandOccupancyModel(OccupancyProvider):
+    """Modelo determinístico de demanda.
+
+    Cada (profissional, horário) recebe uma amostra derivada de um hash com a
+    semente configurada, então a mesma consulta sempre retorna o mesmo
+    resultado. Um período é ocupado se qualquer passo de `step_minutes`
+    dentro dele for. As amostras ficam em cache por profissional e por dia,
+    com no máximo `max_cached_days` dias (LRU).
+    """
+
+    def __init__(self, seed: str = "0",
+                 peak_hours: Tuple[int, ...] = (10, 11, 14, 15, 16),
+                 peak_days: Tuple[int, ...] = (4, 5),
+                 base_probability: float = 0.3,
+                 step_minutes: int = 30,
+                 max_cached_days: int = 512):
+        self.seed = str(seed)
+        self.peak_hours = frozenset(peak_hours)
+        self.peak_days = frozenset(peak_days)
+        self.base_probability = base_probability
+        self.step = timedelta(minutes=step_minutes)
+        self.max_cached_days = max_cached_days
+        self._cache: "OrderedDict[Tuple[str, date], Dict[datetime, bool]]" = OrderedDict()
+
+    def busy_probability(self, start_time: datetime) -> float:
+        """Probabilidade de um horário estar ocupado"""
+        hour = start_time.hour
+        probability = self.base_probability
+
+        # Horários de maior demanda
+        if hour in self.peak_hours:
+            probability += 0.2
+
+        # Dias de maior demanda (sexta e sábado)
+        if start_time.weekday() in self.peak_days:
+            probability += 0.15
+
+        # Horários menos populares (muito cedo ou muito tarde)
+        if hour <= 8 or hour >= 17:
+            probability -= 0.1
+
+        return probability
+
+    def sample(self, staff_id: str, start_time: datetime) -> float:
+        """Amostra uniforme em [0, 1) estável para (profissional, horário)"""
+        key = f"{self.seed}|{staff_id}|{start_time.isoformat()}".encode("utf-8")
+        digest = hashlib.blake2b(key, digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2 ** 64
+
+    def is_busy(self, staff_id: str, start_time: datetime, end_time: datetime) -> bool:
+        moment = start_time
+        while True:
+            if self._is_step_busy(staff_id, moment):
+                return True
+            moment += self.step
+            if moment >= end_time:
+                return False
+
+    def _is_step_busy(self, staff_id: str, moment: datetime) -> bool:
+        key = (staff_id, moment.date())
+        day_cache = self._cache.get(key)
+        if day_cache is None:
+            day_cache = self._cache[key] = {}
+            while len(self._cache) > self.max_cached_days:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(key)
+
+        busy = day_cache.get(moment)
+        if busy is None:
+            busy = day_cache[moment] = (
+                self.sample(staff_id, moment) <= self.busy_probability(moment)
+            )
+        return busy
+
+    def clear_cache(self, day: date = None):
+        """Descarta amostras em cache (de um dia ou de todos)"""
+        if day is None:
+            self._cache.clear()
+            return
+        for key in [key for key in self._cache if key[1] == day]:
+            del self._cache[key]
+
+
+class CompositeOccupancy(OccupancyProvider):
+    """Consulta os provedores em ordem; o primeiro que indicar ocupação vence"""
+
+    def __init__(self, providers: List[OccupancyProvider]):
+        self.providers = list(providers)
+
+    def is_busy(self, staff_id: str, start_time: datetime, end_time: datetime) -> bool:
+        return any(
+            provider.is_busy(staff_id, start_time, end_time)
+            for provider in self.providers
+        )
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+📤 OUTBOUND QUEUE
+Fila durável de envios WhatsApp com limites de taxa (token bucket)
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import asdict, dataclass, field
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+
+from journal import AppendOnlyJournal
+from whatsapp_connector import SAFE_RETRY_ERRORS
+
+
+class TokenBucket:
+    """Token bucket clássico: `rate` fichas por segundo, até `capacity`"""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self) -> float:
+        """Consome uma ficha e retorna quantos segundos esperar até ela valer"""
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+    @property
+    def is_idle(self) -> bool:
+        self._refill()
+        return self.tokens >= self.capacity
+
+    async def acquire(self):
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class OutboundMessage:
+    id: str
+    phone: str
+    message: str
+    message_type: str = "text"
+    attempts: int = 0
+    enqueued_at: float = field(default_factory=time.time)
+
+
+class OutboundQueue:
+    """Fila de envio com pool de workers e um único WhatsAppConnector.
+
+    Cada mensagem enfileirada é registrada em um journal append-only e só
+    sai dele quando é enviada ou esgota as tentativas, então envios
+    pendentes sobrevivem a um reinício do processo. Só falhas marcadas como
+    `retryable` pelo conector voltam para a fila; as demais contam como
+    falha na hora, para não duplicar uma mensagem que a API já aceitou.
+    """
+
+    def __init__(self, connector, workers: int = None, global_rate: float = None,
+                 per_number_rate: float = None, max_retries: int = 3,
+                 retry_backoff: float = 2.0, journal_path: str = 'outbound_queue.jsonl',
+                 snapshot_path: str = 'outbound_queue.json'):
+        self.connector = connector
+        self.workers = workers or int(os.getenv("WHATSAPP_SEND_WORKERS", "8"))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+        # Limites de taxa: global e por número de destino
+        global_rate = global_rate or float(os.getenv("WHATSAPP_GLOBAL_RATE", "20"))
+        self.per_number_rate = per_number_rate or float(os.getenv("WHATSAPP_PER_NUMBER_RATE", "0.2"))
+        self.global_bucket = TokenBucket(global_rate, capacity=global_rate)
+        self.number_buckets: Dict[str, TokenBucket] = {}
+
+        self.journal = AppendOnlyJournal(journal_path, snapshot_path)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker_tasks: List[asyncio.Task] = []
+        self._ids = count()
+        self._started_at: Optional[float] = None
+
+        self.stats = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "in_flight": 0,
+            "total_latency": 0.0
+        }
+
+    async def start(self):
+        """Recupera envios pendentes do journal e inicia os workers"""
+        if self._worker_tasks:
+            return
+
+        pending = await asyncio.to_thread(self.journal.load)
+        for record in pending.values():
+            self._queue.put_nowait(OutboundMessage(**record))
+        if pending:
+            logger.info(f"📤 {len(pending)} envios pendentes recuperados")
+
+        self._started_at = time.monotonic()
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"outbound-worker-{i}")
+            for i in range(self.workers)
+        ]
+        logger.info(f"✅ Fila de envio iniciada com {self.workers} workers")
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """Aguarda a fila esvaziar (até o timeout) e encerra os workers"""
+        if self._worker_tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"⚠️ {self._queue.qsize()} envios ainda pendentes no journal")
+
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks = []
+
+        await asyncio.to_thread(self.journal.close)
+
+    async def enqueue(self, phone: str, message: str, message_type: str = "text") -> str:
+        """Enfileira uma mensagem e retorna seu id"""
+        ids = await self.enqueue_many([(phone, message)], message_type)
+        return ids[0]
+
+    async def enqueue_many(self, messages: Iterable[Tuple[str, str]], message_type: str = "text") -> List[str]:
+        """Enfileira um lote de (telefone, mensagem) com uma única ida ao journal"""
+        batch = [
+            OutboundMessage(
+                id=f"out_{int(time.time() * 1000)}_{next(self._ids)}",
+                phone=phone,
+                message=message,
+                message_type=message_type
+            )
+            for phone, message in messages
+        ]
+
+        await asyncio.to_thread(self._persist_batch, batch)
+
+        for outbound in batch:
+            self._queue.put_nowait(outbound)
+        self.stats["enqueued"] += len(batch)
+
+        return [outbound.id for outbound in batch]
+
+    def get_stats(self) -> Dict:
+        """Vazão, profundidade da fila e estatísticas de retry"""
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0
+        sent = self.stats["sent"]
+
+        return {
+            "queue_depth": self._queue.qsize(),
+            "in_flight": self.stats["in_flight"],
+            "enqueued": self.stats["enqueued"],
+            "sent": sent,
+            "failed": self.stats["failed"],
+            "retried": self.stats["retried"],
+            "throughput_per_minute": round(sent / elapsed * 60, 2) if elapsed else 0,
+            "avg_send_latency_ms": round(self.stats["total_latency"] / sent * 1000, 2) if sent else 0,
+            "workers": len(self._worker_tasks)
+        }
+
+    def _persist_batch(self, batch: List[OutboundMessage]):
+        for outbound in batch:
+            self.journal.put(outbound.id, asdict(outbound))
+
+    def _number_bucket(self, phone: str) -> TokenBucket:
+        bucket = self.number_buckets.get(phone)
+        if bucket is None:
+            # Descartar buckets ociosos para não crescer sem limite
+            if len(self.number_buckets) >= 10000:
+                self.number_buckets = {
+                    number: b for number, b in self.number_buckets.items() if not b.is_idle
+                }
+            bucket = self.number_buckets[phone] = TokenBucket(self.per_number_rate)
+        return bucket
+
+    async def _worker(self):
+        while True:
+            outbound = await self._queue.get()
+            try:
+                await self._number_bucket(outbound.phone).acquire()
+                await self.global_bucket.acquire()
+                await self._send(outbound)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Erro no worker de envio: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _send(self, outbound: OutboundMessage):
+        self.stats["in_flight"] += 1
+        started = time.monotonic()
+        try:
+            result = await self.connector.send_message(
+                to_number=outbound.phone,
+                message=outbound.message,
+                message_type=outbound.message_type
+            )
+        except Exception as e:
+            # Só a falha ao conectar garante que nada foi enviado
+            result = {"success": False, "error": str(e), "retryable": isinstance(e, SAFE_RETRY_ERRORS)}
+        finally:
+            self.stats["in_flight"] -= 1
+
+        if result.get("success"):
+            self.stats["sent"] += 1
+            self.stats["total_latency"] += time.monotonic() - started
+            await asyncio.to_thread(self.journal.delete, outbound.id)
+            return
+
+        # Falhas ambíguas (a API pode ter aceitado) e permanentes não são repetidas
+        outbound.attempts += 1
+        if result.get("retryable") and outbound.attempts < self.max_retries:
+            self.stats["retried"] += 1
+            await asyncio.to_thread(self.journal.put, outbound.id, asdict(outbound))
+            delay = self.retry_backoff * (2 ** (outbound.attempts - 1))
+            asyncio.get_running_loop().call_later(delay, self._queue.put_nowait, outbound)
+        else:
+            self.stats["failed"] += 1
+            await asyncio.to_thread(self.journal.delete, outbound.id)
+            logger.error(f"❌ Envio descartado após {outbound.attempts} tentativas: {outbound.phone} ({result.get('error')})")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+⏰ REMINDER DISPATCHER
+Min-heap de lembretes que acorda exatamente no próximo horário de envio
+"""
+
+import asyncio
+import heapq
+import time
+from datetime import datetime
+from itertools import count
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from loguru import logger
+
+
+class ReminderDispatcher:
+    """Agenda chaves de lembrete por horário de envio.
+
+    Agendar e retirar custam O(log n). Cancelamentos e reagendamentos são
+    feitos por remoção preguiçosa: a entrada antiga continua no heap e é
+    descartada quando chega ao topo, se não bater com o horário vigente.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._due_at: Dict[str, float] = {}
+        self._seq = count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._due_at)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._due_at
+
+    def schedule(self, key: str, send_time: datetime):
+        """Agenda (ou reagenda) uma chave"""
+        due = send_time.timestamp()
+        self._due_at[key] = due
+        heapq.heappush(self._heap, (due, next(self._seq), key))
+
+        # Só precisa acordar o loop se o novo lembrete passou a ser o próximo
+        if self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def cancel(self, key: str) -> bool:
+        return self._due_at.pop(key, None) is not None
+
+    def next_due(self) -> Optional[float]:
+        """Timestamp do próximo lembrete válido"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float = None) -> List[str]:
+        """Retira todas as chaves vencidas, em ordem de horário"""
+        now = time.time() if now is None else now
+        due_keys = []
+
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                break
+            _, _, key = heapq.heappop(self._heap)
+            del self._due_at[key]
+            due_keys.append(key)
+
+        return due_keys
+
+    def start(self, on_due: Callable[[List[str]], Awaitable[None]]):
+        """Inicia o loop que entrega as chaves vencidas para `on_due`"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(on_due), name="reminder-dispatcher")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self, on_due: Callable[[List[str]], Awaitable[None]]):
+        while True:
+            self._wakeup.clear()
+
+            due_keys = self.pop_due()
+            if due_keys:
+                try:
+                    await on_due(due_keys)
+                except Exception as e:
+                    logger.error(f"❌ Erro ao disparar lembretes: {e}")
+                continue
+
+            next_due = self.next_due()
+            timeout = None if next_due is None else max(0.0, next_due - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _discard_stale(self):
+        heap = self._heap
+        while heap:
+            due, _, key = heap[0]
+            if self._due_at.get(key) == due:
+                return
+            heapq.heappop(heap)
@@ -4,13 +4,19 @@
 Otimização inteligente de horários e disponibilidade
 """
 
-from datetime import datetime, timedelta, time
-from typing import Dict, List, Optional, Tuple
+from datetime import date, datetime, timedelta, time
+from typing import Dict, Iterable, List, Optional, Tuple
 from loguru import logger
-import json
+import asyncio
+import os
 import random
 from dataclasses import dataclass
 from enum import Enum
+from itertools import groupby
+from availability_index import AvailabilityIndex
+from journal import AppendOnlyJournal
+from occupancy_model import BookingOccupancy, CompositeOccupancy, DemandOccupancyModel, OccupancyProvider
+from slot_ranking import ScoringWeights, SlotRanker
 
 class DayOfWeek(Enum):
     MONDAY = 0
@@ -31,6 +37,32 @@ class TimeSlot:
     service_type: Optional[str] = None
     client_name: Optional[str] = None
 
+@dataclass
+class ScoredSlot:
+    date: date
+    start_time: datetime
+    end_time: datetime
+    staff_id: str
+    staff_name: str
+    service_type: str
+    duration: int
+    score: float
+    
+    def to_dict(self) -> Dict:
+        """Formato de dicionário usado pela API e pelas sugestões"""
+        return {
+            "start_time": self.start_time.strftime("%H:%M"),
+            "end_time": self.end_time.strftime("%H:%M"),
+            "staff_id": self.staff_id,
+            "staff_name": self.staff_name,
+            "duration": self.duration,
+            "service_type": self.service_type,
+            "available": True,
+            "score": self.score,
+            "date": self.date.strftime("%Y-%m-%d"),
+            "day_name": self.date.strftime("%A")
+        }
+
 @dataclass
 class ServiceInfo:
     id: str
@@ -41,7 +73,12 @@ class ServiceInfo:
     popularity_score: float
 
 class SmartScheduler:
-    def __init__(self):
+    def __init__(self, occupancy: Optional[OccupancyProvider] = None,
+                 scoring_weights: Optional[ScoringWeights] = None,
+                 notifier=None):
+        # NotificationEngine compartilhado (conector, fila e lembretes já iniciados)
+        self.notifier = notifier
+        
         # Horário de funcionamento
         self.opening_time = time(8, 0)  # 8:00
         self.closing_time = time(18, 0)  # 18:00
@@ -89,9 +126,48 @@ class SmartScheduler:
             "unhas_gel": ServiceInfo("unhas_gel", "Unhas em Gel", 90, 80.0, ["unhas_gel"], 0.65)
         }
         
+        # Índice invertido habilidade -> profissionais (construído sob demanda)
+        self._skill_index: Optional[Dict[str, frozenset]] = None
+        self._qualified_cache: Dict[str, Dict] = {}
+        
         # Cache de agendamentos (simulado)
         self.bookings_cache = {}
         
+        # Journal append-only; bookings_data.json é o snapshot compactado
+        self.booking_journal = AppendOnlyJournal('bookings_journal.jsonl', 'bookings_data.json')
+        
+        # Índice de intervalos ocupados por profissional/dia
+        self.availability_index = AvailabilityIndex()
+        
+        # Ocupação: agendamentos reais e, só em demonstrações, demanda simulada
+        if occupancy is None:
+            providers = [BookingOccupancy(self.availability_index)]
+            if os.getenv("SCHEDULER_SIMULATE_DEMAND", "false").lower() == "true":
+                providers.append(DemandOccupancyModel(seed=os.getenv("SCHEDULER_DEMAND_SEED", "0")))
+            occupancy = CompositeOccupancy(providers)
+        self.occupancy = occupancy
+        
+        # Pontuação e seleção top-k de horários
+        self.ranker = SlotRanker(self.staff, scoring_weights)
+        
+    async def initialize(self):
+        """Reconstrói cache e índice de ocupação a partir do journal"""
+        try:
+            bookings = await asyncio.to_thread(self.booking_journal.load)
+            
+            for booking_id, booking_data in bookings.items():
+                self.bookings_cache[booking_id] = booking_data
+                self._index_booking(booking_data)
+            
+            logger.info(f"✅ {len(bookings)} agendamentos carregados do journal")
+            
+        except Exception as e:
+            logger.error(f"❌ Erro ao carregar agendamentos: {e}")
+    
+    async def close(self):
+        """Sincroniza e fecha o journal de agendamentos"""
+        await asyncio.to_thread(self.booking_journal.close)
+    
     async def get_availability(self, service_type: str, requested_date: str, duration_minutes: int = None) -> List[Dict]:
         """Retorna horários disponíveis para um serviço"""
         try:
@@ -113,41 +189,33 @@ class SmartScheduler:
             # Encontrar profissionais qualificados
             qualified_staff = self.get_qualified_staff(service_type)
             
-            available_slots = []
-            
-            for staff_id, staff_info in qualified_staff.items():
+            candidate_slots = (
+                slot
+                for staff_id, staff_info in qualified_staff.items()
                 # Verificar se trabalha neste dia
-                if target_date.weekday() not in staff_info["working_days"]:
-                    continue
-                
-                # Gerar slots de tempo
-                slots = self.generate_time_slots(
-                    target_date, 
-                    staff_id, 
-                    staff_info, 
-                    duration
-                )
-                
-                # Filtrar slots disponíveis
-                available_slots.extend([
-                    {
-                        "start_time": slot.start_time.strftime("%H:%M"),
-                        "end_time": slot.end_time.strftime("%H:%M"),
-                        "staff_id": slot.staff_id,
-                        "staff_name": slot.staff_name,
-                        "duration": duration,
-                        "service_type": service_type,
-                        "available": slot.available
-                    }
-                    for slot in slots if slot.available
-                ])
-            
-            # Ordenar por horário
-            available_slots.sort(key=lambda x: x["start_time"])
+                if target_date.weekday() in staff_info["working_days"]
+                for slot in self.iter_free_slots(target_date, staff_id, staff_info, duration)
+            )
+            
+            # Os 10 primeiros por horário, sem ordenar todos os candidatos
+            earliest_slots = self.ranker.earliest(candidate_slots, 10, key=lambda slot: slot.start_time)
+            
+            available_slots = [
+                {
+                    "start_time": slot.start_time.strftime("%H:%M"),
+                    "end_time": slot.end_time.strftime("%H:%M"),
+                    "staff_id": slot.staff_id,
+                    "staff_name": slot.staff_name,
+                    "duration": duration,
+                    "service_type": service_type,
+                    "available": slot.available
+                }
+                for slot in earliest_slots
+            ]
             
             logger.info(f"📅 {len(available_slots)} horários disponíveis para {service_type} em {requested_date}")
             
-            return available_slots[:10]  # Retornar no máximo 10 opções
+            return available_slots
             
         except Exception as e:
             logger.error(f"❌ Erro ao buscar disponibilidade: {e}")
@@ -155,128 +223,217 @@ class SmartScheduler:
     
     def get_qualified_staff(self, service_type: str) -> Dict:
         """Retorna profissionais qualificados para o serviço"""
-        service_info = self.services.get(service_type)
-        if not service_info:
-            return {}
-        
-        qualified = {}
-        required_skills = service_info.required_skills
+        qualified = self._qualified_cache.get(service_type)
         
-        for staff_id, staff_info in self.staff.items():
-            # Verificar se tem as habilidades necessárias
-            if any(skill in staff_info["skills"] for skill in required_skills):
-                qualified[staff_id] = staff_info
+        if qualified is None:
+            service_info = self.services.get(service_type)
+            if not service_info:
+                return {}
+            
+            # Serviços combinados exigem todas as habilidades
+            staff_ids = self.get_staff_for_skills(service_info.required_skills)
+            qualified = {
+                staff_id: staff_info
+                for staff_id, staff_info in self.staff.items()
+                if staff_id in staff_ids
+            }
+            self._qualified_cache[service_type] = qualified
         
-        return qualified
+        return dict(qualified)
     
-    def generate_time_slots(self, date: datetime.date, staff_id: str, staff_info: Dict, duration: int) -> List[TimeSlot]:
-        """Gera slots de tempo para um profissional em uma data"""
-        slots = []
+    def get_staff_for_skills(self, skills: List[str]) -> frozenset:
+        """Retorna os ids dos profissionais que dominam todas as habilidades"""
+        if self._skill_index is None:
+            self._build_skill_index()
         
-        # Horários de trabalho do profissional
-        work_start = staff_info["working_hours"]["start"]
-        work_end = staff_info["working_hours"]["end"]
+        if not skills:
+            return frozenset()
         
-        # Criar datetime para o dia
-        current_time = datetime.combine(date, work_start)
-        end_time = datetime.combine(date, work_end)
+        return frozenset.intersection(*(
+            self._skill_index.get(skill, frozenset()) for skill in skills
+        ))
+    
+    def _build_skill_index(self):
+        """Constrói o índice invertido habilidade -> profissionais"""
+        index = {}
+        for staff_id, staff_info in self.staff.items():
+            for skill in staff_info["skills"]:
+                index.setdefault(skill, set()).add(staff_id)
         
-        while current_time + timedelta(minutes=duration) <= end_time:
-            slot_end = current_time + timedelta(minutes=duration)
-            
-            # Verificar se o slot está disponível (simulado)
-            is_available = self.is_slot_available(current_time, slot_end, staff_id)
-            
-            slot = TimeSlot(
-                start_time=current_time,
-                end_time=slot_end,
-                staff_id=staff_id,
-                staff_name=staff_info["name"],
-                available=is_available
-            )
-            
-            slots.append(slot)
-            current_time += timedelta(minutes=self.slot_duration)
+        self._skill_index = {skill: frozenset(ids) for skill, ids in index.items()}
+    
+    def invalidate_skill_index(self):
+        """Descarta o índice após mudanças em profissionais ou serviços"""
+        self._skill_index = None
+        self._qualified_cache.clear()
+    
+    def add_staff(self, staff_id: str, staff_info: Dict):
+        """Adiciona ou atualiza um profissional"""
+        self.staff[staff_id] = staff_info
+        self.invalidate_skill_index()
+    
+    def remove_staff(self, staff_id: str):
+        """Remove um profissional"""
+        self.staff.pop(staff_id, None)
+        self.invalidate_skill_index()
+    
+    def add_service(self, service_info: ServiceInfo):
+        """Adiciona ou atualiza um serviço"""
+        self.services[service_info.id] = service_info
+        self.invalidate_skill_index()
+    
+    def iter_free_slots(self, date: date, staff_id: str, staff_info: Dict, duration: int):
+        """Gera apenas os slots livres, percorrendo as janelas vagas do índice"""
+        work_start = datetime.combine(date, staff_info["working_hours"]["start"])
+        work_end = datetime.combine(date, staff_info["working_hours"]["end"])
+        step = timedelta(minutes=self.slot_duration)
+        service_length = timedelta(minutes=duration)
         
-        return slots
+        for gap_start, gap_end in self.availability_index.free_gaps(staff_id, work_start, work_end):
+            # Alinhar ao próximo início de slot dentro da janela
+            steps_ahead = -((work_start - gap_start) // step)
+            current_time = work_start + steps_ahead * step
+            
+            while current_time + service_length <= gap_end:
+                slot_end = current_time + service_length
+                
+                if not self.occupancy.is_busy(staff_id, current_time, slot_end):
+                    yield TimeSlot(
+                        start_time=current_time,
+                        end_time=slot_end,
+                        staff_id=staff_id,
+                        staff_name=staff_info["name"]
+                    )
+                
+                current_time += step
     
     def is_slot_available(self, start_time: datetime, end_time: datetime, staff_id: str) -> bool:
-        """Verifica se um slot está disponível (simulado)"""
-        # Simular ocupação baseada em padrões realistas
-        hour = start_time.hour
-        day_of_week = start_time.weekday()
-        
-        # Horários de maior demanda
-        peak_hours = [10, 11, 14, 15, 16]  # 10h, 11h, 14h, 15h, 16h
-        peak_days = [4, 5]  # Sexta e Sábado
-        
-        # Probabilidade base de estar ocupado
-        base_probability = 0.3  # 30% chance de estar ocupado
-        
-        # Aumentar probabilidade em horários de pico
-        if hour in peak_hours:
-            base_probability += 0.2
-        
-        # Aumentar probabilidade em dias de pico
-        if day_of_week in peak_days:
-            base_probability += 0.15
-        
-        # Horários menos populares (muito cedo ou muito tarde)
-        if hour <= 8 or hour >= 17:
-            base_probability -= 0.1
-        
-        # Verificar cache de agendamentos existentes
-        key = f"{staff_id}_{start_time.isoformat()}"
-        if key in self.bookings_cache:
-            return False
+        """Verifica se um slot está disponível segundo o provedor de ocupação"""
+        return not self.occupancy.is_busy(staff_id, start_time, end_time)
+    
+    def _resolve_staff_id(self, staff: Optional[str]) -> Optional[str]:
+        """Resolve um id ou nome (completo ou primeiro nome) de profissional"""
+        if not staff:
+            return None
+        if staff in self.staff:
+            return staff
         
-        # Simular disponibilidade
-        import random
-        return random.random() > base_probability
+        staff_lower = staff.lower()
+        for staff_id, staff_info in self.staff.items():
+            name = staff_info["name"].lower()
+            if name == staff_lower or name.split()[0] == staff_lower:
+                return staff_id
+        return None
     
     async def validate_slot(self, service_type: str, date: str, time: str, staff_id: str = None) -> bool:
         """Valida se um slot específico está disponível"""
         try:
-            # Parse da data e hora
-            target_datetime = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
-            
-            # Obter informações do serviço
-            service_info = self.services.get(service_type)
-            if not service_info:
-                return False
-            
-            # Se staff_id não especificado, encontrar automaticamente
-            if not staff_id:
-                qualified_staff = self.get_qualified_staff(service_type)
-                if not qualified_staff:
-                    return False
-                staff_id = list(qualified_staff.keys())[0]  # Pegar o primeiro disponível
-            
-            # Verificar se o profissional trabalha neste horário
-            staff_info = self.staff.get(staff_id)
-            if not staff_info:
-                return False
-            
-            # Verificar dia da semana
-            if target_datetime.weekday() not in staff_info["working_days"]:
-                return False
-            
-            # Verificar horário de trabalho
-            work_start = staff_info["working_hours"]["start"]
-            work_end = staff_info["working_hours"]["end"]
-            
-            if target_datetime.time() < work_start or target_datetime.time() >= work_end:
-                return False
-            
-            # Verificar se não conflita com outros agendamentos
-            end_time = target_datetime + timedelta(minutes=service_info.duration_minutes)
-            
-            return self.is_slot_available(target_datetime, end_time, staff_id)
+            return self._check_slot(service_type, date, time, staff_id) is not None
             
         except Exception as e:
             logger.error(f"❌ Erro ao validar slot: {e}")
             return False
     
+    def reserve_slot(self, service_type: str, date: str, time: str, staff: str = None) -> Optional[Tuple[str, datetime, datetime]]:
+        """
+        Valida e marca o slot como ocupado no índice, sem pausas no event loop.
+        
+        Duas requisições simultâneas para o mesmo horário não passam ambas
+        pela validação. Retorna (staff_id, início, fim), ou None se o slot não
+        estiver livre; em caso de falha posterior, desfaça com release_slot.
+        `staff` aceita id ou nome do profissional.
+        """
+        try:
+            slot = self._check_slot(service_type, date, time, self._resolve_staff_id(staff))
+        except ValueError as e:
+            logger.error(f"❌ Erro ao validar slot: {e}")
+            return None
+        
+        if slot is not None:
+            self.availability_index.add_busy(*slot)
+        return slot
+    
+    def release_slot(self, staff_id: str, start_time: datetime, end_time: datetime):
+        """Libera um slot reservado com reserve_slot"""
+        self.availability_index.remove_busy(staff_id, start_time, end_time)
+    
+    def index_appointments(self, appointments: Iterable[Dict]) -> int:
+        """
+        Marca como ocupados os agendamentos gravados no banco.
+        
+        Reservas feitas com reserve_slot só existem no índice em memória;
+        ao iniciar, os agendamentos do banco as reconstroem.
+        """
+        indexed = 0
+        for appointment in appointments:
+            slot = self._appointment_slot(appointment)
+            if slot is not None:
+                self.availability_index.add_busy(*slot)
+                indexed += 1
+        return indexed
+    
+    def release_appointment(self, appointment: Dict):
+        """Libera o horário de um agendamento do banco (ex.: cancelado)"""
+        slot = self._appointment_slot({**appointment, 'status': None})
+        if slot is not None:
+            self.release_slot(*slot)
+    
+    def _appointment_slot(self, appointment: Dict) -> Optional[Tuple[str, datetime, datetime]]:
+        """(staff_id, início, fim) de um agendamento do banco não cancelado"""
+        if appointment.get('status') == 'cancelled':
+            return None
+        staff_id = self._resolve_staff_id(appointment.get('staff_id'))
+        try:
+            start_time = datetime.strptime(
+                f"{appointment['scheduled_date']} {appointment['scheduled_time']}", "%Y-%m-%d %H:%M"
+            )
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not staff_id:
+            return None
+        
+        duration = appointment.get('duration_minutes') or self.slot_duration
+        return staff_id, start_time, start_time + timedelta(minutes=duration)
+    
+    def _check_slot(self, service_type: str, date: str, time: str, staff_id: str = None) -> Optional[Tuple[str, datetime, datetime]]:
+        # Parse da data e hora
+        target_datetime = datetime.strptime(f"{date} {time}", "%Y-%m-%d %H:%M")
+        
+        # Obter informações do serviço
+        service_info = self.services.get(service_type)
+        if not service_info:
+            return None
+        
+        # Se staff_id não especificado, encontrar automaticamente
+        if not staff_id:
+            qualified_staff = self.get_qualified_staff(service_type)
+            if not qualified_staff:
+                return None
+            staff_id = list(qualified_staff.keys())[0]  # Pegar o primeiro disponível
+        
+        # Verificar se o profissional trabalha neste horário
+        staff_info = self.staff.get(staff_id)
+        if not staff_info:
+            return None
+        
+        # Verificar dia da semana
+        if target_datetime.weekday() not in staff_info["working_days"]:
+            return None
+        
+        # Verificar horário de trabalho
+        work_start = staff_info["working_hours"]["start"]
+        work_end = staff_info["working_hours"]["end"]
+        
+        if target_datetime.time() < work_start or target_datetime.time() >= work_end:
+            return None
+        
+        # Verificar se não conflita com outros agendamentos
+        end_time = target_datetime + timedelta(minutes=service_info.duration_minutes)
+        
+        if not self.is_slot_available(target_datetime, end_time, staff_id):
+            return None
+        return staff_id, target_datetime, end_time
+    
     async def book_slot(self, service_type: str, date: str, time: str, client_info: Dict, staff_id: str = None) -> Dict:
         """Reserva um horário"""
         try:
@@ -318,9 +475,10 @@ class SmartScheduler:
                 "created_at": datetime.now().isoformat()
             }
             
-            # Adicionar ao cache
+            # Adicionar ao cache e ao índice de ocupação
             key = f"{staff_id}_{target_datetime.isoformat()}"
             self.bookings_cache[key] = booking_data
+            self.availability_index.add_busy(staff_id, target_datetime, end_time)
             
             logger.info(f"✅ Agendamento criado: {booking_id}")
             
@@ -370,14 +528,15 @@ class SmartScheduler:
             success = await self._save_booking(booking_data)
             
             if success:
-                # Enviar confirmação e agendar lembretes
-                try:
-                    from notification_engine import NotificationEngine
-                    notification_engine = NotificationEngine()
-                    await notification_engine.send_booking_confirmation(booking_data)
-                    logger.info(f"✅ Confirmação e lembretes enviados para {client_name}")
-                except Exception as notif_error:
-                    logger.warning(f"⚠️ Erro nas notificações: {notif_error}")
+                # Enviar confirmação e agendar lembretes pelo engine compartilhado
+                if self.notifier is None:
+                    logger.debug(f"📭 Sem notificador configurado; confirmação de {booking_id} não enviada")
+                else:
+                    try:
+                        await self.notifier.send_booking_confirmation(booking_data)
+                        logger.info(f"✅ Confirmação e lembretes enviados para {client_name}")
+                    except Exception as notif_error:
+                        logger.warning(f"⚠️ Erro nas notificações: {notif_error}")
                 
                 logger.info(f"✅ Agendamento criado: {booking_id}")
                 return {
@@ -399,6 +558,62 @@ class SmartScheduler:
                 "error": str(e)
             }
     
+    async def get_availability_range(self, service_type: str, start_date, days: int = 7,
+                                     duration_minutes: int = None) -> List[ScoredSlot]:
+        """Retorna slots livres e pontuados de vários dias em uma única passada"""
+        try:
+            scored_slots = sorted(
+                self.iter_availability_range(service_type, start_date, days, duration_minutes),
+                key=lambda slot: (slot.start_time, slot.staff_id)
+            )
+            
+            logger.info(f"📅 {len(scored_slots)} horários disponíveis para {service_type} em {days} dias")
+            
+            return scored_slots
+            
+        except Exception as e:
+            logger.error(f"❌ Erro ao buscar disponibilidade do período: {e}")
+            return []
+    
+    def iter_availability_range(self, service_type: str, start_date, days: int = 7,
+                                duration_minutes: int = None):
+        """Gera slots livres e pontuados dia a dia, sem materializar o período"""
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        
+        service_info = self.services.get(service_type)
+        if not service_info:
+            logger.warning(f"Serviço {service_type} não encontrado")
+            return
+        
+        duration = duration_minutes or service_info.duration_minutes
+        
+        # Resolver profissionais qualificados uma única vez para todo o período
+        qualified_staff = self.get_qualified_staff(service_type)
+        
+        for days_ahead in range(days):
+            check_date = start_date + timedelta(days=days_ahead)
+            weekday = check_date.weekday()
+            
+            if weekday not in self.working_days:
+                continue
+            
+            for staff_id, staff_info in qualified_staff.items():
+                if weekday not in staff_info["working_days"]:
+                    continue
+                
+                for slot in self.iter_free_slots(check_date, staff_id, staff_info, duration):
+                    yield ScoredSlot(
+                        date=check_date,
+                        start_time=slot.start_time,
+                        end_time=slot.end_time,
+                        staff_id=staff_id,
+                        staff_name=slot.staff_name,
+                        service_type=service_type,
+                        duration=duration,
+                        score=self.score_slot(slot.start_time, staff_id)
+                    )
+    
     async def get_optimized_suggestions(self, service_type: str, preferred_date: str = None) -> List[Dict]:
         """Retorna sugestões otimizadas de horários"""
         try:
@@ -408,59 +623,36 @@ class SmartScheduler:
             else:
                 start_date = datetime.strptime(preferred_date, "%Y-%m-%d").date()
             
-            suggestions = []
+            slots = self.iter_availability_range(service_type, start_date, days=7)
+            by_score = lambda slot: slot.score
             
-            # Buscar nos próximos 7 dias
-            for days_ahead in range(7):
-                check_date = start_date + timedelta(days=days_ahead)
-                
-                # Pular domingos
-                if check_date.weekday() == 6:
-                    continue
-                
-                date_str = check_date.strftime("%Y-%m-%d")
-                availability = await self.get_availability(service_type, date_str)
-                
-                # Pegar os 3 melhores horários do dia
-                best_slots = self.rank_time_slots(availability, check_date)[:3]
-                suggestions.extend(best_slots)
-            
-            # Ordenar por pontuação
-            suggestions.sort(key=lambda x: x.get("score", 0), reverse=True)
+            # Os 3 melhores horários de cada dia alimentam o top 5 geral
+            daily_best = (
+                best_slot
+                for _, day_slots in groupby(slots, key=lambda slot: slot.date)
+                for best_slot in self.ranker.top_k(day_slots, 3, key=by_score)
+            )
+            suggestions = self.ranker.top_k(daily_best, 5, key=by_score)
             
-            return suggestions[:5]  # Top 5 sugestões
+            return [slot.to_dict() for slot in suggestions]  # Top 5 sugestões
             
         except Exception as e:
             logger.error(f"❌ Erro ao gerar sugestões: {e}")
             return []
     
-    def rank_time_slots(self, slots: List[Dict], date: datetime.date) -> List[Dict]:
+    def score_slot(self, start_time: datetime, staff_id: str) -> float:
+        """Pontua um slot por otimalidade"""
+        return self.ranker.score(start_time, staff_id)
+    
+    def rank_time_slots(self, slots: List[Dict], date: date) -> List[Dict]:
         """Classifica slots por otimalidade"""
         ranked_slots = []
         
         for slot in slots:
-            score = 0
-            
-            # Pontuação base
-            score += 50
-            
-            # Horários populares (10h-16h)
-            hour = int(slot["start_time"].split(":")[0])
-            if 10 <= hour <= 16:
-                score += 20
-            
-            # Início da semana (mais fácil de lembrar)
-            if date.weekday() in [0, 1, 2]:  # Segunda, terça, quarta
-                score += 10
-            
-            # Profissional mais eficiente
-            staff_id = slot["staff_id"]
-            if staff_id in self.staff:
-                efficiency = self.staff[staff_id].get("efficiency_rating", 0.8)
-                score += efficiency * 20
+            start_time = datetime.combine(date, datetime.strptime(slot["start_time"], "%H:%M").time())
             
             # Adicionar pontuação ao slot
-            slot["score"] = score
+            slot["score"] = self.score_slot(start_time, slot["staff_id"])
             slot["date"] = date.strftime("%Y-%m-%d")
             slot["day_name"] = date.strftime("%A")
             
@@ -509,39 +701,38 @@ class SmartScheduler:
             logger.error(f"❌ Erro ao buscar agenda diária: {e}")
             return {}
     
+    def _index_booking(self, booking_data: Dict):
+        """Registra o período ocupado quando o profissional é conhecido"""
+        staff_id = self._resolve_staff_id(booking_data.get('staff_member'))
+        start_time = booking_data.get('scheduled_datetime')
+        if isinstance(start_time, str):
+            start_time = datetime.fromisoformat(start_time)
+        
+        if staff_id and isinstance(start_time, datetime):
+            end_time = start_time + timedelta(minutes=booking_data.get('duration', self.slot_duration))
+            self.availability_index.add_busy(staff_id, start_time, end_time)
+    
     async def _save_booking(self, booking_data: Dict) -> bool:
-        """Salva agendamento no sistema (simulado)"""
+        """Salva agendamento no journal append-only"""
         try:
-            # Simular salvamento em banco de dados
             booking_id = booking_data.get('booking_id')
             
-            # Adicionar ao cache local
-            if not hasattr(self, 'bookings_cache'):
-                self.bookings_cache = {}
-            
+            # Adicionar ao cache local e ao índice de ocupação
             self.bookings_cache[booking_id] = booking_data
+            self._index_booking(booking_data)
             
-            # Simular salvamento em arquivo
-            from pathlib import Path
-            bookings_file = Path('bookings_data.json')
-            if bookings_file.exists():
-                with open(bookings_file, 'r', encoding='utf-8') as f:
-                    bookings = json.load(f)
-            else:
-                bookings = {}
-            
-            bookings[booking_id] = {
+            record = {
                 **booking_data,
                 'scheduled_datetime': booking_data['scheduled_datetime'].isoformat() if isinstance(booking_data['scheduled_datetime'], datetime) else booking_data['scheduled_datetime'],
                 'created_at': booking_data['created_at'].isoformat() if isinstance(booking_data['created_at'], datetime) else booking_data['created_at']
             }
             
-            with open(bookings_file, 'w', encoding='utf-8') as f:
-                json.dump(bookings, f, indent=2, ensure_ascii=False)
+            # Acrescentar uma linha ao journal sem bloquear o event loop
+            await asyncio.to_thread(self.booking_journal.put, booking_id, record)
             
             logger.info(f"✅ Agendamento salvo: {booking_id}")
             return True
             
         except Exception as e:
             logger.error(f"❌ Erro ao salvar agendamento: {e}")
-            return False
\ No newline at end of file
+            return False
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+🏆 SLOT RANKING
+Pontuação configurável e seleção top-k de horários
+"""
+
+import heapq
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import count
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class ScoringWeights:
+    base_score: float = 50
+    peak_hour_start: int = 10
+    peak_hour_end: int = 16
+    peak_hour_bonus: float = 20
+    preferred_weekdays: Tuple[int, ...] = (0, 1, 2)  # Segunda, terça, quarta
+    weekday_bonus: float = 10
+    efficiency_weight: float = 20
+    default_efficiency: float = 0.8
+
+
+class SlotRanker:
+    """Pontua slots e seleciona os k melhores sem materializar todos os candidatos"""
+
+    def __init__(self, staff: Dict[str, Dict] = None, weights: ScoringWeights = None,
+                 scorer: Optional[Callable[[datetime, str], float]] = None):
+        self.staff = staff if staff is not None else {}
+        self.weights = weights or ScoringWeights()
+        self.scorer = scorer
+
+    def score(self, start_time: datetime, staff_id: str) -> float:
+        """Pontua um slot pelo horário e pelo profissional"""
+        if self.scorer:
+            return self.scorer(start_time, staff_id)
+
+        weights = self.weights
+        score = weights.base_score
+
+        # Horários populares
+        if weights.peak_hour_start <= start_time.hour <= weights.peak_hour_end:
+            score += weights.peak_hour_bonus
+
+        # Dias preferidos (mais fáceis de lembrar)
+        if start_time.weekday() in weights.preferred_weekdays:
+            score += weights.weekday_bonus
+
+        # Profissional mais eficiente
+        staff_info = self.staff.get(staff_id)
+        if staff_info is not None:
+            efficiency = staff_info.get("efficiency_rating", weights.default_efficiency)
+            score += efficiency * weights.efficiency_weight
+
+        return score
+
+    @staticmethod
+    def top_k(items: Iterable[T], k: int, key: Callable[[T], float]) -> List[T]:
+        """Retorna os k itens de maior pontuação, em ordem decrescente.
+
+        Mantém um min-heap de tamanho k enquanto consome o iterável; em caso de
+        empate vence o item que chegou primeiro, como em um sort estável.
+        """
+        if k <= 0:
+            return []
+
+        heap = []
+        sequence = count()
+        for item in items:
+            entry = (key(item), -next(sequence), item)
+            if len(heap) < k:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+
+        heap.sort(key=lambda entry: entry[:2], reverse=True)
+        return [entry[2] for entry in heap]
+
+    @staticmethod
+    def earliest(items: Iterable[T], k: int, key: Callable[[T], object]) -> List[T]:
+        """Retorna os k primeiros itens segundo a chave, em ordem crescente"""
+        return heapq.nsmallest(k, items, key=key)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+🗃️ SQLITE LOCAL STORE
+Armazenamento local em SQLite (WAL) para o Database Manager
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple
+from loguru import logger
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS appointments (
+    id TEXT PRIMARY KEY,
+    client_phone TEXT,
+    scheduled_date TEXT,
+    staff_id TEXT,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_phone ON appointments (client_phone);
+CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments (scheduled_date);
+CREATE INDEX IF NOT EXISTS idx_appointments_staff ON appointments (staff_id, scheduled_date);
+CREATE INDEX IF NOT EXISTS idx_appointments_status ON appointments (status);
+
+CREATE TABLE IF NOT EXISTS clients (
+    id TEXT PRIMARY KEY,
+    phone TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_clients_phone ON clients (phone);
+
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    phone TEXT,
+    timestamp TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_conversations_phone ON conversations (phone);
+
+CREATE TABLE IF NOT EXISTS analytics (
+    id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+"""
+
+
+class SlotConflict(Exception):
+    """O profissional já tem agendamento ativo que se sobrepõe ao novo"""
+
+
+class SQLiteLocalStore:
+    """Tabelas do fallback local com colunas indexadas e o registro completo em JSON.
+
+    Os métodos são síncronos; o DatabaseManager os executa via
+    asyncio.to_thread para não bloquear o event loop.
+    """
+
+    def __init__(self, db_path: str = 'ai_agent_data.db'):
+        self.db_path = db_path
+        self.conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+
+    def open(self) -> sqlite3.Connection:
+        """Abre o banco (se necessário), ativa WAL e cria o schema"""
+        with self._lock:
+            if self.conn is None:
+                self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self.conn.execute("PRAGMA journal_mode=WAL")
+                self.conn.execute("PRAGMA synchronous=NORMAL")
+                self.conn.executescript(SCHEMA)
+                self.conn.commit()
+            return self.conn
+
+    def close(self):
+        """Fecha a conexão"""
+        with self._lock:
+            if self.conn:
+                self.conn.close()
+                self.conn = None
+
+    def exists(self) -> bool:
+        return os.path.exists(self.db_path)
+
+    def import_legacy_json(self, json_path: str) -> int:
+        """Migra o antigo ai_agent_data.json se o banco ainda estiver vazio"""
+        if not os.path.exists(json_path):
+            return 0
+
+        with self._lock:
+            has_data = self.open().execute(
+                "SELECT EXISTS (SELECT 1 FROM appointments) OR EXISTS (SELECT 1 FROM conversations)"
+            ).fetchone()[0]
+        if has_data:
+            return 0
+
+        with open(json_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
+
+        with self._lock, self.open():
+            for appointment in legacy.get('appointments', []):
+                self._upsert_appointment(appointment)
+            for client in legacy.get('clients', []):
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO clients (id, phone, data) VALUES (?, ?, ?)",
+                    (client.get('id') or client.get('phone'), client.get('phone'), _dumps(client))
+                )
+            for conversation in legacy.get('conversations', []):
+                self._insert_conversation(conversation)
+            for i, entry in enumerate(legacy.get('analytics', [])):
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO analytics (id, data) VALUES (?, ?)",
+                    (str(entry.get('id', i)), _dumps(entry))
+                )
+
+        imported = len(legacy.get('appointments', [])) + len(legacy.get('conversations', []))
+        if imported:
+            logger.info(f"✅ {imported} registros migrados de {json_path}")
+        return imported
+
+    # Agendamentos
+
+    def insert_appointment(self, appointment: Dict):
+        """Insere o agendamento; levanta SlotConflict se o horário do profissional
+        já estiver ocupado. Checagem e inserção rodam na mesma transação de
+        escrita (BEGIN IMMEDIATE), então valem também entre processos."""
+        with self._lock, self.open():
+            self.conn.execute("BEGIN IMMEDIATE")
+            conflict = self._find_conflict(appointment)
+            if conflict is not None:
+                raise SlotConflict(
+                    f"{appointment.get('staff_id')} já ocupado em {appointment.get('scheduled_date')} "
+                    f"{appointment.get('scheduled_time')} ({conflict['id']})"
+                )
+            self._upsert_appointment(appointment)
+
+    def get_appointment(self, appointment_id: str) -> Optional[Dict]:
+        rows = self._query("SELECT data FROM appointments WHERE id = ?", (appointment_id,))
+        return rows[0] if rows else None
+
+    def update_appointment(self, appointment_id: str, updates: Dict) -> Optional[Dict]:
+        """Aplica updates e retorna o registro atualizado (None se não existir)"""
+        with self._lock, self.open():
+            row = self.conn.execute(
+                "SELECT data FROM appointments WHERE id = ?", (appointment_id,)
+            ).fetchone()
+            if not row:
+                return None
+
+            appointment = json.loads(row[0])
+            appointment.update(updates)
+            self._upsert_appointment(appointment)
+            return appointment
+
+    def all_appointments(self) -> List[Dict]:
+        return self._query("SELECT data FROM appointments ORDER BY rowid")
+
+    def appointments_by_date(self, date: str, staff_id: str = None) -> List[Dict]:
+        if staff_id:
+            return self._query(
+                "SELECT data FROM appointments WHERE staff_id = ? AND scheduled_date = ? ORDER BY rowid",
+                (staff_id, date)
+            )
+        return self._query(
+            "SELECT data FROM appointments WHERE scheduled_date = ? ORDER BY rowid", (date,)
+        )
+
+    def appointments_by_phone(self, phone: str) -> List[Dict]:
+        return self._query(
+            "SELECT data FROM appointments WHERE client_phone = ? ORDER BY rowid", (phone,)
+        )
+
+    def appointments_between(self, start_date: str, end_date: str) -> List[Dict]:
+        return self._query(
+            "SELECT data FROM appointments WHERE scheduled_date BETWEEN ? AND ? ORDER BY rowid",
+            (start_date, end_date)
+        )
+
+    # Conversas
+
+    def insert_conversation(self, conversation: Dict):
+        with self._lock, self.open():
+            self._insert_conversation(conversation)
+
+    def conversations_by_phone(self, phone: str) -> List[Dict]:
+        return self._query(
+            "SELECT data FROM conversations WHERE phone = ? ORDER BY rowid", (phone,)
+        )
+
+    def count_conversations(self, phone: str) -> int:
+        with self._lock:
+            return self.open().execute(
+                "SELECT COUNT(*) FROM conversations WHERE phone = ?", (phone,)
+            ).fetchone()[0]
+
+    def conversation_counts(self) -> Dict[str, int]:
+        """Quantidade de conversas por telefone"""
+        with self._lock:
+            rows = self.open().execute(
+                "SELECT phone, COUNT(*) FROM conversations GROUP BY phone"
+            ).fetchall()
+        return {phone: count for phone, count in rows}
+
+    def _upsert_appointment(self, appointment: Dict):
+        self.conn.execute(
+            "INSERT INTO appointments (id, client_phone, scheduled_date, staff_id, status, data) "
+            "VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET client_phone = excluded.client_phone, "
+            "scheduled_date = excluded.scheduled_date, staff_id = excluded.staff_id, "
+            "status = excluded.status, data = excluded.data",
+            (
+                appointment['id'],
+                appointment.get('client_phone'),
+                appointment.get('scheduled_date'),
+                appointment.get('staff_id'),
+                appointment.get('status'),
+                _dumps(appointment)
+            )
+        )
+
+    def _find_conflict(self, appointment: Dict) -> Optional[Dict]:
+        """Agendamento ativo do mesmo profissional e dia que se sobrepõe a este"""
+        interval = _interval(appointment)
+        if interval is None or appointment.get('status') == 'cancelled':
+            return None
+
+        rows = self.conn.execute(
+            "SELECT data FROM appointments WHERE staff_id = ? AND scheduled_date = ? "
+            "AND COALESCE(status, '') != 'cancelled' AND id != ?",
+            (appointment.get('staff_id'), appointment.get('scheduled_date'), appointment['id'])
+        ).fetchall()
+        for (data,) in rows:
+            other = json.loads(data)
+            other_interval = _interval(other)
+            if other_interval and other_interval[0] < interval[1] and interval[0] < other_interval[1]:
+                return other
+        return None
+
+    def _insert_conversation(self, conversation: Dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO conversations (id, phone, timestamp, data) VALUES (?, ?, ?, ?)",
+            (conversation['id'], conversation.get('phone'), conversation.get('timestamp'), _dumps(conversation))
+        )
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict]:
+        with self._lock:
+            rows = self.open().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+
+def _interval(appointment: Dict) -> Optional[Tuple[int, int]]:
+    """[início, fim) do agendamento em minutos do dia"""
+    try:
+        hours, minutes = str(appointment['scheduled_time']).split(':')[:2]
+        start = int(hours) * 60 + int(minutes)
+        return start, start + int(appointment.get('duration_minutes') or 60)
+    except (KeyError, ValueError):
+        return None
+
+
+def _dumps(record: Dict) -> str:
+    return json.dumps(record, ensure_ascii=False)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+🗓️ TASK SCHEDULER
+Agendador asyncio nativo com gatilhos cron/intervalo, jitter e catch-up
+"""
+
+import asyncio
+import heapq
+import json
+import random
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from itertools import count
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from loguru import logger
+
+from journal import atomic_write_json
+
+
+class IntervalTrigger:
+    """Dispara a cada `seconds` segundos"""
+
+    def __init__(self, seconds: float):
+        self.interval = timedelta(seconds=seconds)
+
+    def next_after(self, moment: datetime) -> datetime:
+        return moment + self.interval
+
+    def __repr__(self) -> str:
+        return f"every {self.interval.total_seconds():g}s"
+
+
+class CronTrigger:
+    """Expressão cron de 5 campos: minuto hora dia-do-mês mês dia-da-semana.
+
+    Aceita `*`, números, listas (`1,15`), faixas (`1-5`) e passos (`*/10`).
+    Dia da semana segue o cron: 0 (ou 7) é domingo.
+    """
+
+    FIELDS = (("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7))
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Expressão cron inválida: {expression!r}")
+
+        self.expression = expression
+        values = [self._parse(part, low, high) for part, (_, low, high) in zip(parts, self.FIELDS)]
+        self.minutes, self.hours, self.days, self.months, weekdays = values
+        self.weekdays = {0 if day == 7 else day for day in weekdays}
+
+        # Como no cron: com dia e dia-da-semana restritos, basta um casar
+        self._any_day = parts[2] == "*"
+        self._any_weekday = parts[4] == "*"
+        self._sorted_hours = sorted(self.hours)
+        self._sorted_minutes = sorted(self.minutes)
+
+    def next_after(self, moment: datetime) -> datetime:
+        start = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+
+        for day_offset in range(366 * 5):
+            day = (start + timedelta(days=day_offset)).date()
+            if not self._matches_day(day):
+                continue
+
+            for hour in self._sorted_hours:
+                for minute in self._sorted_minutes:
+                    candidate = datetime(day.year, day.month, day.day, hour, minute)
+                    if candidate >= start:
+                        return candidate
+
+        raise ValueError(f"Expressão cron sem próxima execução: {self.expression!r}")
+
+    def _matches_day(self, day) -> bool:
+        if day.month not in self.months:
+            return False
+
+        day_ok = day.day in self.days
+        weekday_ok = (day.weekday() + 1) % 7 in self.weekdays
+
+        if self._any_day:
+            return weekday_ok
+        if self._any_weekday:
+            return day_ok
+        return day_ok or weekday_ok
+
+    @staticmethod
+    def _parse(part: str, low: int, high: int) -> Set[int]:
+        values = set()
+        for item in part.split(","):
+            step = 1
+            if "/" in item:
+                item, step_text = item.split("/")
+                step = int(step_text)
+
+            if item == "*":
+                start, end = low, high
+            elif "-" in item:
+                start_text, end_text = item.split("-")
+                start, end = int(start_text), int(end_text)
+            else:
+                start = int(item)
+                end = high if step > 1 else start
+
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"Campo cron fora do intervalo: {part!r}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def __repr__(self) -> str:
+        return f"cron '{self.expression}'"
+
+
+@dataclass
+class ScheduledJob:
+    name: str
+    func: Callable[[], Awaitable]
+    trigger: object
+    jitter: float = 0.0
+    catch_up: Optional[float] = None
+    next_run: Optional[datetime] = None
+    last_run: Optional[datetime] = None
+    running: bool = False
+
+    runs: int = 0
+    failures: int = 0
+    skipped: int = 0
+    caught_up: int = 0
+    last_duration: float = 0.0
+    total_duration: float = 0.0
+    last_lag: float = 0.0
+    max_lag: float = 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            "trigger": repr(self.trigger),
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "caught_up": self.caught_up,
+            "last_duration_ms": round(self.last_duration * 1000, 2),
+            "avg_duration_ms": round(self.total_duration / self.runs * 1000, 2) if self.runs else 0,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2)
+        }
+
+
+class AsyncTaskScheduler:
+    """Executa corrotinas periódicas no event loop, sem polling.
+
+    Os jobs ficam em um heap ordenado pela próxima execução e o loop dorme
+    até o primeiro vencer. Cada execução roda em sua própria task (um job
+    lento não atrasa os demais) e nunca se sobrepõe à anterior do mesmo
+    job. O horário da última execução é persistido para que, ao reiniciar,
+    uma execução perdida dentro da janela de `catch_up` seja feita na hora.
+    """
+
+    def __init__(self, state_path: str = 'scheduler_state.json'):
+        self.state_path = Path(state_path)
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._heap: List[Tuple[datetime, int, str]] = []
+        self._seq = count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running_tasks: Set[asyncio.Task] = set()
+
+    def add_cron_job(self, name: str, func: Callable[[], Awaitable], expression: str,
+                     jitter: float = 0.0, catch_up: Optional[float] = None) -> ScheduledJob:
+        """Agenda `func` conforme uma expressão cron (ex.: '0 9 * * *')"""
+        return self.add_job(name, func, CronTrigger(expression), jitter, catch_up)
+
+    def add_interval_job(self, name: str, func: Callable[[], Awaitable], seconds: float,
+                         jitter: float = 0.0) -> ScheduledJob:
+        """Agenda `func` a cada `seconds` segundos"""
+        return self.add_job(name, func, IntervalTrigger(seconds), jitter)
+
+    def add_job(self, name: str, func: Callable[[], Awaitable], trigger,
+                jitter: float = 0.0, catch_up: Optional[float] = None) -> ScheduledJob:
+        job = ScheduledJob(name=name, func=func, trigger=trigger, jitter=jitter, catch_up=catch_up)
+        self.jobs[name] = job
+        if self._task:
+            self._schedule_next(job, datetime.now())
+        return job
+
+    async def start(self):
+        """Carrega o estado, faz o catch-up e inicia o loop"""
+        if self._task:
+            return
+
+        self._wakeup = asyncio.Event()
+        state = await asyncio.to_thread(self._load_state)
+        now = datetime.now()
+
+        for job in self.jobs.values():
+            last_run = state.get(job.name)
+            job.last_run = datetime.fromisoformat(last_run) if last_run else None
+
+            if self._missed_run(job, now):
+                job.caught_up += 1
+                logger.info(f"⏪ Execução perdida de '{job.name}' será feita agora")
+                self._push(job, now)
+            else:
+                self._schedule_next(job, now)
+
+        self._task = asyncio.create_task(self._run(), name="task-scheduler")
+        logger.info(f"✅ Agendador iniciado com {len(self.jobs)} tarefas")
+
+    async def stop(self):
+        """Encerra o loop e cancela execuções em andamento"""
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        for task in list(self._running_tasks):
+            task.cancel()
+        await asyncio.gather(*self._running_tasks, return_exceptions=True)
+        await asyncio.to_thread(self._save_state)
+
+    async def run_job(self, name: str):
+        """Executa um job imediatamente, fora do agendamento"""
+        await self._execute(self.jobs[name], datetime.now())
+
+    def get_stats(self) -> Dict:
+        """Métricas de execução e latência por job"""
+        return {name: job.to_dict() for name, job in self.jobs.items()}
+
+    def _missed_run(self, job: ScheduledJob, now: datetime) -> bool:
+        if job.catch_up is None or job.last_run is None:
+            return False
+
+        expected = job.trigger.next_after(job.last_run)
+        return expected <= now and (now - expected).total_seconds() <= job.catch_up
+
+    def _schedule_next(self, job: ScheduledJob, after: datetime):
+        self._push(job, job.trigger.next_after(after))
+
+    def _push(self, job: ScheduledJob, when: datetime):
+        job.next_run = when
+        heapq.heappush(self._heap, (when, next(self._seq), job.name))
+        if self._wakeup:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = datetime.now()
+
+            while self._heap and self._heap[0][0] <= now:
+                scheduled, _, name = heapq.heappop(self._heap)
+                job = self.jobs.get(name)
+                if job is None or job.next_run != scheduled:
+                    continue
+
+                # Próxima execução calculada a partir de agora: atrasos longos
+                # (suspensão, loop travado) geram uma só execução, não uma rajada
+                self._schedule_next(job, max(scheduled, now))
+                self._launch(job, scheduled)
+
+            timeout = None
+            if self._heap:
+                timeout = max(0.0, (self._heap[0][0] - datetime.now()).total_seconds())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _launch(self, job: ScheduledJob, scheduled: datetime):
+        if job.running:
+            job.skipped += 1
+            logger.warning(f"⚠️ '{job.name}' ainda em execução; disparo de {scheduled:%H:%M} ignorado")
+            return
+
+        task = asyncio.create_task(self._execute(job, scheduled, jitter=job.jitter))
+        self._running_tasks.add(task)
+        task.add_done_callback(self._running_tasks.discard)
+
+    async def _execute(self, job: ScheduledJob, scheduled: datetime, jitter: float = 0.0):
+        job.running = True
+        try:
+            if jitter:
+                await asyncio.sleep(random.uniform(0, jitter))
+
+            job.last_lag = max(0.0, (datetime.now() - scheduled).total_seconds())
+            job.max_lag = max(job.max_lag, job.last_lag)
+            job.last_run = datetime.now()
+
+            started = time.monotonic()
+            try:
+                await job.func()
+            except Exception as e:
+                job.failures += 1
+                logger.error(f"❌ Erro na tarefa agendada '{job.name}': {e}")
+            finally:
+                job.last_duration = time.monotonic() - started
+                job.total_duration += job.last_duration
+                job.runs += 1
+
+            try:
+                await asyncio.to_thread(self._save_state)
+            except Exception as e:
+                logger.warning(f"⚠️ Erro ao salvar estado do agendador: {e}")
+        finally:
+            job.running = False
+
+    def _load_state(self) -> Dict[str, str]:
+        if not self.state_path.exists():
+            return {}
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"⚠️ Estado do agendador ignorado: {e}")
+            return {}
+
+    def _save_state(self):
+        state = {
+            name: job.last_run.isoformat()
+            for name, job in self.jobs.items()
+            if job.last_run
+        }
+        atomic_write_json(self.state_path, state)
+
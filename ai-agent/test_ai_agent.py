@@ -50,6 +50,7 @@ class AIAgentTester:
             ('ai_engine', 'Engine de IA conversacional'),
             ('whatsapp_connector', 'Conector WhatsApp'),
             ('scheduler_engine', 'Engine de agendamento'),
+            ('availability_index', 'Índice de disponibilidade'),
             ('calendar_manager', 'Gerenciador Calendar'),
             ('database_manager', 'Gerenciador Database'),
             ('mock_data_integration', 'Serviço de dados mock')
@@ -107,6 +108,203 @@ class AIAgentTester:
         except Exception as e:
             self.log_test("AI Engine", False, f"Erro: {e}")
     
+    async def test_text_normalizer(self):
+        """Testa acentos, abreviações e o fluxo de tokens compartilhado"""
+        logger.info("🔡 Testando normalização de texto...")
+        
+        try:
+            from text_normalizer import normalize
+            from ai_engine import AIConversationEngine
+            
+            accented = normalize("Tem horário DISPONÍVEL pra Hidratação amanhã?")
+            plain = normalize("tem horario disponivel pra hidratacao amanha?")
+            abbreviated = normalize("vc tem hj? qto custa? q horas")
+            
+            success = (
+                accented.text == plain.text == "tem horario disponivel pra hidratacao amanha?" and
+                accented.tokens == ("tem", "horario", "disponivel", "pra", "hidratacao", "amanha") and
+                abbreviated.text == "voce tem hoje? quanto custa? que horas" and
+                normalize("quero qualquer horario").text == "quero qualquer horario"
+            )
+            self.log_test(
+                "Text Normalizer - Accents/Abbreviations",
+                success,
+                f"Normalizado: {abbreviated.text}"
+            )
+            
+            # Mesmo resultado (memorizado) para quem consome a mensagem
+            ai_engine = AIConversationEngine()
+            with_accents = ai_engine.analyze("Tem horário disponível pra hidratação amanhã?")
+            without_accents = ai_engine.analyze("tem horario disponivel pra hidratacao amanha?")
+            with_abbreviations = ai_engine.analyze("vc faz hidratacao hj? qto custa")
+            
+            success = (
+                normalize(accented.original) is accented and
+                with_accents.normalized == without_accents.normalized and
+                with_accents.intent == without_accents.intent and
+                with_accents.entities == without_accents.entities and
+                with_abbreviations.entities["services"] == ["hidratacao"] and
+                with_abbreviations.entities["dates"] == ["hoje"]
+            )
+            self.log_test(
+                "Text Normalizer - Shared Token Stream",
+                success,
+                f"Intent: {with_accents.intent}, entidades: {with_abbreviations.entities}"
+            )
+            
+        except Exception as e:
+            self.log_test("Text Normalizer", False, f"Erro: {e}")
+    
+    async def test_keyword_matcher(self):
+        """Testa o autômato Aho–Corasick e a seleção leftmost-longest"""
+        logger.info("🔤 Testando keyword matcher...")
+        
+        try:
+            from keyword_matcher import KeywordMatcher, leftmost_longest
+            
+            # Ocorrências sobrepostas com suas posições
+            matcher = KeywordMatcher()
+            matcher.add_many(["corte", "corte de cabelo", "cabelo", "de"], "service", "corte")
+            matches = matcher.find_all("corte de cabelo")
+            spans = sorted((m.start, m.end, m.keyword) for m in matches)
+            
+            success = (
+                spans == [(0, 5, "corte"), (0, 15, "corte de cabelo"), (6, 8, "de"), (9, 15, "cabelo")] and
+                [m.end for m in matches] == sorted(m.end for m in matches)
+            )
+            self.log_test(
+                "Keyword Matcher - Overlapping Matches",
+                success,
+                f"Ocorrências: {spans}"
+            )
+            
+            # Palavras curtas só casam como palavra inteira
+            matcher = KeywordMatcher()
+            matcher.add("oi", "intent", "SAUDACAO", whole_word=True)
+            matcher.add("pé", "service", "pedicure", whole_word=True)
+            
+            success = (
+                matcher.find_all("boa noite") == [] and
+                matcher.find_all("oi, boa noite")[0][:3] == (0, 2, "oi") and
+                matcher.find_all("tô com o pé inchado")[0][:3] == (9, 11, "pé") and
+                matcher.find_all("pédicure e pés") == [] and
+                len(matcher.find_all("oi oi")) == 2
+            )
+            self.log_test(
+                "Keyword Matcher - Whole Words",
+                success,
+                f"'oi' em 'boa noite': {matcher.find_all('boa noite')}"
+            )
+            
+            # leftmost_longest prefere a alternativa mais longa
+            matcher = KeywordMatcher()
+            matcher.add("amanhã", "date", "amanha")
+            matcher.add("depois de amanhã", "date", "depois_de_amanha")
+            matcher.add("hoje", "date", "hoje")
+            selected = leftmost_longest(matcher.find_all("hoje não, depois de amanhã"))
+            
+            success = [(m.start, m.label) for m in selected] == [(0, "hoje"), (10, "depois_de_amanha")]
+            self.log_test(
+                "Keyword Matcher - Leftmost Longest",
+                success,
+                f"Selecionadas: {[m.keyword for m in selected]}"
+            )
+            
+            # A mesma palavra em vários grupos gera uma ocorrência por grupo
+            matcher = KeywordMatcher()
+            matcher.add("corte", "service", "corte")
+            matcher.add("corte", "intent", "AGENDAR_SERVICO")
+            matcher.add("preço", "intent", "CONSULTAR_PRECO")
+            matches = matcher.find_all("quanto custa o corte")
+            
+            success = (
+                len(matcher) == 3 and
+                sorted((m.group, m.label) for m in matches) == [("intent", "AGENDAR_SERVICO"), ("service", "corte")] and
+                all((m.start, m.end) == (15, 20) for m in matches)
+            )
+            self.log_test(
+                "Keyword Matcher - Multiple Groups",
+                success,
+                f"Grupos: {[(m.group, m.label) for m in matches]}"
+            )
+            
+        except Exception as e:
+            self.log_test("Keyword Matcher", False, f"Erro: {e}")
+    
+    async def test_analysis_memo(self):
+        """Testa a memorização de analyze() por message_id"""
+        logger.info("🧠 Testando memo de análises...")
+        
+        try:
+            import ai_engine as ai_engine_module
+            from ai_engine import AIConversationEngine
+            
+            ai_engine = AIConversationEngine()
+            
+            first = ai_engine.analyze("Quero agendar um corte amanhã", "wamid.1")
+            scans = ai_engine.stage_counts["scan"]
+            again = ai_engine.analyze("Quero agendar um corte amanhã", "wamid.1")
+            changed = ai_engine.analyze("Qual o preço da escova?", "wamid.1")
+            ai_engine.analyze("Oi")
+            
+            success = (
+                again is first and
+                ai_engine.stage_counts["scan"] == scans + 2 and
+                changed is not first and changed.message == "Qual o preço da escova?" and
+                list(ai_engine._analysis_cache) == ["wamid.1"]
+            )
+            self.log_test(
+                "Analysis Memo - Message ID",
+                success,
+                f"Scans: {ai_engine.stage_counts['scan']}, intent: {first.intent}"
+            )
+            
+            # Cache limitado: o id menos recente sai primeiro
+            original_size = ai_engine_module.ANALYSIS_CACHE_SIZE
+            ai_engine_module.ANALYSIS_CACHE_SIZE = 2
+            try:
+                for i in range(2, 5):
+                    ai_engine.analyze("Oi", f"wamid.{i}")
+                ai_engine.analyze("Oi", "wamid.3")
+                ai_engine.analyze("Oi", "wamid.5")
+            finally:
+                ai_engine_module.ANALYSIS_CACHE_SIZE = original_size
+            
+            self.log_test(
+                "Analysis Memo - Bounded",
+                list(ai_engine._analysis_cache) == ["wamid.3", "wamid.5"],
+                f"Ids em cache: {list(ai_engine._analysis_cache)}"
+            )
+            
+        except Exception as e:
+            self.log_test("Analysis Memo", False, f"Erro: {e}")
+    
+    async def test_llm_cache(self):
+        """Testa cache e coalescência do fallback LLM com o modelo stub"""
+        logger.info("🧠 Testando cache de respostas do LLM...")
+        
+        try:
+            from llm_cache import CachedLLMClient, StubChatModel
+            
+            model = StubChatModel(latency=0.01)
+            llm = CachedLLMClient(model)
+            
+            # Chamadas idênticas simultâneas + variação de acento/caixa depois
+            replies = await asyncio.gather(*[
+                llm.complete("Qual o horário de funcionamento?", state="greeting") for _ in range(3)
+            ])
+            replies.append(await llm.complete("qual o HORARIO de funcionamento?", state="greeting"))
+            
+            success = model.calls == 1 and len(set(replies)) == 1
+            self.log_test(
+                "LLM Cache - Single-flight",
+                success,
+                f"Chamadas ao modelo: {model.calls}, Stats: {llm.get_stats()}"
+            )
+            
+        except Exception as e:
+            self.log_test("LLM Cache", False, f"Erro: {e}")
+    
     async def test_scheduler_engine(self):
         """Testa engine de agendamento"""
         logger.info("⚡ Testando Scheduler Engine...")
@@ -152,6 +350,143 @@ class AIAgentTester:
         except Exception as e:
             self.log_test("Scheduler Engine", False, f"Erro: {e}")
     
+    async def test_availability_index(self):
+        """Testa índice de intervalos ocupados"""
+        logger.info("🗂️ Testando Availability Index...")
+        
+        try:
+            from availability_index import AvailabilityIndex
+            
+            index = AvailabilityIndex()
+            day = datetime.now().replace(hour=8, minute=0, second=0, microsecond=0)
+            
+            index.add_busy("staff_1", day.replace(hour=10), day.replace(hour=11))
+            index.add_busy("staff_1", day.replace(hour=11), day.replace(hour=12))
+            
+            gaps = list(index.free_gaps("staff_1", day, day.replace(hour=18)))
+            success = gaps == [
+                (day, day.replace(hour=10)),
+                (day.replace(hour=12), day.replace(hour=18))
+            ]
+            self.log_test(
+                "Availability Index - Free Gaps",
+                success,
+                f"Janelas livres: {len(gaps)}"
+            )
+            
+            success = (
+                not index.is_free("staff_1", day.replace(hour=10, minute=30), day.replace(hour=11, minute=30)) and
+                index.is_free("staff_2", day.replace(hour=10), day.replace(hour=11))
+            )
+            self.log_test("Availability Index - Conflict Check", success)
+            
+            # Reservas sobrepostas: liberar uma não libera o tempo da outra
+            index.add_busy("staff_3", day.replace(hour=9), day.replace(hour=11))
+            index.add_busy("staff_3", day.replace(hour=10), day.replace(hour=12))
+            index.add_busy("staff_3", day.replace(hour=10), day.replace(hour=12))
+            index.remove_busy("staff_3", day.replace(hour=9), day.replace(hour=11))
+            index.remove_busy("staff_3", day.replace(hour=10), day.replace(hour=12))
+            still_held = list(index.free_gaps("staff_3", day, day.replace(hour=18)))
+            index.remove_busy("staff_3", day.replace(hour=10), day.replace(hour=12))
+            
+            success = (
+                still_held == [(day, day.replace(hour=10)), (day.replace(hour=12), day.replace(hour=18))] and
+                index.day("staff_3", day.date()) is None
+            )
+            self.log_test(
+                "Availability Index - Overlapping Release",
+                success,
+                f"Janelas livres após liberar: {len(still_held)}"
+            )
+            
+        except Exception as e:
+            self.log_test("Availability Index", False, f"Erro: {e}")
+    
+    async def test_occupancy_model(self):
+        """Testa a demanda simulada: duração inteira do serviço e cache limitado"""
+        logger.info("📊 Testando Occupancy Model...")
+        
+        try:
+            from occupancy_model import DemandOccupancyModel
+            
+            model = DemandOccupancyModel(seed="teste", max_cached_days=3)
+            day = datetime(2030, 1, 7, 8, 0)
+            step = timedelta(minutes=30)
+            
+            # Um período de 2h é ocupado se qualquer passo de 30min dentro dele for
+            starts = [day + i * step for i in range(16)]
+            expected = [
+                any(model.is_busy("staff_1", start + k * step, start + (k + 1) * step) for k in range(4))
+                for start in starts
+            ]
+            actual = [model.is_busy("staff_1", start, start + 4 * step) for start in starts]
+            self.log_test("Occupancy Model - Full Duration", actual == expected)
+            
+            for offset in range(10):
+                model.is_busy("staff_1", day + timedelta(days=offset), day + timedelta(days=offset, hours=1))
+            self.log_test(
+                "Occupancy Model - Bounded Cache",
+                len(model._cache) == 3,
+                f"Dias em cache: {len(model._cache)}"
+            )
+            
+            # A interface é abstrata: provedores precisam implementar is_busy
+            from occupancy_model import OccupancyProvider
+            
+            class Incomplete(OccupancyProvider):
+                pass
+            
+            rejected = []
+            for provider in (OccupancyProvider, Incomplete):
+                try:
+                    provider()
+                except TypeError:
+                    rejected.append(provider.__name__)
+            self.log_test(
+                "Occupancy Model - Abstract Provider",
+                rejected == ["OccupancyProvider", "Incomplete"],
+                f"Recusados: {rejected}"
+            )
+            
+        except Exception as e:
+            self.log_test("Occupancy Model", False, f"Erro: {e}")
+    
+    async def test_journal(self):
+        """Testa o journal: gravação antes do load não pode apagar o snapshot"""
+        logger.info("📒 Testando Append-only Journal...")
+        
+        try:
+            import tempfile
+            from journal import AppendOnlyJournal
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                journal_path = Path(tmp) / "journal.jsonl"
+                snapshot_path = Path(tmp) / "snapshot.json"
+                
+                journal = AppendOnlyJournal(journal_path, snapshot_path, compact_every=5)
+                journal.load()
+                for i in range(3):
+                    journal.put(f"old_{i}", {"n": i})
+                journal.compact()
+                journal.close()
+                
+                # Nova instância sem load(): a compactação deve manter os registros antigos
+                journal = AppendOnlyJournal(journal_path, snapshot_path, compact_every=5)
+                for i in range(5):
+                    journal.put(f"new_{i}", {"n": i})
+                journal.close()
+                
+                records = AppendOnlyJournal(journal_path, snapshot_path).load()
+                success = len(records) == 8 and "old_0" in records
+                self.log_test(
+                    "Journal - Put Before Load + Compaction",
+                    success,
+                    f"Registros após compactação: {len(records)}"
+                )
+            
+        except Exception as e:
+            self.log_test("Journal", False, f"Erro: {e}")
+    
     async def test_whatsapp_connector(self):
         """Testa conector WhatsApp"""
         logger.info("📱 Testando WhatsApp Connector...")
@@ -193,6 +528,877 @@ class AIAgentTester:
         except Exception as e:
             self.log_test("WhatsApp Connector", False, f"Erro: {e}")
     
+    async def test_whatsapp_stub_api(self):
+        """Testa o conector contra um stub local da Graph API"""
+        logger.info("🔌 Testando WhatsApp Connector com stub da Graph API...")
+        
+        try:
+            import httpx
+            from whatsapp_connector import WhatsAppConnector
+            
+            calls = []
+            
+            def graph_api_stub(request: httpx.Request) -> httpx.Response:
+                calls.append(request)
+                # Primeira chamada falha para exercitar o retry
+                if len(calls) == 1:
+                    return httpx.Response(503, json={"error": "unavailable"})
+                return httpx.Response(200, json={"messages": [{"id": "wamid.stub"}]})
+            
+            whatsapp = WhatsAppConnector(transport=httpx.MockTransport(graph_api_stub), backoff_base=0)
+            whatsapp.access_token = "stub-token"
+            whatsapp.phone_number_id = "123"
+            
+            result = await whatsapp.send_message("11987654321", "Mensagem de teste")
+            await whatsapp.close()
+            
+            success = result.get("message_id") == "wamid.stub" and len(calls) == 2
+            self.log_test(
+                "WhatsApp Stub API - Retry",
+                success,
+                f"Tentativas: {len(calls)}, ID: {result.get('message_id')}"
+            )
+            
+            # POST não é repetido quando a API pode já ter aceitado a mensagem
+            attempts = []
+            
+            def ambiguous_stub(request: httpx.Request) -> httpx.Response:
+                attempts.append(request)
+                if len(attempts) == 1:
+                    raise httpx.ReadTimeout("timeout", request=request)
+                return httpx.Response(500, json={"error": "internal"})
+            
+            whatsapp = WhatsAppConnector(transport=httpx.MockTransport(ambiguous_stub), backoff_base=0)
+            whatsapp.access_token = "stub-token"
+            whatsapp.phone_number_id = "123"
+            
+            first = await whatsapp.send_message("11987654321", "Mensagem de teste")
+            second = await whatsapp.send_message("11987654321", "Mensagem de teste")
+            await whatsapp.close()
+            
+            success = len(attempts) == 2 and not first["success"] and not second["success"]
+            self.log_test(
+                "WhatsApp Stub API - No Retry On Ambiguous POST",
+                success,
+                f"Requisições: {len(attempts)}"
+            )
+            
+        except Exception as e:
+            self.log_test("WhatsApp Stub API", False, f"Erro: {e}")
+    
+    async def test_message_templates(self):
+        """Testa templates pré-compilados, partial e render_batch"""
+        logger.info("🧩 Testando templates de mensagens...")
+        
+        try:
+            from message_templates import TemplateSet
+            
+            text = "Olá {client_name}! {promo_title}: {discount:.0f}% até {expiry_date}. {promo_title}!"
+            templates = TemplateSet(defaults={"client_name": "Cliente", "expiry_date": ""})
+            template = templates.add("promo", text, aliases={"client_name": "name"})
+            
+            shared = {"promo_title": "Sexta", "discount": 15.0, "expiry_date": "24/10"}
+            clients = [{"name": "Ana", "phone": "11911111111"}, {"phone": "11922222222"}]
+            batch = list(templates.render_batch("promo", ((c["phone"], c) for c in clients), **shared))
+            expected = [
+                (c["phone"], text.format(client_name=c.get("name", "Cliente"), **shared))
+                for c in clients
+            ]
+            
+            bound = template.partial(**shared)
+            self.log_test(
+                "Message Templates - Batch/Partial",
+                batch == expected and bound.fields == ("client_name",) and template.fields != bound.fields,
+                f"Campos após partial: {bound.fields}"
+            )
+            
+            # Campo sem valor: KeyError na renderização, ValueError na carga com `required`
+            try:
+                template.render({"name": "Ana"})
+                missing_ok = False
+            except KeyError:
+                missing_ok = True
+            try:
+                templates.add("strict", "{client_name} {codigo}", required=())
+                required_ok = False
+            except ValueError:
+                required_ok = True
+            
+            self.log_test(
+                "Message Templates - Missing Fields",
+                missing_ok and required_ok,
+                f"KeyError: {missing_ok}, ValueError: {required_ok}"
+            )
+            
+        except Exception as e:
+            self.log_test("Message Templates", False, f"Erro: {e}")
+    
+    async def test_webhook_batch(self):
+        """Testa a extração de um webhook com vários remetentes e status"""
+        logger.info("📨 Testando parse de webhook em lote...")
+        
+        try:
+            from whatsapp_connector import WhatsAppConnector
+            
+            def text(sender, message_id, timestamp, body):
+                return {"from": sender, "id": message_id, "timestamp": str(timestamp),
+                        "type": "text", "text": {"body": body}}
+            
+            payload = {"entry": [
+                {"changes": [{"value": {
+                    "contacts": [{"wa_id": "5511911111111", "profile": {"name": "Ana"}}],
+                    "messages": [
+                        text("5511911111111", "wamid.a2", 1700000020, "amanhã às 10h"),
+                        text("5511922222222", "wamid.b1", 1700000015, "oi"),
+                        text("5511911111111", "wamid.a1", 1700000010, "quero um corte")
+                    ],
+                    "statuses": [{"id": "wamid.out1", "status": "delivered", "recipient_id": "5511933333333",
+                                  "timestamp": "1700000005"}]
+                }}]},
+                {"changes": [{"value": {
+                    "messages": [{"from": "5511922222222", "id": "wamid.b2", "timestamp": "1700000030",
+                                  "type": "button", "button": {"text": "Confirmar", "payload": "CONFIRM"}}],
+                    "statuses": [{"id": "wamid.out2", "status": "failed", "recipient_id": "5511944444444",
+                                  "timestamp": "1700000006", "errors": [{"code": 131026}]}]
+                }}]}
+            ]}
+            
+            whatsapp = WhatsAppConnector()
+            batch = whatsapp.parse_webhook_batch(payload)
+            await whatsapp.close()
+            
+            messages = batch["messages"]
+            ana, bia = messages.get("5511911111111", []), messages.get("5511922222222", [])
+            success = (
+                set(messages) == {"5511911111111", "5511922222222"} and
+                [m["id"] for m in ana] == ["wamid.a1", "wamid.a2"] and
+                all(m.get("contact_name") == "Ana" for m in ana) and
+                [m["id"] for m in bia] == ["wamid.b1", "wamid.b2"] and
+                bia[1]["button_payload"] == "CONFIRM" and "contact_name" not in bia[0]
+            )
+            self.log_test(
+                "Webhook Batch - Messages",
+                success,
+                f"Remetentes: {len(messages)}, mensagens: {sum(len(m) for m in messages.values())}"
+            )
+            
+            statuses = batch["statuses"]
+            self.log_test(
+                "Webhook Batch - Statuses",
+                [s["status"] for s in statuses] == ["delivered", "failed"] and
+                statuses[1]["errors"] == [{"code": 131026}] and statuses[0]["errors"] == [],
+                f"Status: {[s['status'] for s in statuses]}"
+            )
+            
+        except Exception as e:
+            self.log_test("Webhook Batch", False, f"Erro: {e}")
+    
+    async def test_reminder_dispatcher(self):
+        """Testa o heap de lembretes (cancelamento e reagendamento)"""
+        logger.info("⏰ Testando dispatcher de lembretes...")
+        
+        try:
+            from reminder_dispatcher import ReminderDispatcher
+            
+            dispatcher = ReminderDispatcher()
+            base = datetime.now() + timedelta(hours=1)
+            
+            dispatcher.schedule("a", base + timedelta(minutes=10))
+            dispatcher.schedule("b", base + timedelta(minutes=20))
+            dispatcher.schedule("c", base + timedelta(minutes=30))
+            dispatcher.cancel("b")
+            dispatcher.schedule("c", base + timedelta(minutes=5))   # antecipado
+            dispatcher.schedule("a", base + timedelta(minutes=40))  # adiado
+            
+            first = dispatcher.pop_due((base + timedelta(minutes=25)).timestamp())
+            second = dispatcher.pop_due((base + timedelta(minutes=60)).timestamp())
+            
+            success = (
+                first == ["c"] and second == ["a"] and
+                len(dispatcher) == 0 and dispatcher.next_due() is None
+            )
+            self.log_test(
+                "Reminder Dispatcher - Cancel/Reschedule",
+                success,
+                f"Vencidos: {first} + {second}"
+            )
+            
+            # Loop real: um lembrete mais próximo acorda o dispatcher antes
+            fired = []
+            
+            async def on_due(keys):
+                fired.extend(keys)
+            
+            dispatcher.start(on_due)
+            dispatcher.schedule("later", datetime.now() + timedelta(seconds=0.3))
+            dispatcher.schedule("sooner", datetime.now() + timedelta(seconds=0.05))
+            dispatcher.schedule("cancelled", datetime.now() + timedelta(seconds=0.1))
+            dispatcher.cancel("cancelled")
+            await asyncio.sleep(0.5)
+            await dispatcher.stop()
+            
+            self.log_test(
+                "Reminder Dispatcher - Wakeup",
+                fired == ["sooner", "later"],
+                f"Disparados: {fired}"
+            )
+            
+        except Exception as e:
+            self.log_test("Reminder Dispatcher", False, f"Erro: {e}")
+    
+    async def test_outbound_queue(self):
+        """Testa a fila de envio com um conector stub"""
+        logger.info("📤 Testando fila de envio...")
+        
+        try:
+            import tempfile
+            import time
+            import httpx
+            from outbound_queue import OutboundQueue
+            
+            class StubConnector:
+                def __init__(self):
+                    self.sent = []
+                    self.calls = 0
+                
+                async def send_message(self, to_number, message, message_type="text"):
+                    self.calls += 1
+                    # Primeira chamada levanta erro de rede, como o httpx faria
+                    if self.calls == 1:
+                        raise httpx.ConnectError("connection refused")
+                    self.sent.append((to_number, time.monotonic()))
+                    return {"success": True}
+            
+            total, rate = 30, 20.0
+            connector = StubConnector()
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                queue = OutboundQueue(
+                    connector, workers=4, global_rate=rate, per_number_rate=100,
+                    retry_backoff=0.01,
+                    journal_path=str(Path(tmp) / "outbound.jsonl"),
+                    snapshot_path=str(Path(tmp) / "outbound.json")
+                )
+                await queue.start()
+                started = time.monotonic()
+                await queue.enqueue_many((f"119{i:08d}", "Mensagem de teste") for i in range(total))
+                
+                while len(connector.sent) < total and time.monotonic() - started < 5:
+                    await asyncio.sleep(0.01)
+                elapsed = time.monotonic() - started
+                await queue.stop(drain_timeout=1)
+                pending = queue.journal.load()
+            
+            # O bucket libera `rate` envios de imediato e depois 1 a cada 1/rate s
+            # (a falha inicial também consome uma ficha)
+            expected = (total + 1 - rate) / rate
+            success = (
+                len(connector.sent) == total and
+                queue.stats["retried"] == 1 and
+                queue.stats["failed"] == 0 and
+                not pending and
+                expected * 0.8 <= elapsed <= expected + 1.0
+            )
+            self.log_test(
+                "Outbound Queue Rate",
+                success,
+                f"Enviadas: {len(connector.sent)}, {elapsed:.2f}s (esperado ~{expected:.2f}s), retries: {queue.stats['retried']}"
+            )
+            
+            # Com o conector real: só 429/503 voltam para a fila
+            from whatsapp_connector import WhatsAppConnector
+            
+            requests_by_phone = {}
+            
+            def graph_api_stub(request: httpx.Request) -> httpx.Response:
+                phone = json.loads(request.content)["to"]
+                requests_by_phone[phone] = requests_by_phone.get(phone, 0) + 1
+                if phone == "11900000001":
+                    raise httpx.ReadTimeout("timeout", request=request)
+                if phone == "11900000002":
+                    return httpx.Response(400, json={"error": "invalid number"})
+                if phone == "11900000003" and requests_by_phone[phone] == 1:
+                    return httpx.Response(429, json={"error": "rate limit"})
+                return httpx.Response(200, json={"messages": [{"id": f"wamid.{phone}"}]})
+            
+            whatsapp = WhatsAppConnector(transport=httpx.MockTransport(graph_api_stub), max_retries=0)
+            whatsapp.access_token = "stub-token"
+            whatsapp.phone_number_id = "123"
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                queue = OutboundQueue(
+                    whatsapp, workers=2, global_rate=100, per_number_rate=100, retry_backoff=0.01,
+                    journal_path=str(Path(tmp) / "outbound.jsonl"),
+                    snapshot_path=str(Path(tmp) / "outbound.json")
+                )
+                await queue.start()
+                await queue.enqueue_many((f"1190000000{i}", "Promoção") for i in (1, 2, 3))
+                started = time.monotonic()
+                while queue.stats["sent"] + queue.stats["failed"] < 3 and time.monotonic() - started < 5:
+                    await asyncio.sleep(0.01)
+                await queue.stop(drain_timeout=1)
+                await whatsapp.close()
+            
+            success = (
+                requests_by_phone == {"11900000001": 1, "11900000002": 1, "11900000003": 2} and
+                queue.stats["sent"] == 1 and queue.stats["failed"] == 2 and queue.stats["retried"] == 1
+            )
+            self.log_test(
+                "Outbound Queue - Retry Only Safe Failures",
+                success,
+                f"Requisições: {requests_by_phone}, falhas: {queue.stats['failed']}"
+            )
+            
+        except Exception as e:
+            self.log_test("Outbound Queue", False, f"Erro: {e}")
+    
+    async def test_notification_jobs(self):
+        """Testa as tarefas periódicas de notificação"""
+        logger.info("🎂 Testando tarefas de aniversário...")
+        
+        try:
+            import tempfile
+            from notification_engine import NotificationEngine
+            from outbound_queue import OutboundQueue
+            from task_scheduler import AsyncTaskScheduler
+            
+            class StubDataService:
+                async def initialize(self):
+                    pass
+                
+                def get_clients(self):
+                    today = datetime.now()
+                    return [
+                        {"id": "1", "name": "Ana", "phone": "11911111111",
+                         "birthday": today.replace(year=1992).strftime('%Y-%m-%d')},
+                        {"id": "2", "name": "Bia", "phone": "11922222222",
+                         "birthday": (today + timedelta(days=1)).replace(year=1992).strftime('%Y-%m-%d')},
+                        {"id": "3", "name": "Caio", "phone": "11933333333"}
+                    ]
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                engine = NotificationEngine(data_service=StubDataService())
+                engine.outbound_queue = OutboundQueue(
+                    engine.whatsapp,
+                    journal_path=str(Path(tmp) / "outbound.jsonl"),
+                    snapshot_path=str(Path(tmp) / "outbound.json")
+                )
+                engine.task_scheduler = AsyncTaskScheduler(str(Path(tmp) / "scheduler_state.json"))
+                await engine.setup_scheduled_tasks()
+                await engine.task_scheduler.run_job("birthdays")
+                await engine.task_scheduler.stop()
+                
+                pending = list(engine.outbound_queue.journal.load().values())
+                await engine.outbound_queue.stop(drain_timeout=0)
+                await engine.whatsapp.close()
+            
+            success = (
+                engine.outbound_queue.stats["enqueued"] == 1 and
+                pending[0]["phone"] == "11911111111" and
+                "Ana" in pending[0]["message"]
+            )
+            self.log_test(
+                "Birthday Job",
+                success,
+                f"Enfileiradas: {engine.outbound_queue.stats['enqueued']}"
+            )
+            
+        except Exception as e:
+            self.log_test("Notification Jobs", False, f"Erro: {e}")
+    
+    async def test_booking_pipeline(self):
+        """Testa reserva, gravação e efeitos colaterais do agendamento"""
+        logger.info("📋 Testando pipeline de agendamento...")
+        
+        try:
+            import tempfile
+            from booking_pipeline import BookingPipeline, SideEffectOutbox, SlotUnavailable
+            from scheduler_engine import SmartScheduler
+            
+            class StubDatabase:
+                def __init__(self):
+                    self.appointments = {}
+                    self.fail_create = False
+                    self.failed_updates = 0
+                
+                async def create_appointment(self, **kwargs):
+                    if self.fail_create:
+                        raise RuntimeError("banco indisponível")
+                    appointment_id = f"apt_{len(self.appointments) + 1}"
+                    self.appointments[appointment_id] = {"id": appointment_id, "status": "confirmed", **kwargs}
+                    return appointment_id
+                
+                async def update_appointment(self, appointment_id, updates):
+                    # A primeira atualização falha depois que o evento já foi criado
+                    if self.failed_updates == 0:
+                        self.failed_updates += 1
+                        raise RuntimeError("timeout ao gravar")
+                    self.appointments[appointment_id].update(updates)
+                    return True
+                
+                async def get_upcoming_appointments(self, from_date):
+                    return [a for a in self.appointments.values() if a["scheduled_date"] >= from_date]
+                
+                async def get_appointment(self, appointment_id):
+                    return dict(self.appointments[appointment_id]) if appointment_id in self.appointments else None
+                
+                async def cancel_appointment(self, appointment_id, reason=None):
+                    self.appointments[appointment_id]["status"] = "cancelled"
+                    return True
+            
+            class StubCalendar:
+                def __init__(self):
+                    self.events = {}
+                
+                async def create_event(self, title, start_datetime, duration_minutes=60, event_id=None):
+                    self.events.setdefault(event_id, title)
+                    return {"success": True, "id": event_id}
+            
+            class StubNotifier:
+                def __init__(self):
+                    self.calls = {}
+                    # Respostas do conector por telefone (depois disso, sucesso)
+                    self.scripted = {
+                        "11944444444": [{"success": False, "retryable": False, "error": "timeout"}],
+                        "11955555555": [{"success": False, "retryable": True, "error": "429"}]
+                    }
+                
+                async def confirm_booking(self, booking_data):
+                    phone = booking_data["client_phone"]
+                    self.calls[phone] = self.calls.get(phone, 0) + 1
+                    scripted = self.scripted.get(phone)
+                    return scripted.pop(0) if scripted else {"success": True}
+            
+            # Próxima terça-feira (todas as profissionais trabalham)
+            day = datetime.now().date() + timedelta(days=1)
+            while day.weekday() != 1:
+                day += timedelta(days=1)
+            day = day.isoformat()
+            
+            db, calendar, notifier = StubDatabase(), StubCalendar(), StubNotifier()
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                def make_pipeline():
+                    outbox = SideEffectOutbox(
+                        workers=2, retry_backoff=0.01,
+                        journal_path=str(Path(tmp) / "outbox.jsonl"),
+                        snapshot_path=str(Path(tmp) / "outbox.json")
+                    )
+                    return BookingPipeline(SmartScheduler(), db, calendar, notifier, outbox)
+                
+                pipeline = make_pipeline()
+                await pipeline.start()
+                
+                booking = await pipeline.create("corte", day, "10:00", "Ana", "11911111111", "staff_1")
+                try:
+                    await pipeline.create("corte", day, "10:30", "Bia", "11922222222", "staff_1")
+                    overlap_rejected = False
+                except SlotUnavailable:
+                    overlap_rejected = True
+                
+                # Efeito da agenda repetido após falha no banco: um único evento
+                for _ in range(200):
+                    if pipeline.outbox.stats["completed"] >= 2:
+                        break
+                    await asyncio.sleep(0.01)
+                appointment = db.appointments[booking["booking_id"]]
+                replay_ok = (
+                    pipeline.outbox.stats["retried"] == 1 and
+                    len(calendar.events) == 1 and
+                    appointment.get("calendar_event_id") in calendar.events
+                )
+                
+                # Confirmação: falha ambígua não é repetida, 429 é
+                await pipeline.create("corte", day, "16:00", "Dani", "11944444444", "staff_1")
+                await pipeline.create("corte", day, "12:00", "Eva", "11955555555", "staff_1")
+                for _ in range(200):
+                    if pipeline.outbox.stats["completed"] + pipeline.outbox.stats["failed"] >= 6:
+                        break
+                    await asyncio.sleep(0.01)
+                confirmation_ok = (
+                    notifier.calls == {"11911111111": 1, "11944444444": 1, "11955555555": 2} and
+                    pipeline.outbox.stats["failed"] == 1
+                )
+                
+                # Falha ao gravar libera o horário
+                db.fail_create = True
+                try:
+                    await pipeline.create("corte", day, "14:00", "Caio", "11933333333", "staff_1")
+                except RuntimeError:
+                    pass
+                db.fail_create = False
+                released = pipeline.scheduler.reserve_slot("corte", day, "14:00", "staff_1") is not None
+                await pipeline.stop()
+                
+                # Após reiniciar, a reserva vem do banco
+                restarted = make_pipeline()
+                await restarted.start()
+                still_busy = restarted.scheduler.reserve_slot("corte", day, "10:00", "staff_1") is None
+                
+                # Cancelar libera o horário (e só uma vez)
+                cancelled = await restarted.cancel(booking["booking_id"], "cliente desistiu")
+                cancelled_twice = await restarted.cancel(booking["booking_id"])
+                freed = restarted.scheduler.reserve_slot("corte", day, "10:00", "staff_1") is not None
+                await restarted.stop()
+                
+                # Gravação concorrente de outro processo no mesmo SQLite
+                from sqlite_store import SQLiteLocalStore, SlotConflict
+                
+                appointment = {"staff_id": "staff_1", "scheduled_date": day, "status": "confirmed",
+                               "duration_minutes": 60}
+                worker_a = SQLiteLocalStore(str(Path(tmp) / "agenda.db"))
+                worker_b = SQLiteLocalStore(str(Path(tmp) / "agenda.db"))
+                worker_a.insert_appointment({**appointment, "id": "a", "scheduled_time": "10:00"})
+                try:
+                    worker_b.insert_appointment({**appointment, "id": "b", "scheduled_time": "10:30"})
+                    store_guard = False
+                except SlotConflict:
+                    store_guard = True
+                worker_b.insert_appointment({**appointment, "id": "c", "scheduled_time": "11:00"})
+                store_guard = store_guard and [a["id"] for a in worker_a.all_appointments()] == ["a", "c"]
+                worker_a.close()
+                worker_b.close()
+            
+            self.log_test(
+                "Booking Pipeline - Reserve",
+                overlap_rejected and still_busy,
+                f"Conflito recusado: {overlap_rejected}, reserva após reinício: {still_busy}"
+            )
+            self.log_test("Booking Pipeline - DB Failure", released, f"Horário liberado: {released}")
+            self.log_test(
+                "Booking Pipeline - Cancel",
+                cancelled and not cancelled_twice and freed,
+                f"Cancelado: {cancelled}, horário liberado: {freed}"
+            )
+            self.log_test("Booking Pipeline - Store Conflict", store_guard, f"Conflito recusado: {store_guard}")
+            self.log_test(
+                "Booking Pipeline - Side Effect Replay",
+                replay_ok,
+                f"Eventos: {len(calendar.events)}, retries: {pipeline.outbox.stats['retried']}"
+            )
+            self.log_test(
+                "Booking Pipeline - Confirmation Retry",
+                confirmation_ok,
+                f"Envios por telefone: {notifier.calls}"
+            )
+            
+            # create_booking usa o notificador injetado em vez de criar um engine por reserva
+            class ConfirmationRecorder:
+                def __init__(self):
+                    self.sent = []
+                
+                async def send_booking_confirmation(self, booking_data):
+                    self.sent.append(booking_data["booking_id"])
+                    return True
+            
+            recorder = ConfirmationRecorder()
+            preferred = datetime.fromisoformat(f"{day}T15:00")
+            notified = await SmartScheduler(notifier=recorder).create_booking(
+                "escova", "Cliente Notificada", "11966666666", preferred
+            )
+            silent = await SmartScheduler().create_booking(
+                "escova", "Cliente Silenciosa", "11977777777", preferred
+            )
+            
+            success = (
+                notified["success"] and silent["success"] and
+                recorder.sent == [notified["booking_id"]]
+            )
+            self.log_test(
+                "Booking Pipeline - Shared Notifier",
+                success,
+                f"Confirmações: {recorder.sent}"
+            )
+            
+        except Exception as e:
+            self.log_test("Booking Pipeline", False, f"Erro: {e}")
+    
+    async def test_message_lanes(self):
+        """Testa ordem por remetente e backpressure das lanes"""
+        logger.info("🛣️ Testando lanes de mensagens...")
+        
+        try:
+            from message_lanes import LaneRejected, MessageLanes
+            
+            handled = []
+            active = set()
+            overlaps = {"same_lane": 0, "max_parallel": 0}
+            
+            async def handler(lane, item):
+                if lane in active:
+                    overlaps["same_lane"] += 1
+                active.add(lane)
+                overlaps["max_parallel"] = max(overlaps["max_parallel"], len(active))
+                await asyncio.sleep(0.01)
+                handled.append((lane, item))
+                active.discard(lane)
+            
+            lanes = MessageLanes(handler, workers=4, max_pending=100, max_lane_depth=10)
+            await lanes.start()
+            for i in range(5):
+                for lane in ("A", "B", "C"):
+                    lanes.submit(lane, i)
+            await lanes.stop()
+            
+            in_order = all([item for l, item in handled if l == lane] == list(range(5)) for lane in "ABC")
+            self.log_test(
+                "Message Lanes - Ordering",
+                in_order and overlaps["same_lane"] == 0 and overlaps["max_parallel"] > 1 and len(handled) == 15,
+                f"Processadas: {len(handled)}, paralelismo máximo: {overlaps['max_parallel']}"
+            )
+            
+            # Backpressure: lane cheia -> 429, total cheio -> 503
+            gate = asyncio.Event()
+            
+            async def blocked(lane, item):
+                await gate.wait()
+            
+            lanes = MessageLanes(blocked, workers=2, max_pending=3, max_lane_depth=2)
+            await lanes.start()
+            codes = []
+            for lane in ("A", "A", "A", "B", "C"):
+                try:
+                    lanes.submit(lane, "msg")
+                    codes.append(200)
+                except LaneRejected as e:
+                    codes.append(e.status_code)
+            gate.set()
+            await lanes.stop()
+            
+            stats = lanes.get_stats()
+            self.log_test(
+                "Message Lanes - Backpressure",
+                codes == [200, 200, 429, 200, 503] and stats["processed"] == 3 and stats["pending"] == 0,
+                f"Respostas: {codes}"
+            )
+            
+        except Exception as e:
+            self.log_test("Message Lanes", False, f"Erro: {e}")
+    
+    async def test_message_dedup(self):
+        """Testa a deduplicação de webhooks reentregues"""
+        logger.info("🔁 Testando deduplicação de mensagens...")
+        
+        try:
+            from dedup import MessageDeduplicator
+            from message_lanes import MessageLanes
+            
+            dedup = MessageDeduplicator(ttl=60, max_entries=100)
+            processed = []
+            failing = {"wamid.2"}
+            gate = asyncio.Event()
+            
+            # Mesmo fluxo do webhook: mark ao concluir, release em caso de falha
+            async def handler(sender, messages):
+                await gate.wait()
+                try:
+                    for message in messages:
+                        if message["id"] in failing:
+                            failing.discard(message["id"])
+                            raise RuntimeError("falha no processamento")
+                        processed.append(message["id"])
+                        dedup.mark([message["id"]])
+                finally:
+                    dedup.release(message["id"] for message in messages)
+            
+            lanes = MessageLanes(handler, workers=2)
+            await lanes.start()
+            
+            def deliver(payload):
+                fresh = dedup.filter_new(payload)
+                if fresh:
+                    dedup.claim(message["id"] for message in fresh)
+                    lanes.submit("11911111111", fresh)
+                return len(fresh)
+            
+            payload = [{"id": "wamid.1"}, {"id": "wamid.2"}]
+            first = deliver(payload)
+            in_flight = deliver(payload)
+            gate.set()
+            await lanes.stop()
+            
+            # wamid.2 falhou: a reentrega processa só ele
+            await lanes.start()
+            retried = deliver(payload)
+            await lanes.stop()
+            late = deliver(payload)
+            
+            success = (
+                first == 2 and in_flight == 0 and retried == 1 and late == 0 and
+                processed == ["wamid.1", "wamid.2"]
+            )
+            self.log_test(
+                "Message Dedup - Redelivery",
+                success,
+                f"Aceitas: {first}/{in_flight}/{retried}/{late}, processadas: {processed}"
+            )
+            
+        except Exception as e:
+            self.log_test("Message Dedup", False, f"Erro: {e}")
+    
+    async def test_conversation_store(self):
+        """Testa expiração, LRU e snapshot das sessões e o backend Redis"""
+        logger.info("💬 Testando conversation store...")
+        
+        try:
+            import tempfile
+            import time
+            from pydantic import BaseModel
+            from conversation_store import MemoryConversationStore, RedisConversationStore, FakeRedis
+            
+            class Session(BaseModel):
+                phone_number: str
+                state: str = "initial"
+            
+            # Sessões ociosas expiram tanto no get quanto na varredura
+            store = MemoryConversationStore(Session, idle_ttl=60, snapshot_path=None)
+            for phone in ("5511900000001", "5511900000002", "5511900000003"):
+                await store.set(phone, Session(phone_number=phone))
+            
+            stale = time.time() - 120
+            for phone in ("5511900000001", "5511900000002"):
+                store._sessions[phone] = (stale, store._sessions[phone][1])
+            
+            expired_on_get = await store.get("5511900000001")
+            swept = await store.sweep()
+            
+            success = (
+                expired_on_get is None and
+                swept == 1 and
+                await store.count() == 1 and
+                (await store.get("5511900000003")).phone_number == "5511900000003" and
+                store.stats["expired"] == 2
+            )
+            self.log_test(
+                "Conversation Store - Idle Expiry",
+                success,
+                f"Varridas: {swept}, stats: {store.stats}"
+            )
+            
+            # Acima de max_sessions sai a menos recentemente usada
+            store = MemoryConversationStore(Session, max_sessions=2, snapshot_path=None)
+            await store.set("a", Session(phone_number="a"))
+            await store.set("b", Session(phone_number="b"))
+            await store.get("a")
+            await store.set("c", Session(phone_number="c"))
+            
+            success = (
+                await store.get("b") is None and
+                await store.get("a") is not None and
+                await store.get("c") is not None and
+                store.stats["evicted"] == 1
+            )
+            self.log_test(
+                "Conversation Store - LRU Eviction",
+                success,
+                f"Sessões: {list(store._sessions)}"
+            )
+            
+            # O snapshot volta sem as sessões que expiraram enquanto parado
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                snapshot_path = Path(tmp_dir) / "conversations.json"
+                store = MemoryConversationStore(Session, idle_ttl=60, snapshot_path=str(snapshot_path))
+                await store.set("fresh", Session(phone_number="fresh", state="collecting_info"))
+                await store.set("stale", Session(phone_number="stale"))
+                store._sessions["stale"] = (time.time() - 120, store._sessions["stale"][1])
+                await store.snapshot()
+                
+                restored = MemoryConversationStore(Session, idle_ttl=60, snapshot_path=str(snapshot_path))
+                await restored.restore()
+                fresh = await restored.get("fresh")
+                
+                success = (
+                    snapshot_path.exists() and
+                    await restored.count() == 1 and
+                    fresh is not None and fresh.state == "collecting_info"
+                )
+            self.log_test(
+                "Conversation Store - Snapshot/Restore",
+                success,
+                f"Restauradas: {await restored.count()}"
+            )
+            
+            # Backend Redis sobre o FakeRedis: TTL renovado a cada acesso
+            client = FakeRedis()
+            store = RedisConversationStore(client, Session, idle_ttl=60)
+            await store.start()
+            await store.set("5511900000001", Session(phone_number="5511900000001", state="confirming"))
+            await store.set("5511900000002", Session(phone_number="5511900000002"))
+            client._data["conversation:5511900000002"] = (time.time() - 1, client._data["conversation:5511900000002"][1])
+            
+            client._data["conversation:5511900000001"] = (time.time() + 5, client._data["conversation:5511900000001"][1])
+            loaded = await store.get("5511900000001")
+            renewed = client._data["conversation:5511900000001"][0] > time.time() + 30
+            count = await store.count()
+            values = await store.values()
+            await store.delete("5511900000001")
+            
+            success = (
+                loaded is not None and loaded.state == "confirming" and
+                renewed and
+                await store.get("5511900000002") is None and
+                count == 1 and
+                [value.phone_number for value in values] == ["5511900000001"] and
+                await store.count() == 0
+            )
+            await store.stop()
+            self.log_test(
+                "Conversation Store - Redis Backend",
+                success,
+                f"Sessões: {count}, valores: {[value.phone_number for value in values]}"
+            )
+            
+        except Exception as e:
+            self.log_test("Conversation Store", False, f"Erro: {e}")
+    
+    async def test_calendar_sync(self):
+        """Testa o sync incremental do cache do calendário"""
+        logger.info("🗓️ Testando sync do calendário...")
+        
+        try:
+            from calendar_cache import CalendarEventCache, FakeCalendarService, IncrementalCalendarSync
+            
+            service = FakeCalendarService()
+            now = datetime.now()
+            
+            def add_event(start):
+                end = start + timedelta(hours=1)
+                return service.events().insert(calendarId="primary", body={
+                    "summary": "Corte",
+                    "start": {"dateTime": start.isoformat() + "-03:00"},
+                    "end": {"dateTime": end.isoformat() + "-03:00"}
+                }).execute()
+            
+            old = add_event(now - timedelta(days=400))
+            recent = add_event(now - timedelta(days=2))
+            upcoming = add_event(now + timedelta(days=3))
+            
+            cache = CalendarEventCache("America/Sao_Paulo")
+            sync = IncrementalCalendarSync(service, "primary", cache, sync_interval=0, past_days=30)
+            await sync.sync()
+            full_ok = set(cache.events) == {recent["id"], upcoming["id"]}
+            
+            # Incremental e refeito após 410 mantêm a janela
+            added = add_event(now + timedelta(days=5))
+            await sync.sync()
+            service.expire_sync_tokens()
+            await sync.sync()
+            
+            success = (
+                full_ok and
+                old["id"] not in cache.events and
+                added["id"] in cache.events and
+                sync.stats["full_syncs"] == 2 and sync.stats["resets"] == 1
+            )
+            self.log_test(
+                "Calendar Sync - Time Window",
+                success,
+                f"Eventos no cache: {len(cache)}, syncs completos: {sync.stats['full_syncs']}"
+            )
+            
+        except Exception as e:
+            self.log_test("Calendar Sync", False, f"Erro: {e}")
+    
     async def test_calendar_manager(self):
         """Testa gerenciador de calendário"""
         logger.info("📅 Testando Calendar Manager...")
@@ -265,6 +1471,52 @@ class AIAgentTester:
         except Exception as e:
             self.log_test("Database Manager", False, f"Erro: {e}")
     
+    async def test_client_aggregates_rebuild(self):
+        """Testa se o recálculo completo bate com as métricas incrementais"""
+        logger.info("📈 Testando recálculo de métricas de clientes...")
+        
+        try:
+            import tempfile
+            from database_manager import DatabaseManager
+            from sqlite_store import SQLiteLocalStore
+            
+            with tempfile.TemporaryDirectory() as tmp:
+                db = DatabaseManager()
+                db.supabase_url = None
+                db.local_db_file = str(Path(tmp) / "agent.db")
+                db.legacy_json_file = str(Path(tmp) / "legacy.json")
+                db.local_store = SQLiteLocalStore(db.local_db_file)
+                await db.load_local_data()
+                
+                ids = [
+                    await db.create_appointment("Ana", "11900000001", "corte", "2030-01-07", f"{9 + i}:00", price=price)
+                    for i, price in enumerate((30.1, 45.0, 45.3))
+                ]
+                # Completar e reabrir: em float, (30.1 + 45.3) - 30.1 != 45.3
+                await db.update_appointment(ids[0], {"status": "completed"})
+                await db.update_appointment(ids[2], {"status": "completed"})
+                await db.update_appointment(ids[0], {"status": "confirmed"})
+                await db.cancel_appointment(ids[1])
+                await db.save_conversation("11900000001", "oi", "olá", "greeting")
+                
+                incremental = await db.get_client_stats("11900000001")
+                result = await db.rebuild_client_aggregates()
+                rebuilt = await db.get_client_stats("11900000001")
+                await db.close()
+            
+            success = (
+                result.get("mismatched_clients") == [] and incremental == rebuilt and
+                incremental["total_spent"] == 45.3
+            )
+            self.log_test(
+                "Client Aggregates - Rebuild Matches Incremental",
+                success,
+                f"Clientes: {result.get('clients')}, divergentes: {result.get('mismatched_clients')}"
+            )
+            
+        except Exception as e:
+            self.log_test("Client Aggregates Rebuild", False, f"Erro: {e}")
+    
     async def test_mock_data_integration(self):
         """Testa integração com dados mock"""
         logger.info("🎨 Testando Mock Data Integration...")
@@ -410,10 +1662,29 @@ class AIAgentTester:
         tests = [
             self.test_imports,
             self.test_ai_engine,
+            self.test_text_normalizer,
+            self.test_keyword_matcher,
+            self.test_analysis_memo,
+            self.test_llm_cache,
             self.test_scheduler_engine,
+            self.test_availability_index,
+            self.test_occupancy_model,
+            self.test_journal,
             self.test_whatsapp_connector,
+            self.test_whatsapp_stub_api,
+            self.test_webhook_batch,
+            self.test_message_templates,
+            self.test_reminder_dispatcher,
+            self.test_outbound_queue,
+            self.test_notification_jobs,
+            self.test_message_lanes,
+            self.test_message_dedup,
+            self.test_conversation_store,
+            self.test_booking_pipeline,
+            self.test_calendar_sync,
             self.test_calendar_manager,
             self.test_database_manager,
+            self.test_client_aggregates_rebuild,
             self.test_mock_data_integration,
             self.test_complete_flow
         ]
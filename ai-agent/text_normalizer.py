@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+🔡 TEXT NORMALIZER
+Normalização de mensagens em português: acentos, caixa e abreviações
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import NamedTuple, Tuple
+
+
+# Abreviações comuns no WhatsApp -> forma normalizada (já sem acento)
+ABBREVIATIONS = {
+    "vc": "voce",
+    "vcs": "voces",
+    "q": "que",
+    "oq": "o que",
+    "hj": "hoje",
+    "amn": "amanha",
+    "tb": "tambem",
+    "tbm": "tambem",
+    "pq": "porque",
+    "obg": "obrigada",
+    "obgd": "obrigada",
+    "brigada": "obrigada",
+    "blz": "beleza",
+    "qto": "quanto",
+    "qnto": "quanto",
+    "qdo": "quando",
+    "qnd": "quando",
+    "hr": "hora",
+    "hrs": "horas",
+    "dps": "depois",
+    "pfv": "por favor",
+    "pf": "por favor",
+    "msg": "mensagem",
+    "mto": "muito",
+    "td": "tudo",
+    "sab": "sabado",
+}
+
+_TOKEN = re.compile(r"\w+")
+
+
+class NormalizedText(NamedTuple):
+    original: str
+    text: str
+    tokens: Tuple[str, ...]
+
+
+def fold_accents(text: str) -> str:
+    """Minúsculas sem acentos (NFKD + remoção das marcas combinantes)"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).lower()
+
+
+def expand_abbreviations(text: str) -> str:
+    return _TOKEN.sub(lambda match: ABBREVIATIONS.get(match.group(), match.group()), text)
+
+
+@lru_cache(maxsize=4096)
+def normalize(text: str) -> NormalizedText:
+    """Texto normalizado e seus tokens, memorizados por mensagem.
+
+    Intents, serviços e entidades consomem o mesmo resultado; as posições
+    das ocorrências referem-se a `text` (a forma normalizada).
+    """
+    normalized = expand_abbreviations(fold_accents(text))
+    return NormalizedText(text, normalized, tuple(_TOKEN.findall(normalized)))
@@ -4,20 +4,103 @@
 Integração com WhatsApp Business API
 """
 
-import requests
+import asyncio
+import httpx
 import os
-from typing import Dict, Optional
+import random
+from typing import Dict, List, Optional
 from loguru import logger
 import json
 from datetime import datetime
 
+from message_templates import TemplateSet
+
+# Status HTTP que valem nova tentativa
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Para POST (não idempotente) só se repete o que garante que a mensagem não
+# foi aceita: limite de taxa, serviço indisponível e falha ao conectar
+SAFE_RETRY_STATUS = {429, 503}
+SAFE_RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# Mensagens prontas, compiladas uma vez na importação
+MESSAGE_TEMPLATES = TemplateSet(defaults={
+    'date': '',
+    'time': '',
+    'service': '',
+    'staff': '',
+    'price': '',
+    'booking_code': 'XXXX',
+    'title': 'Promoção',
+    'discount': '20',
+    'valid_until': '',
+    'services': 'Todos'
+})
+
+MESSAGE_TEMPLATES.add("confirmation", """✅ *Agendamento Confirmado!*
+
+📅 *Data:* {date}
+🕐 *Horário:* {time}
+💄 *Serviço:* {service}
+👩‍💼 *Profissional:* {staff}
+💰 *Valor:* R$ {price}
+
+📍 *Salão Beleza Total*
+Rua das Flores, 123 - Centro
+
+📱 *Lembrete:* Você receberá uma mensagem 2h antes do seu horário.
+
+❌ *Para cancelar:* Digite CANCELAR {booking_code}
+
+Obrigada por escolher nosso salão! ✨""", required=())
+
+MESSAGE_TEMPLATES.add("reminder", """⏰ *Lembrete de Agendamento*
+
+Olá! Você tem um agendamento em {hours_before}h:
+
+📅 *Hoje* às {time}
+💄 *{service}* com {staff}
+
+📍 Salão Beleza Total
+Rua das Flores, 123
+
+✅ Confirme digitando: OK
+❌ Para cancelar: CANCELAR
+
+Te esperamos! 😊""", required=("hours_before",))
+
+MESSAGE_TEMPLATES.add("promotion", """🎉 *Oferta Especial para Você!*
+
+{title}
+
+💰 *{discount}% de desconto*
+⏰ *Válido até:* {valid_until}
+💄 *Serviços:* {services}
+
+📱 Para agendar: Digite QUERO
+
+Não perca! ✨""", required=())
+
 class WhatsAppConnector:
-    def __init__(self):
+    def __init__(self, transport: Optional[httpx.AsyncBaseTransport] = None,
+                 base_url: Optional[str] = None, max_concurrency: int = None,
+                 timeout: float = 10.0, max_retries: int = 3, backoff_base: float = 0.5):
         self.access_token = os.getenv("WHATSAPP_ACCESS_TOKEN")
         self.phone_number_id = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
         self.verify_token = os.getenv("WHATSAPP_VERIFY_TOKEN", "agenda_salao_verify")
         self.api_version = "v18.0"
-        self.base_url = f"https://graph.facebook.com/{self.api_version}"
+        api_root = base_url or os.getenv("WHATSAPP_API_BASE_URL", "https://graph.facebook.com")
+        self.base_url = f"{api_root.rstrip('/')}/{self.api_version}"
+        
+        # Pool HTTP persistente (keep-alive) com concorrência limitada
+        self.max_concurrency = max_concurrency or int(os.getenv("WHATSAPP_MAX_CONCURRENCY", "10"))
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
         
     async def initialize(self):
         """Inicializa o conector WhatsApp"""
@@ -33,18 +116,69 @@ class WhatsAppConnector:
         except Exception as e:
             logger.error(f"❌ Erro ao inicializar WhatsApp: {e}")
     
+    def _get_client(self) -> httpx.AsyncClient:
+        """Retorna o cliente HTTP compartilhado, criando-o na primeira chamada"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={"Authorization": f"Bearer {self.access_token}"},
+                timeout=httpx.Timeout(self.timeout, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency
+                ),
+                transport=self._transport
+            )
+        return self._client
+    
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """Executa a requisição com limite de concorrência e retry com backoff.
+        
+        Em métodos não idempotentes (envio de mensagem) um timeout de leitura
+        ou um 500 pode significar que a API já aceitou a mensagem; esses casos
+        não são repetidos aqui e ficam com a camada de retry de quem chamou.
+        """
+        client = self._get_client()
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+        retry_status = RETRYABLE_STATUS if idempotent else SAFE_RETRY_STATUS
+        retry_errors = httpx.TransportError if idempotent else SAFE_RETRY_ERRORS
+        
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._semaphore:
+                    response = await client.request(method, path, **kwargs)
+                
+                if response.status_code not in retry_status or attempt == self.max_retries:
+                    return response
+                
+                retry_after = response.headers.get("retry-after")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else None
+                logger.warning(f"⚠️ WhatsApp API respondeu {response.status_code}, tentativa {attempt + 1}")
+                
+            except retry_errors as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = None
+                logger.warning(f"⚠️ Falha de rede no WhatsApp ({e}), tentativa {attempt + 1}")
+            
+            # Backoff exponencial com jitter
+            if delay is None:
+                delay = self.backoff_base * (2 ** attempt) + random.uniform(0, self.backoff_base)
+            await asyncio.sleep(delay)
+    
+    async def close(self):
+        """Fecha o pool de conexões HTTP"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
     async def test_connection(self) -> bool:
         """Testa conexão com a API"""
         try:
             if not self.access_token:
                 return False
-                
-            url = f"{self.base_url}/{self.phone_number_id}"
-            headers = {
-                "Authorization": f"Bearer {self.access_token}"
-            }
             
-            response = requests.get(url, headers=headers)
+            response = await self._request("GET", f"/{self.phone_number_id}")
             return response.status_code == 200
             
         except Exception as e:
@@ -52,7 +186,12 @@ class WhatsAppConnector:
             return False
     
     async def send_message(self, to_number: str, message: str, message_type: str = "text") -> Dict:
-        """Envia mensagem via WhatsApp"""
+        """Envia mensagem via WhatsApp.
+        
+        Em caso de falha, `retryable` indica se a mensagem certamente não foi
+        aceita (429, 503 ou falha ao conectar) e pode ser reenviada; timeouts
+        de leitura, 500 e erros 4xx não devem ser repetidos.
+        """
         try:
             if not self.access_token:
                 # Modo simulação
@@ -63,12 +202,7 @@ class WhatsAppConnector:
                     "status": "sent_simulation"
                 }
             
-            url = f"{self.base_url}/{self.phone_number_id}/messages"
-            
-            headers = {
-                "Authorization": f"Bearer {self.access_token}",
-                "Content-Type": "application/json"
-            }
+            path = f"/{self.phone_number_id}/messages"
             
             # Payload baseado no tipo de mensagem
             if message_type == "text":
@@ -105,7 +239,7 @@ class WhatsAppConnector:
                     }
                 }
             
-            response = requests.post(url, headers=headers, json=payload)
+            response = await self._request("POST", path, json=payload)
             response_data = response.json()
             
             if response.status_code == 200:
@@ -120,7 +254,8 @@ class WhatsAppConnector:
                 return {
                     "success": False,
                     "error": response_data,
-                    "status": "failed"
+                    "status": "failed",
+                    "retryable": response.status_code in SAFE_RETRY_STATUS
                 }
                 
         except Exception as e:
@@ -128,62 +263,25 @@ class WhatsAppConnector:
             return {
                 "success": False,
                 "error": str(e),
-                "status": "error"
+                "status": "error",
+                "retryable": isinstance(e, SAFE_RETRY_ERRORS)
             }
     
     async def send_confirmation_message(self, to_number: str, booking_details: Dict) -> Dict:
         """Envia mensagem de confirmação de agendamento"""
-        message = f"""✅ *Agendamento Confirmado!*
-
-📅 *Data:* {booking_details.get('date')}
-🕐 *Horário:* {booking_details.get('time')}
-💄 *Serviço:* {booking_details.get('service')}
-👩‍💼 *Profissional:* {booking_details.get('staff')}
-💰 *Valor:* R$ {booking_details.get('price')}
-
-📍 *Salão Beleza Total*
-Rua das Flores, 123 - Centro
-
-📱 *Lembrete:* Você receberá uma mensagem 2h antes do seu horário.
-
-❌ *Para cancelar:* Digite CANCELAR {booking_details.get('booking_code', 'XXXX')}
-
-Obrigada por escolher nosso salão! ✨"""
+        message = MESSAGE_TEMPLATES.render("confirmation", booking_details)
         
         return await self.send_message(to_number, message, "text")
     
     async def send_reminder_message(self, to_number: str, booking_details: Dict, hours_before: int = 2) -> Dict:
         """Envia lembrete de agendamento"""
-        message = f"""⏰ *Lembrete de Agendamento*
-
-Olá! Você tem um agendamento em {hours_before}h:
-
-📅 *Hoje* às {booking_details.get('time')}
-💄 *{booking_details.get('service')}* com {booking_details.get('staff')}
-
-📍 Salão Beleza Total
-Rua das Flores, 123
-
-✅ Confirme digitando: OK
-❌ Para cancelar: CANCELAR
-
-Te esperamos! 😊"""
+        message = MESSAGE_TEMPLATES.render("reminder", booking_details, hours_before=hours_before)
         
         return await self.send_message(to_number, message, "text")
     
     async def send_promotional_message(self, to_number: str, promotion: Dict) -> Dict:
         """Envia mensagem promocional personalizada"""
-        message = f"""🎉 *Oferta Especial para Você!*
-
-{promotion.get('title', 'Promoção')}
-
-💰 *{promotion.get('discount', '20')}% de desconto*
-⏰ *Válido até:* {promotion.get('valid_until')}
-💄 *Serviços:* {promotion.get('services', 'Todos')}
-
-📱 Para agendar: Digite QUERO
-
-Não perca! ✨"""
+        message = MESSAGE_TEMPLATES.render("promotion", promotion)
         
         return await self.send_message(to_number, message, "text")
     
@@ -197,46 +295,78 @@ Não perca! ✨"""
             return None
     
     def parse_webhook_message(self, webhook_data: Dict) -> Optional[Dict]:
-        """Extrai dados da mensagem do webhook"""
+        """Extrai dados da primeira mensagem do webhook"""
         try:
-            entry = webhook_data.get("entry", [])[0]
-            changes = entry.get("changes", [])[0]
-            value = changes.get("value", {})
-            messages = value.get("messages", [])
-            
-            if not messages:
-                return None
-            
-            message = messages[0]
-            
-            # Extrair dados básicos
-            message_data = {
-                "from": message.get("from"),
-                "id": message.get("id"),
-                "timestamp": message.get("timestamp"),
-                "type": message.get("type", "text")
-            }
-            
-            # Extrair conteúdo baseado no tipo
-            if message_data["type"] == "text":
-                message_data["text"] = message.get("text", {}).get("body", "")
-            
-            elif message_data["type"] == "button":
-                message_data["button_text"] = message.get("button", {}).get("text", "")
-                message_data["button_payload"] = message.get("button", {}).get("payload", "")
-            
-            # Informações do contato
-            contacts = value.get("contacts", [])
-            if contacts:
-                contact = contacts[0]
-                message_data["contact_name"] = contact.get("profile", {}).get("name", "")
-            
-            return message_data
+            batch = self.parse_webhook_batch(webhook_data)
+            for messages in batch["messages"].values():
+                return messages[0]
+            return None
             
         except Exception as e:
             logger.error(f"❌ Erro ao processar webhook: {e}")
             return None
     
+    def parse_webhook_batch(self, webhook_data: Dict) -> Dict:
+        """
+        Extrai todas as mensagens e status de um payload do webhook.
+        
+        A Meta agrupa várias entradas, mudanças e mensagens em um único POST;
+        as mensagens voltam agrupadas por remetente (em ordem de timestamp) e
+        os status (sent, delivered, read, failed) ficam numa lista à parte.
+        """
+        messages: Dict[str, List[Dict]] = {}
+        statuses: List[Dict] = []
+        
+        for entry in webhook_data.get("entry", []):
+            for change in entry.get("changes", []):
+                value = change.get("value", {})
+                
+                # Informações do contato
+                names = {
+                    contact.get("wa_id"): contact.get("profile", {}).get("name", "")
+                    for contact in value.get("contacts", [])
+                }
+                
+                for message in value.get("messages", []):
+                    message_data = self._message_data(message)
+                    name = names.get(message_data["from"])
+                    if name:
+                        message_data["contact_name"] = name
+                    messages.setdefault(message_data["from"], []).append(message_data)
+                
+                for status in value.get("statuses", []):
+                    statuses.append({
+                        "id": status.get("id"),
+                        "status": status.get("status"),
+                        "recipient": status.get("recipient_id"),
+                        "timestamp": status.get("timestamp"),
+                        "errors": status.get("errors", [])
+                    })
+        
+        for sender_messages in messages.values():
+            sender_messages.sort(key=lambda message: int(message.get("timestamp") or 0))
+        
+        return {"messages": messages, "statuses": statuses}
+    
+    def _message_data(self, message: Dict) -> Dict:
+        # Extrair dados básicos
+        message_data = {
+            "from": message.get("from"),
+            "id": message.get("id"),
+            "timestamp": message.get("timestamp"),
+            "type": message.get("type", "text")
+        }
+        
+        # Extrair conteúdo baseado no tipo
+        if message_data["type"] == "text":
+            message_data["text"] = message.get("text", {}).get("body", "")
+        
+        elif message_data["type"] == "button":
+            message_data["button_text"] = message.get("button", {}).get("text", "")
+            message_data["button_payload"] = message.get("button", {}).get("payload", "")
+        
+        return message_data
+    
     async def health_check(self) -> str:
         """Verifica saúde do componente"""
         try: